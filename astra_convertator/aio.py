@@ -0,0 +1,141 @@
+import os
+import signal
+import asyncio
+import threading
+import subprocess
+import logging
+
+STOP_STEPS = ((signal.SIGINT, 3.0), (signal.SIGTERM, 2.0), (signal.SIGKILL, None))
+SHUTDOWN_TIMEOUT = 5.0
+CHILD_POLL_INTERVAL = 0.1
+
+class ChildProcess:
+    def __init__(self, popen, loop):
+        self.popen = popen
+        self.pid = popen.pid
+        self.returncode = None
+        self.rusage = None
+        self.stdout = None
+        self.stderr = None
+        self._loop = loop
+        self._exited = loop.create_future()
+        self._pidfd = None
+
+    async def _connect_pipe(self, pipe):
+        reader = asyncio.StreamReader()
+        await self._loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+        return reader
+
+    async def connect(self):
+        self.stdout = await self._connect_pipe(self.popen.stdout)
+        self.stderr = await self._connect_pipe(self.popen.stderr)
+        try:
+            self._pidfd = os.pidfd_open(self.pid)
+        except (AttributeError, OSError):
+            self._loop.create_task(self._poll())
+        else:
+            self._loop.add_reader(self._pidfd, self._reap)
+
+    async def _poll(self):
+        while not self._reap():
+            await asyncio.sleep(CHILD_POLL_INTERVAL)
+
+    def _reap(self):
+        try:
+            pid, status, self.rusage = os.wait4(self.pid, os.WNOHANG)
+        except ChildProcessError:
+            pid, status = self.pid, None
+        if pid == 0:
+            return False
+        self.returncode = os.waitstatus_to_exitcode(status) if status is not None else 255
+        self.popen.returncode = self.returncode
+        if self._pidfd is not None:
+            self._loop.remove_reader(self._pidfd)
+            os.close(self._pidfd)
+            self._pidfd = None
+        if not self._exited.done():
+            self._exited.set_result(self.returncode)
+        return True
+
+    def send_signal(self, signum):
+        if self.returncode is None:
+            os.kill(self.pid, signum)
+
+    async def wait(self):
+        return await asyncio.shield(self._exited)
+
+async def start_child(cmd):
+    popen = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    child = ChildProcess(popen, asyncio.get_running_loop())
+    await child.connect()
+    return child
+
+async def stop_process(process, steps=STOP_STEPS):
+    for signum, timeout in steps:
+        if process.returncode is not None:
+            return
+        try:
+            process.send_signal(signum)
+        except ProcessLookupError:
+            return
+        if timeout is None:
+            return
+        try:
+            await asyncio.wait_for(process.wait(), timeout)
+            return
+        except asyncio.TimeoutError:
+            logging.warning(f"Процесс {process.pid} не завершился за {timeout:g} с после {signal.Signals(signum).name}")
+
+def add_signal_handlers(signals, callback):
+    loop = asyncio.get_running_loop()
+    try:
+        for signum in signals:
+            loop.add_signal_handler(signum, callback, signum)
+    except (NotImplementedError, RuntimeError):
+        return False
+    return True
+
+class EventLoopThread:
+    def __init__(self, name="asyncio"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def _drain(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if tasks:
+            await asyncio.wait(tasks)
+
+    def shutdown(self, timeout=SHUTDOWN_TIMEOUT):
+        if not self._thread.is_alive():
+            return
+        try:
+            self.submit(self._drain()).result(timeout)
+        except Exception as e:
+            logging.warning(f"Не все процессы завершились при выходе: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+_loop_thread = None
+_loop_thread_lock = threading.Lock()
+
+def get_loop_thread():
+    global _loop_thread
+    with _loop_thread_lock:
+        if _loop_thread is None:
+            _loop_thread = EventLoopThread()
+    return _loop_thread
+
+def shutdown_loop_thread(timeout=SHUTDOWN_TIMEOUT):
+    global _loop_thread
+    with _loop_thread_lock:
+        loop_thread, _loop_thread = _loop_thread, None
+    if loop_thread is not None:
+        loop_thread.shutdown(timeout)
@@ -0,0 +1,284 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import shutil
+import asyncio
+import tempfile
+import platform
+import subprocess
+import logging
+
+from .engine import VIDEO_FORMATS, AUDIO_FORMATS, Conversion, AsyncFFmpegProcess
+from .logs import setup_logging
+from .probe import probe_media_async
+from .settings import get_settings
+
+SAMPLE_DURATION = 10
+SAMPLE_SIZE = "1280x720"
+SAMPLE_RATE = 30
+DEFAULT_FORMATS = "mp4,webm"
+DEFAULT_PROFILES = "fastest,fast,balanced"
+DEFAULT_CRFS = "23,28"
+DEFAULT_THREADS = "0"
+
+PSNR_PATTERN = re.compile(r"PSNR .*average:(\S+)")
+SSIM_PATTERN = re.compile(r"SSIM .*All:(\S+)")
+VMAF_PATTERN = re.compile(r"VMAF score[:=]\s*(\S+)")
+
+def parse_list(value, convert=str):
+    try:
+        return [convert(item.strip()) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"неверный список: {value}")
+
+def parse_metric(pattern, text):
+    match = pattern.search(text)
+    if not match:
+        return None
+    try:
+        return float(match.group(1))
+    except ValueError:
+        return None
+
+def ffmpeg_version():
+    try:
+        result = subprocess.run(["ffmpeg", "-version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    except OSError:
+        return None
+    return result.stdout.splitlines()[0] if result.stdout else None
+
+def has_filter(name):
+    try:
+        result = subprocess.run(["ffmpeg", "-hide_banner", "-filters"],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    except OSError:
+        return False
+    if result.returncode != 0:
+        return False
+    return any(line.split()[1:2] == [name] for line in result.stdout.splitlines())
+
+def build_sample_command(output_file, duration=SAMPLE_DURATION, size=SAMPLE_SIZE, rate=SAMPLE_RATE):
+    return [
+        "ffmpeg", "-y",
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={rate}:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={duration}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-qp", "0", "-pix_fmt", "yuv420p",
+        "-c:a", "pcm_s16le", "-shortest", output_file
+    ]
+
+def build_metrics_command(reference, distorted, vmaf=False):
+    streams = 3 if vmaf else 2
+    filters = [
+        f"[0:v]split={streams}" + "".join(f"[d{i}]" for i in range(streams)),
+        f"[1:v]split={streams}" + "".join(f"[r{i}]" for i in range(streams)),
+        "[d0][r0]psnr",
+        "[d1][r1]ssim"
+    ]
+    if vmaf:
+        filters.append("[d2][r2]libvmaf")
+    return [
+        "ffmpeg", "-hide_banner", "-nostats", "-i", distorted, "-i", reference,
+        "-lavfi", ";".join(filters), "-f", "null", "-"
+    ]
+
+def quality_metrics(reference, distorted, vmaf=False):
+    result = subprocess.run(build_metrics_command(reference, distorted, vmaf),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors="replace")
+    if result.returncode != 0:
+        logging.warning(f"Не удалось посчитать метрики качества для {distorted}")
+        return {"psnr": None, "ssim": None, "vmaf": None}
+    return {
+        "psnr": parse_metric(PSNR_PATTERN, result.stderr),
+        "ssim": parse_metric(SSIM_PATTERN, result.stderr),
+        "vmaf": parse_metric(VMAF_PATTERN, result.stderr) if vmaf else None
+    }
+
+async def generate_sample(work_dir, duration, size, rate):
+    sample_file = os.path.join(work_dir, f"testsrc2_{size}_{rate}fps.mkv")
+    process = AsyncFFmpegProcess(build_sample_command(sample_file, duration, size, rate))
+    if await process.run() != 0:
+        raise RuntimeError(f"Не удалось создать тестовый файл: {process.error_output}")
+    return sample_file
+
+def benchmark_matrix(formats, profiles, crfs, threads):
+    for output_format in formats:
+        is_video = output_format in VIDEO_FORMATS
+        for profile in (profiles if is_video else [None]):
+            for crf in (crfs if is_video else [None]):
+                for thread_count in threads:
+                    yield output_format, profile, crf, thread_count
+
+async def run_case(sample, media_info, output_dir, output_format, profile, crf, threads, settings, metrics=True,
+                   vmaf=False):
+    name = "_".join(str(part) for part in (profile.name if profile else None, crf, threads) if part is not None)
+    base = os.path.splitext(os.path.basename(sample))[0]
+    output_file = os.path.join(output_dir, f"{base}_{name}.{output_format}")
+    conversion = Conversion(
+        sample, output_file, output_format, crf=crf,
+        profile=profile, threads=threads or None,
+        video_codec=settings.video_codec, audio_codec=settings.audio_codec,
+        record_history=False, record_metrics=False, resumable=False, smart=False
+    )
+    started = time.monotonic()
+    return_code = await conversion.run_async()
+    elapsed = time.monotonic() - started
+
+    result = {
+        "sample": os.path.basename(sample),
+        "format": output_format,
+        "profile": profile.name if profile else None,
+        "preset": profile.preset if profile else None,
+        "crf": crf,
+        "threads": threads,
+        "return_code": return_code,
+        "elapsed": round(elapsed, 3),
+        "cpu_time": round(conversion.cpu_time, 3),
+        "peak_rss": conversion.peak_rss
+    }
+    if return_code != 0:
+        lines = conversion.error_output.strip().splitlines()
+        result["error"] = lines[-1] if lines else None
+        return result
+
+    frames = media_info.duration * media_info.fps if media_info.fps else 0
+    result.update({
+        "encode_fps": round(frames / elapsed, 2) if elapsed and frames else None,
+        "speedup": round(media_info.duration / elapsed, 2) if elapsed else None,
+        "size": os.path.getsize(output_file)
+    })
+    if metrics and output_format in VIDEO_FORMATS and media_info.has_video:
+        loop = asyncio.get_running_loop()
+        result.update(await loop.run_in_executor(None, quality_metrics, sample, output_file, vmaf))
+    return result
+
+def case_key(result):
+    return (result["sample"], result["format"], result["profile"], result["crf"], result["threads"])
+
+def compare_results(previous, current):
+    baseline = {case_key(result): result for result in previous.get("results", [])}
+    lines = []
+    for result in current["results"]:
+        old = baseline.get(case_key(result))
+        if not old or result.get("return_code") or old.get("return_code"):
+            continue
+        changes = []
+        for field in ("encode_fps", "size", "vmaf", "psnr"):
+            if old.get(field) and result.get(field) is not None:
+                changes.append(f"{field} {(result[field] - old[field]) / old[field] * 100:+.1f}%")
+        if changes:
+            lines.append(f"{format_case(result)}: {', '.join(changes)}")
+    return lines
+
+def format_case(result):
+    parts = [result["sample"], result["format"]]
+    if result["profile"]:
+        parts.extend([result["profile"], f"crf {result['crf']}"])
+    parts.append(f"threads {result['threads'] or 'auto'}")
+    return " / ".join(parts)
+
+def format_result(result):
+    if result["return_code"] != 0:
+        return f"FAIL  {format_case(result)}"
+    line = (f"{format_case(result)}: {result['encode_fps'] or 0:.1f} fps, {result['speedup'] or 0:.2f}x, "
+            f"{result['size'] / 1024:.0f} КБ, {result['peak_rss'] / (1024 * 1024):.0f} МБ RSS")
+    for field in ("psnr", "ssim", "vmaf"):
+        if result.get(field) is not None:
+            line += f", {field.upper()} {result[field]:.3f}"
+    return line
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m astra_convertator.benchmark",
+        description="Замер скорости, размера и качества для сочетаний формата, профиля, CRF и потоков."
+    )
+    parser.add_argument("samples", nargs="*",
+                        help="свои тестовые файлы (по умолчанию создается синтетическое видео testsrc2)")
+    parser.add_argument("-f", "--formats", type=parse_list, default=DEFAULT_FORMATS,
+                        help="форматы через запятую (по умолчанию %(default)s)")
+    parser.add_argument("-p", "--profiles", type=parse_list, default=DEFAULT_PROFILES,
+                        help="профили кодирования через запятую (по умолчанию %(default)s)")
+    parser.add_argument("--crf", type=lambda value: parse_list(value, int), default=DEFAULT_CRFS,
+                        help="значения CRF через запятую (по умолчанию %(default)s)")
+    parser.add_argument("-t", "--threads", type=lambda value: parse_list(value, int),
+                        default=DEFAULT_THREADS,
+                        help="число потоков через запятую, 0 - автоматически (по умолчанию %(default)s)")
+    parser.add_argument("--duration", type=float, default=SAMPLE_DURATION,
+                        help="длительность синтетического видео в секундах (по умолчанию %(default)s)")
+    parser.add_argument("--size", default=SAMPLE_SIZE, help="размер синтетического видео (по умолчанию %(default)s)")
+    parser.add_argument("--rate", type=int, default=SAMPLE_RATE,
+                        help="частота кадров синтетического видео (по умолчанию %(default)s)")
+    parser.add_argument("--no-metrics", dest="metrics", action="store_false",
+                        help="не считать PSNR/SSIM/VMAF")
+    parser.add_argument("-o", "--output", help="файл для результатов в JSON")
+    parser.add_argument("--compare", help="JSON предыдущего замера для сравнения")
+    parser.add_argument("-v", "--verbose", action="store_true", help="подробный вывод")
+    return parser.parse_args(argv)
+
+async def run_benchmark(args, settings, profiles, work_dir):
+    samples = args.samples or [await generate_sample(work_dir, args.duration, args.size, args.rate)]
+    vmaf = args.metrics and has_filter("libvmaf")
+    if args.metrics and not vmaf:
+        logging.warning("Фильтр libvmaf недоступен, VMAF не считается")
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "ffmpeg": ffmpeg_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": []
+    }
+    for sample in samples:
+        media_info = await probe_media_async(sample, use_cache=False)
+        for output_format, profile_name, crf, threads in benchmark_matrix(
+                args.formats, args.profiles, args.crf, args.threads):
+            result = await run_case(sample, media_info, work_dir, output_format,
+                                    profiles[profile_name] if profile_name else None,
+                                    crf, threads, settings, args.metrics, vmaf)
+            report["results"].append(result)
+            print(format_result(result))
+    return report
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging(logging.INFO if args.verbose else logging.WARNING, log_file=False, console=True)
+
+    unknown = [fmt for fmt in args.formats if fmt not in VIDEO_FORMATS + AUDIO_FORMATS]
+    if unknown:
+        print(f"Неизвестный формат: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    settings = get_settings()
+    profiles = settings.profiles()
+    unknown = [name for name in args.profiles if name not in profiles]
+    if unknown:
+        print(f"Неизвестный профиль: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    work_dir = tempfile.mkdtemp(prefix="astra_benchmark_")
+    try:
+        report = asyncio.run(run_benchmark(args, settings, profiles, work_dir))
+    except KeyboardInterrupt:
+        return 130
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        print(f"Сравнение с {args.compare}:")
+        for line in compare_results(previous, report) or ["нет совпадающих замеров"]:
+            print(line)
+    return 1 if any(result["return_code"] for result in report["results"]) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
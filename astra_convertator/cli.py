@@ -0,0 +1,275 @@
+import argparse
+import glob
+import os
+import sys
+import signal
+import asyncio
+import logging
+from functools import partial
+
+from .aio import add_signal_handlers
+from .engine import (VIDEO_FORMATS, AUDIO_FORMATS, SEEK_MODES, SEEK_ACCURATE, Conversion, build_output_path,
+                     can_share_decode, collect_media_files, default_worker_count, output_overrides, parse_time,
+                     trim_length)
+from .logs import setup_logging
+from .loudness import LOUDNORM_TARGET_RANGE
+from .scheduler import ResourceGate
+from .settings import get_settings
+
+def expand_inputs(patterns):
+    paths = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            paths.extend(sorted(glob.glob(pattern, recursive=True)))
+        else:
+            paths.append(pattern)
+    return collect_media_files(paths)
+
+def parse_formats(value):
+    formats = [fmt.strip().lower() for fmt in value.split(",") if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in VIDEO_FORMATS + AUDIO_FORMATS]
+    if not formats or unknown:
+        raise argparse.ArgumentTypeError(f"неизвестный формат: {', '.join(unknown) or value}")
+    return formats
+
+def parse_args(argv=None):
+    settings = get_settings()
+    parser = argparse.ArgumentParser(
+        prog="python -m astra_convertator",
+        description="Пакетная конвертация медиафайлов без графического интерфейса."
+    )
+    parser.add_argument("inputs", nargs="*", help="файлы, папки или шаблоны (glob)")
+    parser.add_argument("-f", "--format", type=parse_formats,
+                        help="целевой формат или несколько через запятую: "
+                             + ", ".join(VIDEO_FORMATS + AUDIO_FORMATS))
+    parser.add_argument("--crf", type=int, default=settings.crf,
+                        help="качество видео (CRF, по умолчанию %(default)s)")
+    parser.add_argument("-b", "--audio-bitrate", default=settings.audio_bitrate,
+                        help="битрейт звука (по умолчанию %(default)s)")
+    parser.add_argument("-p", "--profile", default=settings.profile, choices=list(settings.profiles()),
+                        help="профиль скорости кодирования (по умолчанию %(default)s)")
+    parser.add_argument("-t", "--threads", type=int,
+                        help="потоков кодировщика на задачу (0 - автоматически)")
+    parser.add_argument("--remux", action="store_true",
+                        help="копировать совместимые потоки без перекодирования")
+    parser.add_argument("--no-smart", dest="smart", action="store_false", default=settings.smart_parameters,
+                        help="не подбирать битрейт, каналы, размер и частоту кадров по исходнику")
+    parser.add_argument("--segments", type=int, default=0, metavar="N",
+                        help="кодировать длинное видео сегментами в N процессов (0 - выключено)")
+    parser.add_argument("--target-size", type=float, metavar="MB",
+                        help="целевой размер видео в МБ (двухпроходное кодирование)")
+    parser.add_argument("--video-bitrate", help="битрейт видео, например 2500k (двухпроходное кодирование)")
+    parser.add_argument("--start", type=parse_time, help="начало фрагмента (сек или ЧЧ:ММ:СС)")
+    parser.add_argument("--end", type=parse_time, help="конец фрагмента (сек или ЧЧ:ММ:СС)")
+    parser.add_argument("--duration", type=parse_time, help="длительность фрагмента (сек или ЧЧ:ММ:СС)")
+    parser.add_argument("--loudnorm", type=float, nargs="?", const=settings.loudnorm_target, metavar="LUFS",
+                        help="выровнять громкость по EBU R128 в два прохода (цель по умолчанию %(const)s LUFS)")
+    parser.add_argument("--seek", choices=SEEK_MODES, default=SEEK_ACCURATE,
+                        help="переход к началу фрагмента: accurate - точно по кадру (декодирование от "
+                             "ближайшего ключевого кадра), fast - по ключевому кадру (по умолчанию %(default)s)")
+    parser.add_argument("--height", type=int, metavar="PX",
+                        help="уменьшить видео до высоты PX (без увеличения)")
+    parser.add_argument("--fps", type=int, help="ограничить частоту кадров видео")
+    parser.add_argument("--gif-fps", type=int, help="частота кадров GIF")
+    parser.add_argument("--gif-width", type=int, help="ширина GIF в пикселях")
+    parser.add_argument("--gif-max-size", type=float, metavar="MB",
+                        help="подобрать частоту кадров и ширину GIF под размер в МБ")
+    parser.add_argument("--incremental", action="store_true",
+                        help="пропускать файлы, уже сконвертированные с теми же параметрами")
+    parser.add_argument("--no-resume", dest="resume", action="store_false",
+                        help="не сохранять готовые сегменты (--segments) для продолжения после сбоя")
+    parser.add_argument("-o", "--output-dir", help="папка для результатов (по умолчанию рядом с исходником)")
+    parser.add_argument("-j", "--jobs", type=int, default=default_worker_count(),
+                        help="число параллельных задач (по умолчанию %(default)s)")
+    parser.add_argument("--watch", action="store_true",
+                        help="следить за папками и конвертировать новые файлы по мере появления")
+    parser.add_argument("--watch-config", metavar="INI",
+                        help="правила для папок наблюдения: секция на папку, ключи как у параметров")
+    parser.add_argument("--settle", type=float, default=5.0, metavar="SEC",
+                        help="считать файл готовым, если он не менялся SEC секунд (по умолчанию %(default)s)")
+    parser.add_argument("--broker", metavar="DIR",
+                        help="передать задачи узлам через общую папку очереди и дождаться результатов")
+    parser.add_argument("--stage", action="store_true",
+                        help="копировать исходники в общую папку очереди (если узлы не видят исходные пути)")
+    parser.add_argument("--worker", metavar="DIR",
+                        help="работать узлом: брать задачи из общей папки очереди (-j задач одновременно)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="подробный вывод")
+    args = parser.parse_args(argv)
+    try:
+        args.duration = trim_length(args.start, args.end, args.duration)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.loudnorm is not None and not LOUDNORM_TARGET_RANGE[0] <= args.loudnorm <= LOUDNORM_TARGET_RANGE[1]:
+        parser.error(f"Цель громкости должна быть от {LOUDNORM_TARGET_RANGE[0]:g} до {LOUDNORM_TARGET_RANGE[1]:g} LUFS")
+    if not args.watch_config and not args.worker:
+        if not args.inputs:
+            parser.error("не указаны входные файлы")
+        if not args.format:
+            parser.error("не указан формат (-f)")
+    return args
+
+def format_options(args, settings, output_format):
+    is_video = output_format in VIDEO_FORMATS
+    return {
+        "crf": args.crf if is_video else None,
+        "audio_bitrate": args.audio_bitrate,
+        "profile": settings.get_profile(args.profile),
+        "threads": args.threads,
+        "video_codec": settings.video_codec,
+        "audio_codec": settings.audio_codec,
+        "remux": args.remux,
+        "smart": args.smart,
+        "segment_jobs": args.segments if is_video else None,
+        "trim_start": args.start,
+        "trim_duration": args.duration,
+        "seek_mode": args.seek,
+        "loudnorm": args.loudnorm if output_format != "gif" else None,
+        "video_height": args.height,
+        "video_fps": args.fps,
+        "gif_fps": args.gif_fps,
+        "gif_width": args.gif_width,
+        "gif_max_size": int(args.gif_max_size * 1024 * 1024) if args.gif_max_size and output_format == "gif" else None,
+        "target_size": int(args.target_size * 1024 * 1024) if args.target_size and is_video else None,
+        "video_bitrate": args.video_bitrate if is_video else None,
+        "incremental": args.incremental,
+        "resumable": args.resume
+    }
+
+def is_video_format(output_format):
+    return output_format in VIDEO_FORMATS and output_format != "gif"
+
+def build_conversions(input_files, args, settings, gate, factory=Conversion):
+    options = {fmt: format_options(args, settings, fmt) for fmt in args.format}
+    for fmt in args.format:
+        if gate:
+            options[fmt]["threads"] = gate.plan(options[fmt], args.jobs, is_video_format(fmt))[0]
+    shared_formats = [fmt for fmt in args.format if can_share_decode(fmt, options[fmt])]
+    separate_formats = [fmt for fmt in args.format if fmt not in shared_formats]
+
+    conversions = []
+    for input_file in input_files:
+        if shared_formats:
+            conversions.append(factory(
+                input_file=input_file,
+                output_file=build_output_path(input_file, args.output_dir, shared_formats[0]),
+                format=shared_formats[0],
+                extra_outputs=[
+                    (build_output_path(input_file, args.output_dir, fmt), fmt, output_overrides(options[fmt]))
+                    for fmt in shared_formats[1:]
+                ],
+                **options[shared_formats[0]]
+            ))
+        for output_format in separate_formats:
+            conversions.append(factory(
+                input_file=input_file,
+                output_file=build_output_path(input_file, args.output_dir, output_format),
+                format=output_format,
+                **options[output_format]
+            ))
+    return conversions
+
+async def run_conversion(conversion, gate, workers=1):
+    cost = gate.job_cost(conversion.threads, conversion.segment_jobs, is_video_format(conversion.format), workers)
+    if not await gate.acquire(cost, conversion.output_file, lambda: conversion.cancelled):
+        return 1
+    try:
+        return await conversion.run_async()
+    finally:
+        gate.release(cost)
+
+async def run_in_slot(slots, conversion, runner):
+    async with slots:
+        if conversion.cancelled:
+            return 1
+        try:
+            return await runner(conversion)
+        except Exception as e:
+            logging.error(f"Ошибка в процессе конвертации: {e}")
+            return 1
+
+async def run_all(conversions, runner, jobs, gate=None, verbose=False):
+    interrupted = []
+
+    def interrupt(signum):
+        interrupted.append(signum)
+        for conversion in conversions:
+            conversion.stop()
+        if gate:
+            gate.wake()
+
+    add_signal_handlers([signal.SIGINT, signal.SIGTERM], interrupt)
+    slots = asyncio.Semaphore(max(1, jobs))
+
+    async def run_one(conversion):
+        return conversion, await run_in_slot(slots, conversion, runner)
+
+    failed = 0
+    for finished in asyncio.as_completed([run_one(conversion) for conversion in conversions]):
+        conversion, return_code = await finished
+        if interrupted:
+            continue
+        report_result(conversion, return_code, verbose)
+        if return_code != 0:
+            failed += 1
+    return failed, bool(interrupted)
+
+def report_result(conversion, return_code, verbose=False):
+    if return_code == 0 and conversion.skipped:
+        print(f"SKIP  {conversion.input_file}")
+    elif return_code == 0:
+        print(f"OK    {conversion.input_file} -> {', '.join(conversion.output_files)}")
+        if verbose and conversion.metrics:
+            print("      " + conversion.metrics.summary().replace("\n", "\n      "))
+    else:
+        print(f"FAIL  {conversion.input_file}", file=sys.stderr)
+        if conversion.error_output:
+            print(conversion.error_summary(), file=sys.stderr)
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging(logging.INFO if args.verbose else logging.WARNING, log_file=False, console=True)
+    if args.worker:
+        from .cluster import run_worker
+        return run_worker(args)
+    if args.watch or args.watch_config:
+        from .watch import run_watch
+        return run_watch(args)
+
+    settings = get_settings()
+    input_files = expand_inputs(args.inputs)
+    if not input_files:
+        print("Не найдено входных файлов.", file=sys.stderr)
+        return 2
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    queue = None
+    if args.broker:
+        from .cluster import SharedQueue, RemoteConversion
+        try:
+            queue = SharedQueue(args.broker)
+        except OSError as e:
+            print(f"Общая папка очереди недоступна: {e}", file=sys.stderr)
+            return 2
+        queue.start_sweeper()
+        gate = None
+        conversions = build_conversions(input_files, args, settings, gate,
+                                        partial(RemoteConversion, queue, stage=args.stage))
+        runner = lambda conversion: conversion.run_async()
+    else:
+        gate = ResourceGate()
+        conversions = build_conversions(input_files, args, settings, gate)
+        runner = partial(run_conversion, gate=gate, workers=args.jobs)
+
+    try:
+        failed, interrupted = asyncio.run(run_all(conversions, runner, args.jobs, gate, args.verbose))
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if queue:
+            queue.stop_sweeper()
+    if interrupted:
+        return 130
+
+    print(f"Готово: {len(conversions) - failed} из {len(conversions)}")
+    return 1 if failed else 0
@@ -0,0 +1,462 @@
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import shutil
+import socket
+import signal
+import threading
+import logging
+
+from .aio import add_signal_handlers
+from .engine import VIDEO_FORMATS, ERROR_SUMMARY_LINES, Conversion
+from .metrics import JobMetrics
+from .scheduler import ResourceGate
+from .settings import get_settings
+
+QUEUE_DIRS = ("pending", "claimed", "status", "done", "cancel", "data", "tmp")
+HEARTBEAT_INTERVAL = 5.0
+STALE_TIMEOUT = 120.0
+POLL_INTERVAL = 1.0
+SWEEP_INTERVAL = 10.0
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def job_spec(input_file, output_file, format, crf=None, audio_bitrate=None, **options):
+    options = dict(options)
+    if options.get("profile"):
+        options["profile"] = options["profile"].name
+    return {
+        "input_file": input_file,
+        "output_file": output_file,
+        "format": format,
+        "crf": crf,
+        "audio_bitrate": audio_bitrate,
+        "options": options
+    }
+
+def spec_options(spec):
+    options = dict(spec.get("options", {}))
+    if options.get("profile"):
+        options["profile"] = get_settings().get_profile(options["profile"])
+    if options.get("extra_outputs"):
+        options["extra_outputs"] = [tuple(output) for output in options["extra_outputs"]]
+    return options
+
+class SharedQueue:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        for name in QUEUE_DIRS:
+            os.makedirs(os.path.join(self.root, name), exist_ok=True)
+        self._seen = {}
+        self._seen_lock = threading.Lock()
+        self._sweeper = None
+        self._sweeper_stop = threading.Event()
+
+    def path(self, directory, job_id):
+        return os.path.join(self.root, directory, f"{job_id}.json")
+
+    def _write(self, directory, job_id, data):
+        temp_path = os.path.join(self.root, "tmp", f"{job_id}.{uuid.uuid4().hex}.json")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, self.path(directory, job_id))
+
+    def _read(self, directory, job_id):
+        try:
+            with open(self.path(directory, job_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove(self, directory, job_id):
+        try:
+            os.remove(self.path(directory, job_id))
+        except FileNotFoundError:
+            pass
+
+    def submit(self, spec, job_id=None):
+        job_id = job_id or f"{time.time_ns():020d}_{uuid.uuid4().hex[:8]}"
+        self._write("pending", job_id, spec)
+        return job_id
+
+    def claim(self):
+        for name in sorted(os.listdir(os.path.join(self.root, "pending"))):
+            job_id = name[:-len(".json")]
+            try:
+                os.rename(self.path("pending", job_id), self.path("claimed", job_id))
+            except FileNotFoundError:
+                continue
+            spec = self._read("claimed", job_id)
+            if spec is None:
+                self._remove("claimed", job_id)
+                continue
+            return job_id, spec
+        return None, None
+
+    def heartbeat(self, job_id, status):
+        self._write("status", job_id, dict(status, updated=time.time()))
+
+    def status(self, job_id):
+        return self._read("status", job_id)
+
+    def finish(self, job_id, result):
+        self._write("done", job_id, result)
+        self._remove("claimed", job_id)
+        self._remove("status", job_id)
+
+    def result(self, job_id):
+        return self._read("done", job_id)
+
+    def cancel(self, job_id):
+        try:
+            os.remove(self.path("pending", job_id))
+            return
+        except FileNotFoundError:
+            pass
+        self._write("cancel", job_id, {"time": time.time()})
+
+    def is_cancelled(self, job_id):
+        return os.path.exists(self.path("cancel", job_id))
+
+    def cleanup(self, job_id):
+        for directory in ("pending", "claimed", "status", "done", "cancel"):
+            self._remove(directory, job_id)
+        shutil.rmtree(self.data_dir(job_id), ignore_errors=True)
+
+    def data_dir(self, job_id):
+        return os.path.join(self.root, "data", job_id)
+
+    def requeue(self, job_id):
+        try:
+            os.rename(self.path("claimed", job_id), self.path("pending", job_id))
+        except FileNotFoundError:
+            return False
+        self._remove("status", job_id)
+        return True
+
+    def requeue_stale(self, timeout=STALE_TIMEOUT):
+        with self._seen_lock:
+            return self._requeue_stale(timeout)
+
+    def _requeue_stale(self, timeout):
+        now = time.monotonic()
+        requeued = []
+        claimed = [name[:-len(".json")] for name in os.listdir(os.path.join(self.root, "claimed"))]
+        for job_id in claimed:
+            marker = self.path("status", job_id)
+            if not os.path.exists(marker):
+                marker = self.path("claimed", job_id)
+            try:
+                mtime = os.stat(marker).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            seen_mtime, since = self._seen.get(job_id, (None, now))
+            if seen_mtime != mtime:
+                self._seen[job_id] = (mtime, now)
+            elif now - since >= timeout and self.requeue(job_id):
+                self._seen.pop(job_id, None)
+                requeued.append(job_id)
+                logging.warning(f"Задача {job_id} возвращена в очередь: узел не отвечает")
+        for job_id in set(self._seen) - set(claimed):
+            self._seen.pop(job_id, None)
+        return requeued
+
+    def start_sweeper(self, interval=SWEEP_INTERVAL):
+        with self._seen_lock:
+            if self._sweeper is None:
+                self._sweeper_stop.clear()
+                self._sweeper = threading.Thread(target=self._sweep, args=(interval,), name="requeue-stale",
+                                                 daemon=True)
+                self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._sweeper_stop.set()
+        with self._seen_lock:
+            sweeper, self._sweeper = self._sweeper, None
+        if sweeper:
+            sweeper.join()
+
+    def _sweep(self, interval):
+        while not self._sweeper_stop.wait(interval):
+            try:
+                self.requeue_stale()
+            except OSError as e:
+                logging.warning(f"Не удалось проверить зависшие задачи: {e}")
+
+def resolve_path(root, spec, path):
+    return os.path.join(root, path) if spec.get("staged") else path
+
+def stage_spec(queue, job_id, spec):
+    data_dir = queue.data_dir(job_id)
+    os.makedirs(os.path.join(data_dir, "out"), exist_ok=True)
+    staged = dict(spec, staged=True, options=dict(spec["options"]))
+    input_name = os.path.basename(spec["input_file"])
+    shutil.copyfile(spec["input_file"], os.path.join(data_dir, input_name))
+    staged["input_file"] = os.path.relpath(os.path.join(data_dir, input_name), queue.root)
+    staged["output_file"] = os.path.relpath(os.path.join(data_dir, "out", os.path.basename(spec["output_file"])),
+                                            queue.root)
+    staged["options"]["extra_outputs"] = [
+        (os.path.relpath(os.path.join(data_dir, "out", os.path.basename(path)), queue.root), format, overrides)
+        for path, format, overrides in spec["options"].get("extra_outputs") or []
+    ]
+    return staged
+
+def collect_outputs(queue, spec, staged):
+    final_files = [spec["output_file"]] + [path for path, _, _ in spec["options"].get("extra_outputs") or []]
+    staged_files = [staged["output_file"]] + [path for path, _, _ in staged["options"]["extra_outputs"]]
+    for final_file, staged_file in zip(final_files, staged_files):
+        staged_file = os.path.join(queue.root, staged_file)
+        if os.path.exists(staged_file):
+            shutil.move(staged_file, final_file)
+
+class RemoteStats:
+    def __init__(self, worker, text):
+        self.worker = worker
+        self.text = text
+
+    def summary(self):
+        return f"{self.worker}: {self.text}" if self.text else self.worker
+
+class RemoteConversion:
+    def __init__(self, queue, input_file, output_file, format, crf=None, audio_bitrate=None, stage=False, **options):
+        self.queue = queue
+        self.input_file = input_file
+        self.output_file = output_file
+        self.format = format
+        self.stage = stage
+        self.spec = job_spec(input_file, output_file, format, crf, audio_bitrate, **options)
+        self.job_id = None
+        self.worker = None
+        self.skipped = False
+        self.metrics = None
+        self.error_output = ""
+        self._is_running = True
+
+    @property
+    def cancelled(self):
+        return not self._is_running
+
+    @property
+    def output_files(self):
+        return [self.output_file] + [path for path, _, _ in self.spec["options"].get("extra_outputs") or []]
+
+    def error_summary(self, max_lines=ERROR_SUMMARY_LINES):
+        return "\n".join(self.error_output.strip().splitlines()[-max_lines:])
+
+    def _submit(self):
+        spec = self.spec
+        if self.stage:
+            spec = stage_spec(self.queue, self.job_id, self.spec)
+        self.queue.submit(spec, self.job_id)
+        return spec
+
+    def _poll(self):
+        result = self.queue.result(self.job_id)
+        status = self.queue.status(self.job_id) if result is None else None
+        return result, status
+
+    async def run_async(self, on_progress=None, on_stats=None):
+        loop = asyncio.get_running_loop()
+        self.job_id = f"{time.time_ns():020d}_{uuid.uuid4().hex[:8]}"
+        try:
+            spec = await loop.run_in_executor(None, self._submit)
+        except OSError as e:
+            self.error_output = f"Не удалось поставить задачу в общую очередь: {e}"
+            await loop.run_in_executor(None, self.queue.cleanup, self.job_id)
+            return 1
+        logging.info(f"Задача {self.job_id} передана в общую очередь {self.queue.root}")
+
+        last_update = None
+        while self._is_running:
+            result, status = await loop.run_in_executor(None, self._poll)
+            if result is not None:
+                return await loop.run_in_executor(None, self._finish, spec, result)
+            if status and status.get("updated") != last_update:
+                last_update = status.get("updated")
+                self.worker = status.get("worker")
+                if on_progress:
+                    on_progress(int(status.get("progress", 0)))
+                if on_stats:
+                    on_stats(RemoteStats(self.worker, status.get("stats", "")))
+            await asyncio.sleep(POLL_INTERVAL)
+        await loop.run_in_executor(None, self.queue.cancel, self.job_id)
+        return 1
+
+    def _finish(self, spec, result):
+        return_code = result.get("return_code", 1)
+        self.worker = result.get("worker")
+        self.skipped = bool(result.get("skipped"))
+        self.error_output = result.get("error", "")
+        if result.get("metrics"):
+            self.metrics = JobMetrics(**result["metrics"])
+        try:
+            if return_code == 0 and self.stage:
+                collect_outputs(self.queue, self.spec, spec)
+        except OSError as e:
+            self.error_output = f"Не удалось забрать результат из общей папки: {e}"
+            return_code = 1
+        finally:
+            self.queue.cleanup(self.job_id)
+        logging.info(f"Задача {self.job_id} завершена на узле {self.worker}, код {return_code}")
+        return return_code
+
+    def stop(self):
+        self._is_running = False
+
+class WorkerJob:
+    def __init__(self, job_id, conversion):
+        self.job_id = job_id
+        self.conversion = conversion
+        self.progress = 0
+        self.stats = ""
+
+    def on_progress(self, value):
+        self.progress = value
+
+    def on_stats(self, stats):
+        self.stats = stats.summary()
+
+class Worker:
+    def __init__(self, root, jobs=1):
+        self.queue = SharedQueue(root)
+        self.jobs = max(1, jobs)
+        self.name = worker_name()
+        self.gate = ResourceGate()
+        self.active = {}
+        self._stopping = threading.Event()
+
+    def build_conversion(self, spec):
+        options = spec_options(spec)
+        root = self.queue.root
+        if spec.get("staged"):
+            options["extra_outputs"] = [(resolve_path(root, spec, path), format, overrides)
+                                        for path, format, overrides in options.get("extra_outputs") or []]
+        is_video = spec["format"] in VIDEO_FORMATS and spec["format"] != "gif"
+        options["threads"] = self.gate.plan(options, self.jobs, is_video)[0]
+        return Conversion(resolve_path(root, spec, spec["input_file"]), resolve_path(root, spec, spec["output_file"]),
+                          spec["format"], crf=spec.get("crf"), audio_bitrate=spec.get("audio_bitrate"), **options)
+
+    async def run_job(self, job):
+        conversion = job.conversion
+        is_video = conversion.format in VIDEO_FORMATS and conversion.format != "gif"
+        cost = self.gate.job_cost(conversion.threads, conversion.segment_jobs, is_video, self.jobs)
+        if not await self.gate.acquire(cost, conversion.output_file, lambda: conversion.cancelled):
+            return 1
+        try:
+            return await conversion.run_async(job.on_progress, job.on_stats)
+        finally:
+            self.gate.release(cost)
+
+    def heartbeat(self):
+        while not self._stopping.wait(HEARTBEAT_INTERVAL):
+            for job in list(self.active.values()):
+                if self.queue.is_cancelled(job.job_id):
+                    job.conversion.stop()
+                    continue
+                try:
+                    self.queue.heartbeat(job.job_id, {"worker": self.name, "progress": job.progress,
+                                                      "stats": job.stats})
+                except OSError as e:
+                    logging.warning(f"Не удалось обновить состояние задачи {job.job_id}: {e}")
+
+    def report(self, job, return_code):
+        conversion = job.conversion
+        if self.queue.is_cancelled(job.job_id):
+            logging.info(f"Задача {job.job_id} отменена координатором")
+            self.queue.cleanup(job.job_id)
+            print(f"STOP  {conversion.input_file}")
+            return
+        self.queue.finish(job.job_id, {
+            "worker": self.name,
+            "return_code": return_code,
+            "skipped": conversion.skipped,
+            "error": conversion.error_summary() if return_code else "",
+            "metrics": conversion.metrics.to_dict() if conversion.metrics else None
+        })
+        print(f"{'OK  ' if return_code == 0 else 'FAIL'}  {conversion.input_file}")
+
+    def stop(self):
+        self._stopping.set()
+        for job in list(self.active.values()):
+            job.conversion.stop()
+        self.gate.wake()
+
+    def release_unfinished(self, jobs):
+        for job in jobs:
+            if self.queue.is_cancelled(job.job_id):
+                self.queue.cleanup(job.job_id)
+            elif self.queue.requeue(job.job_id):
+                logging.info(f"Задача {job.job_id} возвращена в очередь при остановке узла")
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        heartbeat = threading.Thread(target=self.heartbeat, name="heartbeat", daemon=True)
+        heartbeat.start()
+        tasks = {}
+        try:
+            while not self._stopping.is_set():
+                await loop.run_in_executor(None, self.queue.requeue_stale)
+                while len(tasks) < self.jobs and not self._stopping.is_set():
+                    job_id, spec = await loop.run_in_executor(None, self.queue.claim)
+                    if job_id is None:
+                        break
+                    try:
+                        job = WorkerJob(job_id, self.build_conversion(spec))
+                    except (KeyError, TypeError, ValueError) as e:
+                        logging.error(f"Некорректная задача {job_id}: {e}")
+                        await loop.run_in_executor(None, self.queue.finish, job_id,
+                                                   {"worker": self.name, "return_code": 1, "error": str(e)})
+                        continue
+                    logging.info(f"Задача {job_id}: {job.conversion.input_file} -> {job.conversion.output_file}")
+                    self.active[job_id] = job
+                    await loop.run_in_executor(None, self.queue.heartbeat, job_id,
+                                               {"worker": self.name, "progress": 0, "stats": ""})
+                    tasks[asyncio.ensure_future(self.run_job(job))] = job
+                if not tasks:
+                    await asyncio.sleep(POLL_INTERVAL)
+                    continue
+                done, _ = await asyncio.wait(list(tasks), timeout=POLL_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+                if self._stopping.is_set():
+                    break
+                for task in done:
+                    job = tasks.pop(task)
+                    try:
+                        return_code = task.result()
+                    except Exception as e:
+                        logging.error(f"Ошибка в процессе конвертации: {e}")
+                        job.conversion.error_output = str(e)
+                        return_code = 1
+                    self.active.pop(job.job_id, None)
+                    await loop.run_in_executor(None, self.report, job, return_code)
+        finally:
+            self.stop()
+            if tasks:
+                await asyncio.wait(list(tasks))
+            await loop.run_in_executor(None, self.release_unfinished, list(tasks.values()))
+
+def run_worker(args):
+    try:
+        worker = Worker(args.worker, args.jobs)
+    except OSError as e:
+        print(f"Общая папка очереди недоступна: {e}", file=sys.stderr)
+        return 2
+    print(f"Узел {worker.name} ждет задачи в {worker.queue.root}. Для остановки нажмите Ctrl+C.")
+    try:
+        return asyncio.run(serve(worker))
+    except KeyboardInterrupt:
+        return 130
+
+async def serve(worker):
+    stopping = []
+
+    def stop(signum):
+        stopping.append(signum)
+        worker.stop()
+
+    add_signal_handlers([signal.SIGINT, signal.SIGTERM], stop)
+    await worker.run()
+    return 130 if signal.SIGINT in stopping else 0
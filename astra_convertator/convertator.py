@@ -1,17 +1,68 @@
 import sys
 import os
-import re
-import subprocess
+import json
+import time
 import logging
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+STARTUP_STARTED = time.perf_counter()
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = "astra_convertator"
+
 from PyQt6.QtWidgets import (QApplication, QWidget, QMainWindow, QVBoxLayout, QHBoxLayout,
                              QPushButton, QFileDialog, QLabel, QLineEdit, QComboBox,
                              QProgressBar, QMessageBox, QTabWidget, QFormLayout, QFrame,
-                             QButtonGroup, QGridLayout)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QMimeData, QSize, QTimer
-from PyQt6.QtGui import QIcon, QDragEnterEvent, QDropEvent, QPixmap, QColor, QPalette
+                             QButtonGroup, QGridLayout, QSpinBox, QTableWidget,
+                             QTableWidgetItem, QHeaderView, QAbstractItemView, QCheckBox,
+                             QDoubleSpinBox)
+from PyQt6.QtCore import Qt, QObject, pyqtSignal, QMimeData, QSize, QTimer
+from PyQt6.QtGui import QIcon, QImage, QDragEnterEvent, QDropEvent, QPixmap, QColor, QPalette, QGuiApplication
+
+from .engine import (VIDEO_FORMATS, AUDIO_FORMATS, MEDIA_EXTENSIONS, SEEK_ACCURATE, SEEK_FAST, Conversion,
+                     build_output_path, can_share_decode, decode_key, collect_media_files, default_worker_count,
+                     output_overrides, parse_time, trim_length)
+from .scheduler import ResourceGate, RECHECK_INTERVAL
+from .aio import get_loop_thread, shutdown_loop_thread
+from .logs import setup_logging
+from .settings import get_settings, data_path, cache_path
+from .gif import GIF_DEFAULT_FPS, GIF_DEFAULT_WIDTH
+from .twopass import parse_bitrate
+from .preview import generate_preview
+from .cluster import SharedQueue, RemoteConversion
+
+setup_logging(get_settings().log_level)
+
+ICON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pngs")
+ICON_CACHE_DIR = "icons"
 
-logging.basicConfig(filename="conversion.log", level=logging.INFO,
-                   format='%(asctime)s - %(levelname)s - %(message)s')
+_icons = {}
+
+def scaled_icon_path(name, size):
+    source = os.path.join(ICON_DIR, f"{name}.png")
+    if not os.path.exists(source):
+        return None
+    screen = QGuiApplication.primaryScreen()
+    pixels = size * max(1, round(screen.devicePixelRatio() if screen else 1))
+    cache_dir = cache_path(ICON_CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    cached = os.path.join(cache_dir, f"{name}_{pixels}_{os.stat(source).st_mtime_ns}.png")
+    if not os.path.exists(cached):
+        image = QImage(source).scaled(pixels, pixels, Qt.AspectRatioMode.KeepAspectRatio,
+                                      Qt.TransformationMode.SmoothTransformation)
+        temp_path = f"{cached}.{os.getpid()}.tmp.png"
+        if not image.save(temp_path):
+            return source
+        os.replace(temp_path, cached)
+    return cached
+
+def load_icon(name, size):
+    key = (name, size)
+    if key not in _icons:
+        _icons[key] = QIcon(scaled_icon_path(name, size) or "")
+    return _icons[key]
 
 class SettingsManager:
     def __init__(self):
@@ -21,7 +72,7 @@ class SettingsManager:
             "Синяя": self.blue_theme,
             "Системная": self.system_theme
         }
-        self.current_theme = "Светлая"
+        self.current_theme = get_settings().theme_title
         
     def apply_theme(self, theme_name, app):
         if theme_name in self.themes:
@@ -90,111 +141,38 @@ class SettingsManager:
             palette.setColor(QPalette.ColorRole.Text, Qt.GlobalColor.white)
         app.setPalette(palette)
 
-class ConverterThread(QThread):
+class ConversionTask(QObject):
     progress_signal = pyqtSignal(int)
     status_signal = pyqtSignal(str)
     finished_signal = pyqtSignal(int)
     error_signal = pyqtSignal(str)
 
-    def __init__(self, input_file, output_file, format, crf=None, audio_bitrate=None, parent=None):
+    def __init__(self, input_file, output_file, format, crf=None, audio_bitrate=None, parent=None,
+                 broker=None, **options):
         super().__init__(parent)
         self.input_file = input_file
         self.output_file = output_file
         self.format = format
         self.crf = crf
         self.audio_bitrate = audio_bitrate
-        self.process = None
-        self._is_running = True
-        self.duration = 0
+        self.cost = 0
+        if broker:
+            self.conversion = RemoteConversion(broker, input_file, output_file, format, crf=crf,
+                                               audio_bitrate=audio_bitrate, stage=get_settings().cluster_stage,
+                                               **options)
+        else:
+            self.conversion = Conversion(input_file, output_file, format, crf=crf,
+                                         audio_bitrate=audio_bitrate, **options)
 
-    def get_video_duration(self):
-        try:
-            cmd = ['ffprobe', '-v', 'error', '-show_entries', 
-                  'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', 
-                  self.input_file]
-            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            return float(result.stdout.strip())
-        except Exception as e:
-            logging.error(f"Ошибка получения длительности: {e}")
-            return 0
+    def start(self):
+        get_loop_thread().submit(self.run())
 
-    def run(self):
+    async def run(self):
         try:
-            self.duration = self.get_video_duration()
-            logging.info(f"Длительность видео: {self.duration} сек")
-
-            ffmpeg_cmd = ["ffmpeg", "-y", "-i", self.input_file]
-            
-            if self.format in ["mp4", "avi", "mov", "gif", "webm", "mkv"]:
-                ffmpeg_cmd.extend(["-c:v", "libx264"])
-                
-                if self.crf:
-                    ffmpeg_cmd.extend(["-crf", str(self.crf)])
-                
-                if self.format == "gif":
-                    ffmpeg_cmd.extend([
-                        "-vf", "fps=10,scale=640:-1:flags=lanczos",
-                        "-c:v", "gif"
-                    ])
-                elif self.format == "webm":
-                    ffmpeg_cmd.extend(["-c:v", "libvpx-vp9"])
-                
-                ffmpeg_cmd.extend([
-                    "-c:a", "aac",
-                    "-b:a", self.audio_bitrate if self.audio_bitrate else "128k"
-                ])
-            
-            elif self.format in ["mp3", "wav", "flac", "ogg", "aac"]:
-                ffmpeg_cmd.extend(["-vn"])
-                
-                if self.format == "mp3":
-                    ffmpeg_cmd.extend(["-c:a", "libmp3lame", "-q:a", "2"])
-                elif self.format == "flac":
-                    ffmpeg_cmd.extend(["-c:a", "flac"])
-                elif self.format == "ogg":
-                    ffmpeg_cmd.extend(["-c:a", "libvorbis"])
-                elif self.format == "aac":
-                    ffmpeg_cmd.extend(["-c:a", "aac"])
-                
-                if self.audio_bitrate:
-                    ffmpeg_cmd.extend(["-b:a", self.audio_bitrate])
-
-            ffmpeg_cmd.append(self.output_file)
-            
-            self.process = subprocess.Popen(
-                ffmpeg_cmd,
-                stderr=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                universal_newlines=True,
-                text=True
-            )
-
-            pattern = re.compile(r'time=(\d+):(\d+):(\d+).(\d+)')
-            
-            while self._is_running:
-                line = self.process.stderr.readline()
-                if not line:
-                    break
-                
-                match = pattern.search(line)
-                if match and self.duration > 0:
-                    hours, minutes, seconds, _ = map(float, match.groups())
-                    current_time = hours * 3600 + minutes * 60 + seconds
-                    progress = int((current_time / self.duration) * 100)
-                    self.progress_signal.emit(min(progress, 100))
-                
-                logging.debug(line.strip())
-
-            self.process.wait()
-            
-            if self.process.returncode == 0:
-                logging.info(f"Успешная конвертация в {self.output_file}")
-                self.progress_signal.emit(100)
+            if await self.conversion.run_async(self.progress_signal.emit, self.emit_stats) == 0:
                 self.finished_signal.emit(0)
             else:
-                error_msg = self.process.stderr.read()
-                logging.error(f"Ошибка конвертации: {error_msg}")
-                self.error_signal.emit(f"Ошибка FFmpeg: {error_msg}")
+                self.error_signal.emit(f"Ошибка FFmpeg: {self.conversion.error_summary()}")
                 self.finished_signal.emit(1)
 
         except Exception as e:
@@ -202,29 +180,298 @@ class ConverterThread(QThread):
             self.error_signal.emit(f"Ошибка: {str(e)}")
             self.finished_signal.emit(1)
 
+    def emit_stats(self, stats):
+        self.status_signal.emit(stats.summary())
+
     def stop(self):
-        self._is_running = False
-        if self.process:
-            self.process.terminate()
-        self.quit()
-        self.wait(2000)
+        self.conversion.stop()
+
+PENDING_JOBS_NAME = "pending_jobs.json"
+
+class ConversionJob:
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    SKIPPED = "skipped"
+
+    STATUS_TITLES = {
+        QUEUED: "В очереди",
+        RUNNING: "Выполняется",
+        DONE: "Готово",
+        FAILED: "Ошибка",
+        CANCELLED: "Отменено",
+        SKIPPED: "Без изменений"
+    }
+
+    def __init__(self, input_file, output_file, format, crf=None, audio_bitrate=None, **options):
+        self.input_file = input_file
+        self.output_file = output_file
+        self.format = format
+        self.crf = crf
+        self.audio_bitrate = audio_bitrate
+        self.options = options
+        self.status = self.QUEUED
+        self.progress = 0
+        self.attempts = 0
+        self.error = ""
+        self.stats_text = ""
+        self.metrics = None
+        self.task = None
+
+    @property
+    def formats(self):
+        return [self.format] + [format for _, format, _ in self.options.get("extra_outputs", [])]
+
+    @property
+    def status_title(self):
+        return self.STATUS_TITLES[self.status]
+
+    def is_active(self):
+        return self.status in (self.QUEUED, self.RUNNING)
+
+    def to_dict(self):
+        options = dict(self.options)
+        if options.get("profile"):
+            options["profile"] = options["profile"].name
+        return {
+            "input_file": self.input_file,
+            "output_file": self.output_file,
+            "format": self.format,
+            "crf": self.crf,
+            "audio_bitrate": self.audio_bitrate,
+            "options": options
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        options = dict(data.get("options", {}))
+        if options.get("profile"):
+            options["profile"] = get_settings().get_profile(options["profile"])
+        if options.get("extra_outputs"):
+            options["extra_outputs"] = [tuple(output) for output in options["extra_outputs"]]
+        return cls(data["input_file"], data["output_file"], data["format"],
+                   data.get("crf"), data.get("audio_bitrate"), **options)
+
+class ConversionQueue(QObject):
+    job_added = pyqtSignal(object)
+    job_changed = pyqtSignal(object)
+    jobs_reset = pyqtSignal()
+    queue_finished = pyqtSignal()
+    paused = pyqtSignal(str)
+
+    def __init__(self, max_workers=None, parent=None):
+        super().__init__(parent)
+        self.jobs = []
+        self.max_workers = max_workers or default_worker_count()
+        self.gate = ResourceGate()
+        self.broker = None
+        self.pause_reason = ""
+        self._recheck_timer = QTimer(self)
+        self._recheck_timer.setSingleShot(True)
+        self._recheck_timer.setInterval(int(RECHECK_INTERVAL * 1000))
+        self._recheck_timer.timeout.connect(self._schedule)
+
+    def set_max_workers(self, value):
+        self.max_workers = max(1, int(value))
+        logging.info(f"Параллельных задач: {self.max_workers}")
+        self._schedule()
+
+    def add_job(self, job):
+        self.jobs.append(job)
+        self.job_added.emit(job)
+        self._schedule()
+
+    def running_jobs(self):
+        return [job for job in self.jobs if job.status == ConversionJob.RUNNING]
+
+    def is_active(self):
+        return any(job.is_active() for job in self.jobs)
+
+    def overall_progress(self):
+        jobs = [job for job in self.jobs if job.status != ConversionJob.CANCELLED]
+        if not jobs:
+            return 0
+        return int(sum(job.progress for job in jobs) / len(jobs))
+
+    def cancel(self, job):
+        if job.status == ConversionJob.RUNNING:
+            job.status = ConversionJob.CANCELLED
+            job.task.stop()
+        elif job.status == ConversionJob.QUEUED:
+            job.status = ConversionJob.CANCELLED
+        else:
+            return
+        logging.info(f"Задача отменена: {job.input_file}")
+        self.job_changed.emit(job)
+        self._schedule()
+
+    def cancel_all(self):
+        for job in self.jobs:
+            if job.status == ConversionJob.QUEUED:
+                job.status = ConversionJob.CANCELLED
+        for job in self.running_jobs():
+            self.cancel(job)
+
+    def retry(self, job):
+        if job.status not in (ConversionJob.FAILED, ConversionJob.CANCELLED):
+            return
+        job.status = ConversionJob.QUEUED
+        job.progress = 0
+        job.error = ""
+        self.job_changed.emit(job)
+        self._schedule()
+
+    def save_pending(self, path=None):
+        path = path or data_path(PENDING_JOBS_NAME)
+        jobs = [job.to_dict() for job in self.jobs if job.is_active()]
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(jobs, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logging.warning(f"Не удалось сохранить очередь: {e}")
+        return len(jobs)
+
+    def load_pending(self, path=None):
+        path = path or data_path(PENDING_JOBS_NAME)
+        if not os.path.exists(path):
+            return []
+        try:
+            with open(path, encoding="utf-8") as f:
+                jobs = [ConversionJob.from_dict(data) for data in json.load(f)]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Не удалось прочитать сохраненную очередь: {e}")
+            jobs = []
+        os.remove(path)
+        return [job for job in jobs if os.path.exists(job.input_file)]
+
+    def clear_finished(self):
+        self.jobs = [job for job in self.jobs if job.is_active()]
+        self.jobs_reset.emit()
+
+    def get_broker(self):
+        cluster_dir = get_settings().cluster_dir
+        if cluster_dir and self.broker is None:
+            try:
+                self.broker = SharedQueue(cluster_dir)
+                self.broker.start_sweeper()
+                logging.info(f"Задачи передаются узлам через общую папку {cluster_dir}")
+            except OSError as e:
+                logging.warning(f"Общая папка очереди недоступна, задачи выполняются локально: {e}")
+                self.broker = False
+        return self.broker or None
+
+    def _schedule(self):
+        running = len(self.running_jobs())
+        reason = ""
+        broker = self.get_broker()
+        for job in self.jobs:
+            if running >= self.max_workers:
+                break
+            if job.status != ConversionJob.QUEUED:
+                continue
+            if broker:
+                self._start_job(job, broker=broker)
+                running += 1
+                continue
+            is_video = job.format in VIDEO_FORMATS and job.format != "gif"
+            threads, cost = self.gate.plan(job.options, self.max_workers, is_video)
+            reason = self.gate.try_acquire(cost, job.output_file) or ""
+            if reason:
+                self._recheck_timer.start()
+                break
+            self._start_job(job, threads, cost)
+            running += 1
+        if reason != self.pause_reason:
+            self.pause_reason = reason
+            if reason:
+                logging.info(f"Запуск задач приостановлен: {reason}")
+            self.paused.emit(reason)
+
+    def _release(self, task):
+        self.gate.release(task.cost)
+        task.cost = 0
+
+    def _start_job(self, job, threads=None, cost=0, broker=None):
+        job.status = ConversionJob.RUNNING
+        job.progress = 0
+        job.stats_text = ""
+        job.metrics = None
+        job.attempts += 1
+        job.task = ConversionTask(
+            input_file=job.input_file,
+            output_file=job.output_file,
+            format=job.format,
+            crf=job.crf,
+            audio_bitrate=job.audio_bitrate,
+            parent=self,
+            broker=broker,
+            **dict(job.options, threads=threads or job.options.get("threads"))
+        )
+        job.task.cost = cost
+        job.task.progress_signal.connect(partial(self._job_progress, job, job.task))
+        job.task.status_signal.connect(partial(self._job_stats, job, job.task))
+        job.task.error_signal.connect(partial(self._job_error, job, job.task))
+        job.task.finished_signal.connect(partial(self._job_finished, job, job.task))
+        logging.info(f"Запуск задачи ({job.attempts}): {job.input_file} -> {job.output_file}")
+        self.job_changed.emit(job)
+        job.task.start()
+
+    def _job_progress(self, job, task, value):
+        if job.task is not task or job.status != ConversionJob.RUNNING:
+            return
+        job.progress = value
+        self.job_changed.emit(job)
+
+    def _job_stats(self, job, task, text):
+        if job.task is not task or job.status != ConversionJob.RUNNING:
+            return
+        job.stats_text = text
+        self.job_changed.emit(job)
+
+    def _job_error(self, job, task, message):
+        if job.task is not task or job.status != ConversionJob.RUNNING:
+            return
+        job.error = message
+
+    def _job_finished(self, job, task, return_code):
+        self._release(task)
+        if job.task is not task or job.status != ConversionJob.RUNNING:
+            self._schedule()
+            return
+        job.metrics = task.conversion.metrics
+        if return_code == 0:
+            job.status = ConversionJob.SKIPPED if task.conversion.skipped else ConversionJob.DONE
+            job.progress = 100
+        else:
+            job.status = ConversionJob.FAILED
+        self.job_changed.emit(job)
+        self._schedule()
+        if not self.is_active():
+            self.queue_finished.emit()
 
 class MediaConverter:
     def __init__(self, main_window):
         self.main_window = main_window
-        self.converter_thread = None
+        self.queue = ConversionQueue(parent=main_window)
+        self.queue.job_changed.connect(self.update_progress)
+        self.queue.queue_finished.connect(self.conversion_finished)
+        self.queue.paused.connect(self.update_progress)
 
     def validate_input(self):
-        if not self.main_window.ui.drag_drop_area.file_path:
+        file_paths = self.main_window.ui.drag_drop_area.file_paths
+        if not file_paths:
             QMessageBox.critical(self.main_window, "Ошибка", "Пожалуйста, укажите входной файл.")
             return False
-        if not os.path.exists(self.main_window.ui.drag_drop_area.file_path):
-            QMessageBox.critical(self.main_window, "Ошибка", "Указанный входной файл не существует.")
+        missing = [path for path in file_paths if not os.path.exists(path)]
+        if missing:
+            QMessageBox.critical(self.main_window, "Ошибка", f"Указанный входной файл не существует:\n{missing[0]}")
             return False
         return True
 
-    def get_output_file(self, output_format):
-        default_name = os.path.splitext(os.path.basename(self.main_window.ui.drag_drop_area.file_path))[0] + f".{output_format}"
+    def get_output_file(self, input_file, output_format):
+        default_name = os.path.splitext(os.path.basename(input_file))[0] + f".{output_format}"
         return QFileDialog.getSaveFileName(
             self.main_window, 
             "Сохранить файл как...", 
@@ -232,90 +479,211 @@ class MediaConverter:
             f"{output_format.upper()} файлы (*.{output_format})"
         )[0]
 
-    def get_output_format(self):
-        if self.main_window.ui.tab_widget.currentIndex() == 0:  # Видео вкладка
-            if self.main_window.ui.video_format_group.checkedButton():
-                return self.main_window.ui.video_format_group.checkedButton().toolTip().lower()
-        elif self.main_window.ui.tab_widget.currentIndex() == 1:  # Аудио вкладка
-            if self.main_window.ui.audio_format_group.checkedButton():
-                return self.main_window.ui.audio_format_group.checkedButton().toolTip().lower()
-        return None
+    def get_output_dir(self):
+        return QFileDialog.getExistingDirectory(self.main_window, "Папка для сохранения файлов")
+
+    def get_output_formats(self):
+        formats = []
+        for group in (getattr(self.main_window.ui, 'video_format_group', None),
+                      getattr(self.main_window.ui, 'audio_format_group', None)):
+            if group is None:
+                continue
+            formats.extend(button.toolTip().lower() for button in group.buttons() if button.isChecked())
+        return formats
     
     def get_crf_value(self):
         return self.main_window.ui.crf_combo.currentData()
     
     def get_audio_bitrate(self):
+        if not hasattr(self.main_window.ui, 'audio_bitrate_combo'):
+            return get_settings().audio_bitrate
         return self.main_window.ui.audio_bitrate_combo.currentData()
+
+    def get_segment_jobs(self):
+        if self.main_window.ui.segments_checkbox.isChecked():
+            return os.cpu_count() or 1
+        return None
+
+    def get_bitrate_options(self, output_format):
+        if output_format not in VIDEO_FORMATS or output_format == "gif":
+            return {}
+        ui = self.main_window.ui
+        return {
+            "target_size": int(ui.target_size_spin.value() * 1024 * 1024) or None,
+            "video_bitrate": ui.video_bitrate_edit.text().strip() or None
+        }
+
+    def get_gif_options(self, output_format):
+        if output_format != "gif":
+            return {}
+        ui = self.main_window.ui
+        return {
+            "gif_fps": ui.gif_fps_spin.value(),
+            "gif_width": ui.gif_width_spin.value(),
+            "gif_max_size": int(ui.gif_max_size_spin.value() * 1024 * 1024) or None
+        }
+
+    def get_clip_options(self, output_format):
+        name = 'video_clip_controls' if output_format in VIDEO_FORMATS else 'audio_clip_controls'
+        controls = getattr(self.main_window.ui, name, None)
+        return controls.options() if controls else {}
+
+    def get_loudnorm(self, output_format):
+        checkbox = getattr(self.main_window.ui, 'loudnorm_checkbox', None)
+        if output_format not in AUDIO_FORMATS or checkbox is None or not checkbox.isChecked():
+            return None
+        return get_settings().loudnorm_target
+
+    def is_incremental(self):
+        return hasattr(self.main_window.ui, 'incremental_checkbox') and self.main_window.ui.incremental_checkbox.isChecked()
+
+    def get_profile(self):
+        return get_settings().get_profile(self.main_window.ui.profile_combo.currentData())
     
+    def get_format_options(self, output_format, profile):
+        settings = get_settings()
+        options = {
+            "crf": self.get_crf_value() if output_format in VIDEO_FORMATS else None,
+            "audio_bitrate": self.get_audio_bitrate() if output_format in AUDIO_FORMATS else settings.audio_bitrate,
+            "profile": profile,
+            "video_codec": settings.video_codec,
+            "audio_codec": settings.audio_codec,
+            "remux": self.main_window.ui.remux_checkbox.isChecked(),
+            "smart": settings.smart_parameters,
+            "loudnorm": self.get_loudnorm(output_format),
+            "segment_jobs": self.get_segment_jobs() if output_format in VIDEO_FORMATS else None,
+            "incremental": self.is_incremental()
+        }
+        options.update(self.get_gif_options(output_format))
+        options.update(self.get_bitrate_options(output_format))
+        options.update(self.get_clip_options(output_format))
+        return options
+
     def start_conversion(self):
         if not self.validate_input():
             return
 
-        output_format = self.get_output_format()
-        if not output_format:
+        output_formats = self.get_output_formats()
+        if not output_formats:
             QMessageBox.critical(self.main_window, "Ошибка", "Пожалуйста, выберите формат для конвертации.")
             return
 
-        output_file = self.get_output_file(output_format)
-        if not output_file:
+        input_files = self.main_window.ui.drag_drop_area.file_paths
+        if len(input_files) == 1 and len(output_formats) == 1:
+            output_file = self.get_output_file(input_files[0], output_formats[0])
+            if not output_file:
+                return
+            output_paths = {(input_files[0], output_formats[0]): output_file}
+        else:
+            output_dir = self.get_output_dir()
+            if not output_dir:
+                return
+            output_paths = {
+                (path, output_format): build_output_path(path, output_dir, output_format)
+                for path in input_files for output_format in output_formats
+            }
+
+        video_bitrate = self.main_window.ui.video_bitrate_edit.text().strip()
+        if video_bitrate and any(output_format in VIDEO_FORMATS for output_format in output_formats):
+            try:
+                parse_bitrate(video_bitrate)
+            except ValueError as e:
+                QMessageBox.critical(self.main_window, "Ошибка", str(e))
+                return
+
+        try:
+            for output_format in output_formats:
+                self.get_clip_options(output_format)
+        except ValueError as e:
+            QMessageBox.critical(self.main_window, "Ошибка", f"Неверный фрагмент: {e}")
             return
 
         self.prepare_conversion()
 
-        if self.converter_thread and self.converter_thread.isRunning():
-            self.converter_thread.stop()
+        profile = self.get_profile()
+        logging.info(f"Профиль кодирования: {profile.title}")
 
-        self.converter_thread = ConverterThread(
-            input_file=self.main_window.ui.drag_drop_area.file_path,
-            output_file=output_file,
-            format=output_format,
-            crf=self.get_crf_value() if output_format in ["mp4", "avi", "mov", "gif", "webm", "mkv"] else None,
-            audio_bitrate=self.get_audio_bitrate() if output_format in ["mp3", "wav", "flac", "ogg", "aac"] else "128k",
-            parent=self.main_window
-        )
-        
-        self.converter_thread.finished_signal.connect(self.conversion_finished)
-        self.converter_thread.error_signal.connect(self.conversion_error)
-        self.converter_thread.progress_signal.connect(self.update_progress)
-        self.converter_thread.start()
+        format_options = {output_format: self.get_format_options(output_format, profile) for output_format in output_formats}
+        shared_formats = [fmt for fmt in output_formats if can_share_decode(fmt, format_options[fmt])]
+        shared_formats = [fmt for fmt in shared_formats
+                          if decode_key(format_options[fmt]) == decode_key(format_options[shared_formats[0]])]
+        separate_formats = [fmt for fmt in output_formats if fmt not in shared_formats]
 
-    def update_progress(self, value):
+        for input_file in input_files:
+            if shared_formats:
+                primary_format = shared_formats[0]
+                extra_outputs = [
+                    (output_paths[(input_file, fmt)], fmt, output_overrides(format_options[fmt]))
+                    for fmt in shared_formats[1:]
+                ]
+                self.queue.add_job(ConversionJob(
+                    input_file=input_file,
+                    output_file=output_paths[(input_file, primary_format)],
+                    format=primary_format,
+                    extra_outputs=extra_outputs,
+                    **format_options[primary_format]
+                ))
+            for output_format in separate_formats:
+                self.queue.add_job(ConversionJob(
+                    input_file=input_file,
+                    output_file=output_paths[(input_file, output_format)],
+                    format=output_format,
+                    **format_options[output_format]
+                ))
+
+    def update_progress(self, job=None):
+        value = self.queue.overall_progress()
         self.main_window.ui.progress_bar.setValue(value)
-        self.main_window.ui.progress_label.setText(f"Прогресс: {value}%")
+        running = len(self.queue.running_jobs())
+        text = f"Прогресс: {value}% (выполняется задач: {running})"
+        if self.queue.pause_reason:
+            text += f"\nОжидание запуска: {self.queue.pause_reason}"
+        self.main_window.ui.progress_label.setText(text)
 
     def prepare_conversion(self):
-        self.main_window.ui.convert_button.setEnabled(False)
+        if not self.queue.is_active():
+            self.queue.clear_finished()
         self.main_window.ui.progress_bar.setValue(0)
         if hasattr(self.main_window.ui, 'progress_label'):
             self.main_window.ui.progress_label.setText("Прогресс: 0%")
 
-    def conversion_error(self, message):
-        QMessageBox.critical(self.main_window, "Ошибка", message)
-        self.main_window.ui.convert_button.setEnabled(True)
+    def conversion_finished(self):
+        jobs = self.queue.jobs
+        done = [job for job in jobs if job.status == ConversionJob.DONE]
+        skipped = [job for job in jobs if job.status == ConversionJob.SKIPPED]
+        failed = [job for job in jobs if job.status == ConversionJob.FAILED]
+        if not done and not failed:
+            if skipped:
+                QMessageBox.information(self.main_window, "Успех",
+                                        f"Все файлы уже сконвертированы с теми же параметрами: {len(skipped)}")
+            return
 
-    def conversion_finished(self, return_code):
-        self.main_window.ui.convert_button.setEnabled(True)
-        
-        if return_code == 0:
-            QMessageBox.information(
-                self.main_window,
-                "Успех",
-                f"Конвертация успешно завершена!\nФайл сохранен как:\n{os.path.basename(self.converter_thread.output_file)}"
-            )
+        if not failed:
+            if len(done) == 1:
+                message = f"Конвертация успешно завершена!\nФайл сохранен как:\n{os.path.basename(done[0].output_file)}"
+            else:
+                message = f"Конвертация успешно завершена!\nОбработано файлов: {len(done)}"
+            if skipped:
+                message += f"\nПропущено без изменений: {len(skipped)}"
+            QMessageBox.information(self.main_window, "Успех", message)
         else:
             QMessageBox.warning(
                 self.main_window,
                 "Ошибка",
-                "Конвертация не выполнена! Проверьте лог для подробностей."
+                f"Конвертация не выполнена для файлов: {len(failed)} из {len(done) + len(failed)}!\n"
+                "Проверьте лог для подробностей."
             )
 
 class RoundedButton(QPushButton):
-    def __init__(self, text, icon_path=None, parent=None):
+    ICON_SIZE = 24
+
+    def __init__(self, text, icon_name=None, parent=None):
         super().__init__(text, parent)
         self.setFixedSize(150, 50)
-        if icon_path:
-            self.setIcon(QIcon(icon_path))
-            self.setIconSize(QSize(24, 24))
+        self.icon_name = icon_name
+        if icon_name:
+            self.setIconSize(QSize(self.ICON_SIZE, self.ICON_SIZE))
+            QTimer.singleShot(0, self.load_icon)
         self.setStyleSheet("""
             QPushButton {
                 background-color: #20B2AA;
@@ -337,11 +705,17 @@ class RoundedButton(QPushButton):
             }
         """)
 
+    def load_icon(self):
+        self.setIcon(load_icon(self.icon_name, self.ICON_SIZE))
+
 class IconOnlyButton(QPushButton):
-    def __init__(self, icon_path, parent=None):
+    ICON_SIZE = 48
+
+    def __init__(self, icon_name, parent=None):
         super().__init__("", parent)
-        self.setIcon(QIcon(icon_path))
-        self.setIconSize(QSize(48, 48))
+        self.icon_name = icon_name
+        self.setIconSize(QSize(self.ICON_SIZE, self.ICON_SIZE))
+        QTimer.singleShot(0, self.load_icon)
         self.setStyleSheet("""
             QPushButton {
                 border: 1px solid #8f8f91;
@@ -361,24 +735,64 @@ class IconOnlyButton(QPushButton):
         """)
         self.setCheckable(True)
 
+    def load_icon(self):
+        self.setIcon(load_icon(self.icon_name, self.ICON_SIZE))
+
+PREVIEW_WORKERS = 2
+PREVIEW_HEIGHT = 64
+DROP_AREA_HEIGHT = 120
+
+class PreviewLoader(QObject):
+    ready = pyqtSignal(str, list)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.executor = ThreadPoolExecutor(max_workers=PREVIEW_WORKERS, thread_name_prefix="preview")
+
+    def request(self, path):
+        self.executor.submit(generate_preview, path).add_done_callback(partial(self._done, path))
+
+    def _done(self, path, future):
+        if future.cancelled():
+            return
+        try:
+            images = future.result()
+        except Exception as e:
+            logging.warning(f"Ошибка создания превью для {path}: {e}")
+            images = []
+        try:
+            self.ready.emit(path, images)
+        except RuntimeError:
+            pass
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
 class DragDropArea(QFrame):
-    def __init__(self, main_window, parent=None):
+    def __init__(self, main_window, settings_manager=None, parent=None):
         super().__init__(parent)
         self.main_window = main_window
+        self.settings_manager = settings_manager
         self.setAcceptDrops(True)
-        self.setFixedHeight(120)
+        self.setFixedHeight(DROP_AREA_HEIGHT)
         
         self.layout = QVBoxLayout(self)
-        self.label = QLabel("Перетащите файл сюда или кликните для выбора")
+        self.label = QLabel("Перетащите файлы или папку сюда или кликните для выбора\n(правый клик — выбрать папку)")
         self.label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.label.setStyleSheet("font-size: 14px;")
         self.layout.addWidget(self.label)
-        self.file_path = ""
+        self.preview_layout = QHBoxLayout()
+        self.preview_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.layout.addLayout(self.preview_layout)
+        self.file_paths = []
+        self.preview_path = None
+        self.preview_loader = PreviewLoader(self)
+        self.preview_loader.ready.connect(self.show_preview)
         
         self.update_style()
 
     def update_style(self):
-        theme = getattr(self.main_window, 'ui', None) and self.main_window.ui.settings_manager.current_theme or "Светлая"
+        theme = self.settings_manager.current_theme if self.settings_manager else "Светлая"
         
         if theme == "Тёмная":
             self.setStyleSheet("""
@@ -431,31 +845,190 @@ class DragDropArea(QFrame):
     def dragLeaveEvent(self, event):
         self.update_style()
 
+    def set_files(self, paths):
+        file_paths = collect_media_files(paths)
+        if not file_paths:
+            self.update_style()
+            return
+        self.file_paths = file_paths
+        if len(file_paths) == 1:
+            self.label.setText(os.path.basename(file_paths[0]))
+        else:
+            self.label.setText(f"Выбрано файлов: {len(file_paths)}\nПревью: {os.path.basename(file_paths[0])}")
+        self.clear_preview()
+        self.preview_path = file_paths[0]
+        self.preview_loader.request(self.preview_path)
+        self.setStyleSheet("""
+            QFrame {
+                border: 2px solid #20B2AA;
+                border-radius: 5px;
+            }
+            QLabel {
+                color: inherit;
+            }
+        """)
+
+    def clear_preview(self):
+        while self.preview_layout.count():
+            widget = self.preview_layout.takeAt(0).widget()
+            if widget:
+                widget.deleteLater()
+        self.setFixedHeight(DROP_AREA_HEIGHT)
+
+    def show_preview(self, path, images):
+        if path != self.preview_path:
+            return
+        self.clear_preview()
+        for image in images:
+            pixmap = QPixmap(image)
+            if pixmap.isNull():
+                continue
+            thumbnail = QLabel()
+            thumbnail.setStyleSheet("border: none;")
+            thumbnail.setPixmap(pixmap.scaledToHeight(PREVIEW_HEIGHT, Qt.TransformationMode.SmoothTransformation))
+            self.preview_layout.addWidget(thumbnail)
+        if self.preview_layout.count():
+            self.setFixedHeight(DROP_AREA_HEIGHT + PREVIEW_HEIGHT)
+
     def dropEvent(self, event):
         if event.mimeData().hasUrls():
-            urls = event.mimeData().urls()
-            if urls and os.path.isfile(urls[0].toLocalFile()):
-                self.file_path = urls[0].toLocalFile()
-                self.label.setText(os.path.basename(self.file_path))
-                self.setStyleSheet("""
-                    QFrame {
-                        border: 2px solid #20B2AA;
-                        border-radius: 5px;
-                    }
-                    QLabel {
-                        color: inherit;
-                    }
-                """)
+            self.set_files([url.toLocalFile() for url in event.mimeData().urls() if url.isLocalFile()])
 
     def mousePressEvent(self, event):
         if event.button() == Qt.MouseButton.LeftButton:
             self.main_window.open_file_dialog()
+        elif event.button() == Qt.MouseButton.RightButton:
+            self.main_window.open_folder_dialog()
+
+class JobListWidget(QTableWidget):
+    def __init__(self, queue, parent=None):
+        super().__init__(0, 5, parent)
+        self.queue = queue
+        self.rows = {}
+        
+        self.setHorizontalHeaderLabels(["Файл", "Формат", "Прогресс", "Статус", ""])
+        header = self.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        for column in range(1, 5):
+            header.setSectionResizeMode(column, QHeaderView.ResizeMode.ResizeToContents)
+        self.verticalHeader().hide()
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        
+        queue.job_added.connect(self.add_job)
+        queue.job_changed.connect(self.update_job)
+        queue.jobs_reset.connect(self.reload)
+
+    def reload(self):
+        self.setRowCount(0)
+        self.rows = {}
+        for job in self.queue.jobs:
+            self.add_job(job)
+
+    def add_job(self, job):
+        row = self.rowCount()
+        self.insertRow(row)
+        self.rows[job] = row
+        
+        self.setItem(row, 0, QTableWidgetItem(os.path.basename(job.input_file)))
+        self.setItem(row, 1, QTableWidgetItem("+".join(fmt.upper() for fmt in job.formats)))
+        self.setItem(row, 3, QTableWidgetItem())
+        
+        progress_bar = QProgressBar()
+        progress_bar.setTextVisible(True)
+        self.setCellWidget(row, 2, progress_bar)
+        
+        action_button = QPushButton()
+        action_button.clicked.connect(lambda: self.toggle_job(job))
+        self.setCellWidget(row, 4, action_button)
+        
+        self.update_job(job)
+
+    def toggle_job(self, job):
+        if job.is_active():
+            self.queue.cancel(job)
+        else:
+            self.queue.retry(job)
+
+    def update_job(self, job):
+        row = self.rows.get(job)
+        if row is None:
+            return
+        self.cellWidget(row, 2).setValue(job.progress)
+        self.item(row, 0).setToolTip(f"{job.input_file}\n-> {job.output_file}")
+        status_item = self.item(row, 3)
+        if job.status == ConversionJob.RUNNING and job.stats_text:
+            status_item.setText(f"{job.status_title} ({job.stats_text})")
+        else:
+            status_item.setText(job.status_title)
+        status_item.setToolTip(job.error or (job.metrics.summary() if job.metrics else ""))
+        action_button = self.cellWidget(row, 4)
+        action_button.setText("Отмена" if job.is_active() else "Повтор")
+        action_button.setEnabled(job.status not in (ConversionJob.DONE, ConversionJob.SKIPPED))
+
+class ClipControls(QWidget):
+    HEIGHTS = [1080, 720, 480, 360]
+    FRAME_RATES = [60, 30, 25, 24]
+
+    def __init__(self, with_video=False, parent=None):
+        super().__init__(parent)
+        layout = QFormLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        time_layout = QHBoxLayout()
+        self.start_edit = QLineEdit()
+        self.start_edit.setPlaceholderText("начало, напр. 1:30")
+        self.end_edit = QLineEdit()
+        self.end_edit.setPlaceholderText("конец")
+        self.duration_edit = QLineEdit()
+        self.duration_edit.setPlaceholderText("или длительность")
+        time_layout.addWidget(self.start_edit)
+        time_layout.addWidget(self.end_edit)
+        time_layout.addWidget(self.duration_edit)
+        layout.addRow("Фрагмент:", time_layout)
+
+        self.seek_combo = QComboBox()
+        self.seek_combo.addItem("Точно по кадру", SEEK_ACCURATE)
+        self.seek_combo.addItem("Быстро, по ключевым кадрам", SEEK_FAST)
+        self.seek_combo.setToolTip("Точный переход декодирует только от ближайшего предшествующего ключевого кадра")
+        layout.addRow("Переход к началу:", self.seek_combo)
+
+        self.height_combo = None
+        self.fps_combo = None
+        if with_video:
+            self.height_combo = QComboBox()
+            self.height_combo.addItem("Исходное", None)
+            for height in self.HEIGHTS:
+                self.height_combo.addItem(f"{height}p", height)
+            self.height_combo.setToolTip("Видео только уменьшается, увеличение не выполняется")
+            layout.addRow("Разрешение:", self.height_combo)
+
+            self.fps_combo = QComboBox()
+            self.fps_combo.addItem("Исходная", None)
+            for fps in self.FRAME_RATES:
+                self.fps_combo.addItem(f"{fps} кадр/с", fps)
+            layout.addRow("Частота кадров:", self.fps_combo)
+
+    def options(self):
+        trim_start = parse_time(self.start_edit.text().strip())
+        trim_duration = trim_length(trim_start, parse_time(self.end_edit.text().strip()),
+                                    parse_time(self.duration_edit.text().strip()))
+        options = {
+            "trim_start": trim_start,
+            "trim_duration": trim_duration,
+            "seek_mode": self.seek_combo.currentData()
+        }
+        if self.height_combo is not None:
+            options["video_height"] = self.height_combo.currentData()
+            options["video_fps"] = self.fps_combo.currentData()
+        return options
 
 class MediaConverterUI:
-    def __init__(self, main_window):
+    def __init__(self, main_window, settings_manager=None):
         self.main_window = main_window
         self.tab_widget = None
-        self.settings_manager = SettingsManager()
+        self.settings_manager = settings_manager or SettingsManager()
+        self.built_tabs = set()
         self.setup_ui()
 
     def setup_ui(self):
@@ -467,7 +1040,7 @@ class MediaConverterUI:
     def setup_main_window(self):
         self.main_window.setWindowTitle("Конвертер Медиа")
         self.main_window.setWindowIcon(QIcon("icon.png"))
-        self.main_window.setGeometry(100, 100, 850, 600)
+        self.main_window.setGeometry(100, 100, 850, 750)
         self.central_widget = QWidget()
         self.main_window.setCentralWidget(self.central_widget)
         self.main_layout = QHBoxLayout(self.central_widget)
@@ -477,9 +1050,9 @@ class MediaConverterUI:
         self.left_panel.setContentsMargins(15, 20, 15, 20)
         self.left_panel.setSpacing(15)
         
-        self.video_mode_button = RoundedButton("Видео", "pngs/video.png")
-        self.audio_mode_button = RoundedButton("Аудио", "pngs/audio.png")
-        self.settings_button = RoundedButton("Настройки", "pngs/settings.png")
+        self.video_mode_button = RoundedButton("Видео", "video")
+        self.audio_mode_button = RoundedButton("Аудио", "audio")
+        self.settings_button = RoundedButton("Настройки", "settings")
         
         self.video_mode_button.setCheckable(True)
         self.audio_mode_button.setCheckable(True)
@@ -500,32 +1073,32 @@ class MediaConverterUI:
         self.tab_widget = QTabWidget()
         self.tab_widget.tabBar().hide()
         
-        self.setup_video_tab()
-        self.setup_audio_tab()
-        self.setup_settings_tab()
+        self.video_tab = QWidget()
+        self.audio_tab = QWidget()
+        self.settings_tab = QWidget()
+        self.tab_builders = [self.setup_video_tab, self.setup_audio_tab, self.setup_settings_tab]
+        self.ensure_tab(0)
         
         self.tab_widget.addTab(self.video_tab, "")
         self.tab_widget.addTab(self.audio_tab, "")
         self.tab_widget.addTab(self.settings_tab, "")
+        self.tab_widget.currentChanged.connect(self.ensure_tab)
+
+    def ensure_tab(self, index):
+        if index not in self.built_tabs:
+            self.built_tabs.add(index)
+            self.tab_builders[index]()
 
     def setup_video_tab(self):
-        self.video_tab = QWidget()
         video_layout = QVBoxLayout(self.video_tab)
         
         video_formats_frame = QFrame()
         video_formats_layout = QGridLayout(video_formats_frame)
         
         self.video_format_group = QButtonGroup()
-        self.video_format_group.setExclusive(True)
-        for i, (fmt, icon) in enumerate([
-            ("mp4", "pngs/mp4.png"),
-            ("avi", "pngs/avi.png"), 
-            ("mov", "pngs/mov.png"),
-            ("gif", "pngs/gif.png"),
-            ("webm", "pngs/webm.png"),
-            ("mkv", "pngs/mkv.png")
-        ]):
-            btn = IconOnlyButton(icon)
+        self.video_format_group.setExclusive(False)
+        for i, fmt in enumerate(["mp4", "avi", "mov", "gif", "webm", "mkv"]):
+            btn = IconOnlyButton(fmt)
             btn.setToolTip(fmt.upper())
             self.video_format_group.addButton(btn, i)
             video_formats_layout.addWidget(btn, i//3, i%3)
@@ -540,31 +1113,92 @@ class MediaConverterUI:
         self.crf_combo.addItem("Среднее (CRF 26)", 26)
         self.crf_combo.addItem("Экономное (CRF 28)", 28)
         self.crf_combo.setCurrentIndex(2)
+        crf_index = self.crf_combo.findData(get_settings().crf)
+        if crf_index >= 0:
+            self.crf_combo.setCurrentIndex(crf_index)
     
         quality_layout.addWidget(self.crf_combo)
         
+        target_layout = QHBoxLayout()
+        target_layout.addWidget(QLabel("Размер файла:"))
+        
+        self.target_size_spin = QDoubleSpinBox()
+        self.target_size_spin.setRange(0, 100000)
+        self.target_size_spin.setDecimals(1)
+        self.target_size_spin.setSuffix(" МБ")
+        self.target_size_spin.setSpecialValueText("по качеству (CRF)")
+        self.target_size_spin.setToolTip("Рассчитать битрейт по длительности и кодировать в два прохода")
+        
+        self.video_bitrate_edit = QLineEdit()
+        self.video_bitrate_edit.setPlaceholderText("или битрейт, напр. 2500k")
+        
+        target_layout.addWidget(self.target_size_spin)
+        target_layout.addWidget(self.video_bitrate_edit)
+        
+        profile_layout = QHBoxLayout()
+        profile_layout.addWidget(QLabel("Скорость кодирования:"))
+        
+        self.profile_combo = QComboBox()
+        for name, profile in get_settings().profiles().items():
+            self.profile_combo.addItem(profile.title, name)
+        self.profile_combo.setCurrentIndex(max(0, self.profile_combo.findData(get_settings().profile)))
+        
+        profile_layout.addWidget(self.profile_combo)
+        
+        self.remux_checkbox = QCheckBox("Без перекодирования, если кодеки совместимы с форматом")
+        self.remux_checkbox.setChecked(True)
+        
+        self.segments_checkbox = QCheckBox("Делить длинные видео на сегменты и кодировать на всех ядрах")
+        
+        self.video_clip_controls = ClipControls(with_video=True)
+        
+        gif_layout = QHBoxLayout()
+        gif_layout.addWidget(QLabel("GIF:"))
+        
+        self.gif_fps_spin = QSpinBox()
+        self.gif_fps_spin.setRange(1, 30)
+        self.gif_fps_spin.setValue(GIF_DEFAULT_FPS)
+        self.gif_fps_spin.setSuffix(" кадр/с")
+        
+        self.gif_width_spin = QSpinBox()
+        self.gif_width_spin.setRange(80, 1920)
+        self.gif_width_spin.setSingleStep(40)
+        self.gif_width_spin.setValue(GIF_DEFAULT_WIDTH)
+        self.gif_width_spin.setSuffix(" px")
+        
+        self.gif_max_size_spin = QDoubleSpinBox()
+        self.gif_max_size_spin.setRange(0, 1000)
+        self.gif_max_size_spin.setDecimals(1)
+        self.gif_max_size_spin.setSuffix(" МБ")
+        self.gif_max_size_spin.setSpecialValueText("без лимита")
+        self.gif_max_size_spin.setToolTip("Подобрать частоту кадров и ширину, чтобы уложиться в размер")
+        
+        gif_layout.addWidget(self.gif_fps_spin)
+        gif_layout.addWidget(self.gif_width_spin)
+        gif_layout.addWidget(QLabel("Лимит:"))
+        gif_layout.addWidget(self.gif_max_size_spin)
+        
         video_layout.addWidget(QLabel("Выберите формат:"))
         video_layout.addWidget(video_formats_frame)
         video_layout.addLayout(quality_layout)
+        video_layout.addLayout(target_layout)
+        video_layout.addLayout(profile_layout)
+        video_layout.addWidget(self.remux_checkbox)
+        video_layout.addWidget(self.segments_checkbox)
+        video_layout.addLayout(gif_layout)
+        video_layout.addWidget(self.video_clip_controls)
         video_layout.addStretch()
 
     def setup_audio_tab(self):
-        self.audio_tab = QWidget()
         audio_layout = QVBoxLayout(self.audio_tab)
         
         audio_formats_frame = QFrame()
         audio_formats_layout = QGridLayout(audio_formats_frame)
         
         self.audio_format_group = QButtonGroup()
-        self.audio_format_group.setExclusive(True)
-        for i, (fmt, icon) in enumerate([
-            ("mp3", "pngs/mp3.png"),
-            ("wav", "pngs/wav.png"), 
-            ("flac", "pngs/flac.png"),
-            ("ogg", "pngs/ogg.png"),
-            ("aac", "pngs/aac.png")
-        ]):
-            btn = IconOnlyButton(icon)
+        self.audio_format_group.setExclusive(False)
+        for i, fmt in enumerate(["mp3", "wav", "flac", "ogg", "aac"]):
+            btn = IconOnlyButton(fmt)
             btn.setToolTip(fmt.upper())
             self.audio_format_group.addButton(btn, i)
             audio_formats_layout.addWidget(btn, i//3, i%3)
@@ -579,16 +1213,29 @@ class MediaConverterUI:
         self.audio_bitrate_combo.addItem("Базовое (128 kbps)", "128k")
         self.audio_bitrate_combo.addItem("Экономное (64 kbps)", "64k")
         self.audio_bitrate_combo.setCurrentIndex(3)
+        bitrate_index = self.audio_bitrate_combo.findData(get_settings().audio_bitrate)
+        if bitrate_index < 0:
+            self.audio_bitrate_combo.addItem(f"Из настроек ({get_settings().audio_bitrate}bps)", get_settings().audio_bitrate)
+            bitrate_index = self.audio_bitrate_combo.count() - 1
+        self.audio_bitrate_combo.setCurrentIndex(bitrate_index)
     
         bitrate_layout.addWidget(self.audio_bitrate_combo)
         
+        self.loudnorm_checkbox = QCheckBox(f"Выровнять громкость до {get_settings().loudnorm_target:g} LUFS "
+                                           "(EBU R128, два прохода)")
+        self.loudnorm_checkbox.setToolTip("Измерение громкости сохраняется и используется повторно "
+                                          "для других форматов и битрейтов того же файла")
+        
+        self.audio_clip_controls = ClipControls()
+        
         audio_layout.addWidget(QLabel("Выберите формат:"))
         audio_layout.addWidget(audio_formats_frame)
         audio_layout.addLayout(bitrate_layout)
+        audio_layout.addWidget(self.loudnorm_checkbox)
+        audio_layout.addWidget(self.audio_clip_controls)
         audio_layout.addStretch()
 
     def setup_settings_tab(self):
-        self.settings_tab = QWidget()
         settings_layout = QVBoxLayout(self.settings_tab)
         
         theme_group = QFrame()
@@ -600,6 +1247,16 @@ class MediaConverterUI:
         self.theme_combo.currentTextChanged.connect(self.change_theme)
         
         theme_layout.addRow(QLabel("Тема:"), self.theme_combo)
+
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, max(1, os.cpu_count() or 1) * 2)
+        self.workers_spin.setValue(self.main_window.converter.queue.max_workers)
+        self.workers_spin.valueChanged.connect(self.main_window.converter.queue.set_max_workers)
+        
+        theme_layout.addRow(QLabel("Параллельных задач:"), self.workers_spin)
+        
+        self.incremental_checkbox = QCheckBox("Пропускать файлы, уже сконвертированные с теми же параметрами")
+        theme_layout.addRow(self.incremental_checkbox)
         
         settings_layout.addWidget(QLabel("Настройки интерфейса:"))
         settings_layout.addWidget(theme_group)
@@ -618,7 +1275,7 @@ class MediaConverterUI:
         self.right_panel.setContentsMargins(10, 10, 10, 10)
         self.right_panel.setSpacing(15)
         
-        self.drag_drop_area = DragDropArea(self.main_window)
+        self.drag_drop_area = DragDropArea(self.main_window, self.settings_manager)
         
         self.convert_button = RoundedButton("Конвертировать")
         self.convert_button.setFixedSize(200, 50)
@@ -629,6 +1286,12 @@ class MediaConverterUI:
         button_container.addWidget(self.convert_button)
         button_container.addStretch(1)
         
+        self.job_list = JobListWidget(self.main_window.converter.queue)
+        self.job_list.setMinimumHeight(120)
+        
+        self.clear_jobs_button = QPushButton("Очистить завершённые")
+        self.clear_jobs_button.clicked.connect(self.main_window.converter.queue.clear_finished)
+        
         self.progress_label = QLabel("Прогресс: 0%")
         self.progress_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
@@ -640,66 +1303,98 @@ class MediaConverterUI:
         self.right_panel.addWidget(self.drag_drop_area)
         self.right_panel.addWidget(self.tab_widget)
         self.right_panel.addLayout(button_container)
+        self.right_panel.addWidget(self.job_list)
+        self.right_panel.addWidget(self.clear_jobs_button, alignment=Qt.AlignmentFlag.AlignRight)
         self.right_panel.addWidget(self.progress_label)
         self.right_panel.addWidget(self.progress_bar)
         
         self.main_layout.addLayout(self.right_panel, 3)
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, settings_manager=None):
         super().__init__()
-        self.ui = MediaConverterUI(self)
         self.converter = MediaConverter(self)
-        QTimer.singleShot(100, self.force_style_update)
+        self.ui = MediaConverterUI(self, settings_manager)
+        QTimer.singleShot(0, self.restore_pending_jobs)
 
-    def force_style_update(self):
-        if hasattr(self.ui, 'drag_drop_area'):
-            self.ui.drag_drop_area.update_style()
+    def restore_pending_jobs(self):
+        jobs = self.converter.queue.load_pending()
+        if not jobs:
+            return
+        reply = QMessageBox.question(
+            self, 'Незавершенные задачи',
+            f'Найдено незавершенных задач: {len(jobs)}. Продолжить конвертацию?',
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.Yes
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            self.converter.prepare_conversion()
+            for job in jobs:
+                self.converter.queue.add_job(job)
 
     def open_file_dialog(self):
-        file_path, _ = QFileDialog.getOpenFileName(
+        file_paths, _ = QFileDialog.getOpenFileNames(
             self, 
-            "Выбрать файл", 
+            "Выбрать файлы", 
             "", 
-            "Медиа файлы (*.mp4 *.avi *.mov *.mkv *.webm *.mp3 *.wav *.flac *.ogg *.aac)"
+            "Медиа файлы (" + " ".join(f"*{ext}" for ext in MEDIA_EXTENSIONS) + ")"
         )
-        if file_path:
-            self.ui.drag_drop_area.file_path = file_path
-            self.ui.drag_drop_area.label.setText(os.path.basename(file_path))
-            self.ui.drag_drop_area.setStyleSheet("""
-                QFrame {
-                    border: 2px solid #20B2AA;
-                    border-radius: 5px;
-                }
-                QLabel {
-                    color: inherit;
-                }
-            """)
+        if file_paths:
+            self.ui.drag_drop_area.set_files(file_paths)
+
+    def open_folder_dialog(self):
+        folder = QFileDialog.getExistingDirectory(self, "Выбрать папку")
+        if folder:
+            self.ui.drag_drop_area.set_files([folder])
 
     def start_conversion(self):
         self.converter.start_conversion()
 
     def closeEvent(self, event):
-        if hasattr(self.converter, 'converter_thread') and self.converter.converter_thread and self.converter.converter_thread.isRunning():
+        if self.converter.queue.is_active():
             reply = QMessageBox.question(
                 self, 'Конвертация в процессе',
-                'Конвертация все еще выполняется. Вы уверены, что хотите закрыть программу?',
+                'Конвертация все еще выполняется. Вы уверены, что хотите закрыть программу?\n'
+                'Незавершенные задачи можно будет продолжить при следующем запуске.',
                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
                 QMessageBox.StandardButton.No
             )
             
             if reply == QMessageBox.StandardButton.Yes:
-                self.converter.converter_thread.stop()
+                self.converter.queue.save_pending()
+                self.converter.queue.cancel_all()
                 event.accept()
             else:
                 event.ignore()
         else:
             event.accept()
+        if event.isAccepted():
+            self.ui.drag_drop_area.preview_loader.shutdown()
+            if self.converter.queue.broker:
+                self.converter.queue.broker.stop_sweeper()
+            shutdown_loop_thread()
+
+def report_startup_time(app, phases):
+    phases.append(("первый кадр", time.perf_counter()))
+    report = []
+    previous = STARTUP_STARTED
+    for name, moment in phases:
+        report.append(f"{name}: {(moment - previous) * 1000:.0f} мс")
+        previous = moment
+    message = f"Запуск за {(previous - STARTUP_STARTED) * 1000:.0f} мс ({', '.join(report)})"
+    logging.info(message)
+    print(message)
+    app.quit()
 
 if __name__ == "__main__":
+    phases = [("импорт", time.perf_counter())]
     app = QApplication(sys.argv)
     settings = SettingsManager()
-    settings.apply_theme("Светлая", app)
-    window = MainWindow()
+    settings.apply_theme(settings.current_theme, app)
+    phases.append(("тема", time.perf_counter()))
+    window = MainWindow(settings)
+    phases.append(("окно", time.perf_counter()))
     window.show()
+    if "--startup-time" in sys.argv:
+        QTimer.singleShot(0, partial(report_startup_time, app, phases))
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,879 @@
+import os
+import time
+import shutil
+import asyncio
+import tempfile
+import threading
+import logging
+from functools import partial
+
+from .aio import start_child, stop_process
+from .history import get_history, conversion_result, file_state, parameters_key
+from .metrics import JobMetrics, get_metrics_exporter
+from .probe import get_probe_index, probe_media_async
+from .progress import ProgressParser, ProgressReporter, StderrTail
+from .scheduler import priority_prefix
+from .settings import get_settings
+from . import gif, loudness, rules, segments, twopass
+
+ffmpeg_log = logging.getLogger("astra_convertator.ffmpeg")
+
+VIDEO_FORMATS = ["mp4", "avi", "mov", "gif", "webm", "mkv"]
+AUDIO_FORMATS = ["mp3", "wav", "flac", "ogg", "aac"]
+MEDIA_EXTENSIONS = tuple(f".{fmt}" for fmt in VIDEO_FORMATS + AUDIO_FORMATS)
+SEEK_ACCURATE = "accurate"
+SEEK_FAST = "fast"
+SEEK_MODES = [SEEK_ACCURATE, SEEK_FAST]
+DECODE_OPTIONS = ("trim_start", "trim_duration", "seek_mode", "loudnorm")
+OUTPUT_OPTIONS = ("crf", "audio_bitrate", "profile", "threads", "video_codec", "audio_codec", "gif_fps", "gif_width")
+
+PASSLOG_LOCK_POLL = 0.2
+ERROR_SUMMARY_LINES = 10
+READ_CHUNK_SIZE = 65536
+
+CONTAINER_CODECS = {
+    "mp4": {
+        "video": {"h264", "hevc", "mpeg4", "av1"},
+        "audio": {"aac", "mp3", "ac3", "eac3", "opus", "alac"}
+    },
+    "mov": {
+        "video": {"h264", "hevc", "mpeg4", "prores", "mjpeg"},
+        "audio": {"aac", "mp3", "ac3", "alac", "pcm_s16le", "pcm_s24le"}
+    },
+    "mkv": {
+        "video": {"h264", "hevc", "mpeg4", "mpeg2video", "vp8", "vp9", "av1", "theora", "prores", "mjpeg"},
+        "audio": {"aac", "mp3", "ac3", "eac3", "dts", "opus", "vorbis", "flac", "alac", "pcm_s16le", "pcm_s24le"}
+    },
+    "webm": {
+        "video": {"vp8", "vp9", "av1"},
+        "audio": {"opus", "vorbis"}
+    },
+    "avi": {
+        "video": {"h264", "mpeg4", "msmpeg4v3", "mjpeg"},
+        "audio": {"mp3", "ac3", "pcm_s16le"}
+    },
+    "mp3": {"audio": {"mp3"}},
+    "aac": {"audio": {"aac"}},
+    "ogg": {"audio": {"vorbis", "opus", "flac"}},
+    "flac": {"audio": {"flac"}},
+    "wav": {"audio": {"pcm_s16le", "pcm_s24le", "pcm_s32le", "pcm_f32le", "pcm_u8", "pcm_alaw", "pcm_mulaw"}}
+}
+
+AUDIO_ENCODERS = {
+    "mp3": "libmp3lame",
+    "aac": "aac",
+    "ogg": "libvorbis",
+    "flac": "flac",
+    "wav": "pcm_s16le"
+}
+LOSSY_AUDIO_FORMATS = {"mp3", "aac", "ogg"}
+MP3_DEFAULT_QUALITY = "2"
+
+def default_worker_count():
+    return max(1, (os.cpu_count() or 1) // 2)
+
+def collect_media_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                for name in sorted(names):
+                    if name.lower().endswith(MEDIA_EXTENSIONS):
+                        files.append(os.path.join(root, name))
+        elif os.path.isfile(path):
+            files.append(path)
+    return files
+
+def decode_key(options):
+    return tuple(options.get(name) for name in DECODE_OPTIONS)
+
+def can_share_decode(format, options):
+    if format == "gif":
+        return not options.get("gif_max_size")
+    if format in VIDEO_FORMATS:
+        return not (options.get("segment_jobs") or options.get("target_size") or options.get("video_bitrate"))
+    return True
+
+def output_overrides(options):
+    overrides = {key: options.get(key) for key in OUTPUT_OPTIONS}
+    if overrides["profile"]:
+        overrides["profile"] = overrides["profile"].name
+    return overrides
+
+def build_output_path(input_file, output_dir, output_format):
+    name = os.path.splitext(os.path.basename(input_file))[0]
+    output_dir = output_dir or os.path.dirname(input_file)
+    output_file = os.path.join(output_dir, f"{name}.{output_format}")
+    if os.path.abspath(output_file) == os.path.abspath(input_file):
+        output_file = os.path.join(output_dir, f"{name}_converted.{output_format}")
+    return output_file
+
+def plan_stream_copy(media_info, format):
+    codecs = CONTAINER_CODECS.get(format)
+    if not codecs:
+        return False, False
+    copy_video = media_info.video_codec is not None and media_info.video_codec in codecs.get("video", ())
+    copy_audio = media_info.audio_codec is not None and media_info.audio_codec in codecs["audio"]
+    return copy_video, copy_audio
+
+def audio_copy_fits(media_info, format, audio_bitrate=None):
+    if format not in LOSSY_AUDIO_FORMATS or not audio_bitrate:
+        return True
+    return 0 < media_info.audio_bit_rate <= twopass.parse_bitrate(audio_bitrate)
+
+def parse_time(value):
+    if value is None or value == "":
+        return None
+    seconds = 0.0
+    for part in str(value).strip().split(":"):
+        seconds = seconds * 60 + float(part)
+    if seconds < 0:
+        raise ValueError(f"Отрицательное время: {value}")
+    return seconds
+
+def trim_length(trim_start=None, trim_end=None, trim_duration=None):
+    if trim_end is None:
+        return trim_duration
+    if trim_duration is not None:
+        raise ValueError("Укажите либо конец, либо длительность фрагмента")
+    if trim_end <= (trim_start or 0):
+        raise ValueError("Конец фрагмента должен быть позже начала")
+    return trim_end - (trim_start or 0)
+
+def trim_input_args(trim_start=None, trim_duration=None, seek_mode=SEEK_ACCURATE):
+    args = []
+    if trim_start:
+        if seek_mode == SEEK_FAST:
+            args.append("-noaccurate_seek")
+        args.extend(["-ss", f"{trim_start:.3f}"])
+    if trim_duration:
+        args.extend(["-t", f"{trim_duration:.3f}"])
+    return args
+
+def clip_duration(duration, trim_start=None, trim_duration=None):
+    remaining = max(0.0, duration - (trim_start or 0))
+    if trim_duration:
+        return min(remaining, trim_duration) if duration > 0 else trim_duration
+    return remaining
+
+def video_audio_args(format, audio_bitrate=None, audio_codec=None, copy_audio=False, audio_channels=None,
+                     audio_filters=None):
+    if copy_audio:
+        return ["-c:a", "copy"]
+    args = [
+        "-c:a", "libopus" if format == "webm" else (audio_codec or "aac"),
+        "-b:a", audio_bitrate if audio_bitrate else "128k"
+    ]
+    if audio_channels:
+        args.extend(["-ac", str(audio_channels)])
+    if audio_filters:
+        args.extend(["-af", ",".join(audio_filters)])
+    return args
+
+def build_output_args(format, crf=None, audio_bitrate=None, profile=None, threads=None,
+                      video_codec=None, audio_codec=None, copy_video=False, copy_audio=False,
+                      video_bitrate=None, pass_number=None, passlog=None, audio_channels=None,
+                      max_video_bitrate=None, video_filters=None, audio_filters=None):
+    output_args = []
+    
+    if format in VIDEO_FORMATS:
+        if format == "webm":
+            video_codec = "libvpx-vp9"
+        else:
+            video_codec = video_codec or "libx264"
+        
+        if copy_video:
+            output_args.extend(["-c:v", "copy"])
+        else:
+            output_args.extend(["-c:v", video_codec])
+            
+            if profile:
+                output_args.extend(profile.video_args(video_codec, threads))
+            elif threads:
+                output_args.extend(["-threads", str(threads)])
+            
+            if video_bitrate:
+                output_args.extend(["-b:v", str(video_bitrate)])
+                if pass_number:
+                    output_args.extend(["-pass", str(pass_number), "-passlogfile", passlog])
+            elif crf:
+                output_args.extend(["-crf", str(crf)])
+                if video_codec == "libvpx-vp9":
+                    output_args.extend(["-b:v", str(max_video_bitrate or 0)])
+                elif max_video_bitrate:
+                    output_args.extend(["-maxrate", str(max_video_bitrate), "-bufsize", str(max_video_bitrate * 2)])
+            
+            if video_filters:
+                output_args.extend(["-vf", ",".join(video_filters)])
+        
+        if pass_number == 1:
+            output_args.extend(["-an", "-f", "null"])
+        else:
+            output_args.extend(video_audio_args(format, audio_bitrate, audio_codec, copy_audio, audio_channels,
+                                                audio_filters))
+    
+    elif format in AUDIO_FORMATS:
+        output_args.extend(["-vn", "-sn", "-dn"])
+        
+        if copy_audio:
+            output_args.extend(["-c:a", "copy"])
+        else:
+            output_args.extend(["-c:a", AUDIO_ENCODERS[format]])
+            if audio_channels:
+                output_args.extend(["-ac", str(audio_channels)])
+            if audio_filters:
+                output_args.extend(["-af", ",".join(audio_filters)])
+            if format in LOSSY_AUDIO_FORMATS and audio_bitrate:
+                output_args.extend(["-b:a", audio_bitrate])
+            elif format == "mp3":
+                output_args.extend(["-q:a", MP3_DEFAULT_QUALITY])
+
+    return output_args
+
+def build_ffmpeg_command(input_file, output_file, format, trim_start=None, trim_duration=None,
+                         seek_mode=SEEK_ACCURATE, gif_fps=None, gif_width=None, **options):
+    input_args = trim_input_args(trim_start, trim_duration, seek_mode)
+    if format == "gif":
+        return gif.build_gif_command(input_file, output_file, gif_fps, gif_width, input_args)
+
+    if options.get("pass_number") == 1:
+        output_file = os.devnull
+    if format in AUDIO_FORMATS:
+        input_args.extend(["-discard:v", "all"])
+    return ["ffmpeg", "-y", *input_args, "-i", input_file, *build_output_args(format, **options), output_file]
+
+def build_multi_output_command(input_file, outputs, trim_start=None, trim_duration=None, seek_mode=SEEK_ACCURATE):
+    filters = []
+    output_args = []
+    for index, (output_file, format, options) in enumerate(outputs):
+        if format == "gif":
+            label = f"gif{index}"
+            filters.append(gif.gif_filter(options.get("gif_fps") or gif.GIF_DEFAULT_FPS,
+                                          options.get("gif_width") or gif.GIF_DEFAULT_WIDTH,
+                                          output_label=label))
+            output_args.extend(["-map", f"[{label}]", *gif.GIF_OUTPUT_ARGS, output_file])
+            continue
+        if format in VIDEO_FORMATS:
+            output_args.extend(["-map", "0:v:0", "-map", "0:a:0?"])
+        else:
+            output_args.extend(["-map", "0:a:0"])
+        options = {key: value for key, value in options.items() if key not in ("gif_fps", "gif_width")}
+        output_args.extend([*build_output_args(format, **options), output_file])
+
+    ffmpeg_cmd = ["ffmpeg", "-y", *trim_input_args(trim_start, trim_duration, seek_mode), "-i", input_file]
+    if filters:
+        ffmpeg_cmd.extend(["-filter_complex", ";".join(filters)])
+    return ffmpeg_cmd + output_args
+
+def with_progress_output(ffmpeg_cmd):
+    return ffmpeg_cmd[:1] + ["-hide_banner", "-nostats", "-progress", "pipe:1"] + ffmpeg_cmd[1:]
+
+class AsyncFFmpegProcess:
+    def __init__(self, ffmpeg_cmd):
+        self.ffmpeg_cmd = with_progress_output(ffmpeg_cmd)
+        self.process = None
+        self.returncode = None
+        self.usage = None
+        self.error_output = ""
+        self.output = ""
+        self._is_running = True
+        self._loop = None
+        self._stopping = None
+
+    async def run(self, on_update=None):
+        log_stderr = ffmpeg_log.isEnabledFor(logging.DEBUG)
+        if log_stderr:
+            ffmpeg_log.debug(" ".join(self.ffmpeg_cmd))
+        if not self._is_running:
+            return 1
+
+        self._loop = asyncio.get_running_loop()
+        self.process = await start_child(priority_prefix() + self.ffmpeg_cmd)
+        if not self._is_running:
+            self._begin_stop()
+
+        parser = ProgressParser()
+        stderr_tail = StderrTail()
+
+        async def read_progress():
+            while True:
+                data = await self.process.stdout.read(READ_CHUNK_SIZE)
+                if not data:
+                    break
+                for info in parser.feed(data):
+                    if on_update:
+                        on_update(info)
+
+        async def read_stderr():
+            while True:
+                data = await self.process.stderr.read(READ_CHUNK_SIZE)
+                if not data:
+                    break
+                lines = stderr_tail.feed(data)
+                if log_stderr:
+                    for line in lines:
+                        ffmpeg_log.debug(line)
+
+        try:
+            await asyncio.gather(read_progress(), read_stderr())
+            self.returncode = await self.process.wait()
+        except asyncio.CancelledError:
+            await stop_process(self.process)
+            raise
+        if self._stopping:
+            await self._stopping
+        self.usage = self.process.rusage
+        self.output = stderr_tail.text()
+        if self.returncode != 0:
+            self.error_output = self.output
+        return self.returncode
+
+    def _begin_stop(self):
+        if self._stopping is None and self.process.returncode is None:
+            self._stopping = asyncio.ensure_future(stop_process(self.process))
+
+    def stop(self):
+        self._is_running = False
+        if self._loop and self.process:
+            self._loop.call_soon_threadsafe(self._begin_stop)
+
+class Conversion:
+    def __init__(self, input_file, output_file, format, crf=None, audio_bitrate=None,
+                 profile=None, threads=None, video_codec=None, audio_codec=None, remux=False,
+                 segment_jobs=None, trim_start=None, trim_duration=None, seek_mode=SEEK_ACCURATE,
+                 video_height=None, video_fps=None, gif_fps=None, gif_width=None,
+                 gif_max_size=None, target_size=None, video_bitrate=None, extra_outputs=None,
+                 incremental=False, record_history=True, record_metrics=True, resumable=True, smart=True,
+                 loudnorm=None):
+        self.input_file = input_file
+        self.output_file = output_file
+        self.format = format
+        self.crf = crf
+        self.audio_bitrate = audio_bitrate
+        self.profile = profile
+        self.threads = threads
+        self.video_codec = video_codec
+        self.audio_codec = audio_codec
+        self.remux = remux
+        self.segment_jobs = segment_jobs
+        self.trim_start = trim_start
+        self.trim_duration = trim_duration
+        self.seek_mode = seek_mode
+        self.video_height = video_height
+        self.video_fps = video_fps
+        self.gif_fps = gif_fps
+        self.gif_width = gif_width
+        self.gif_max_size = gif_max_size
+        self.target_size = target_size
+        self.video_bitrate = video_bitrate
+        self.extra_outputs = extra_outputs or []
+        self.incremental = incremental
+        self.record_history = record_history
+        self.record_metrics = record_metrics
+        self.resumable = resumable
+        self.smart = smart
+        self.loudnorm = loudnorm
+        self.loudnorm_filter = None
+        self.skipped = False
+        self.media_info = None
+        self.reporter = None
+        self._processes = []
+        self._lock = threading.Lock()
+        self._is_running = True
+        self.duration = 0
+        self.error_output = ""
+        self.metrics = None
+        self.probe_time = 0.0
+        self.peak_rss = 0
+        self.cpu_time = 0.0
+        self.disk_read_blocks = 0
+        self.disk_written_blocks = 0
+        self._started_at = None
+        self._plans = {}
+
+    @property
+    def stats(self):
+        return self.reporter.stats if self.reporter else None
+
+    def stream_copy_plan(self, format=None, audio_bitrate=None):
+        format = format or self.format
+        if not self.media_info:
+            return False, False
+        copy_video, copy_audio = plan_stream_copy(self.media_info, format)
+        copy_audio = copy_audio and self.loudnorm is None
+        if format in AUDIO_FORMATS:
+            audio_bitrate = audio_bitrate or self.audio_bitrate
+            return False, copy_audio and (self.remux or audio_copy_fits(self.media_info, format, audio_bitrate))
+        if self.remux:
+            return copy_video and not self.uses_bitrate_mode() and not self.video_filters(format), copy_audio
+        return False, False
+
+    def error_summary(self, max_lines=ERROR_SUMMARY_LINES):
+        return "\n".join(self.error_output.strip().splitlines()[-max_lines:])
+
+    @property
+    def first_frame_time(self):
+        if self.reporter is None or self.reporter.first_frame_at is None:
+            return None
+        return self.reporter.first_frame_at - self._started_at
+
+    @property
+    def cancelled(self):
+        return not self._is_running
+
+    def parameters(self):
+        return {
+            "formats": self.formats,
+            "crf": self.crf,
+            "audio_bitrate": self.audio_bitrate,
+            "profile": vars(self.profile) if self.profile else None,
+            "threads": self.threads,
+            "video_codec": self.video_codec,
+            "audio_codec": self.audio_codec,
+            "remux": self.remux,
+            "smart": self.smart,
+            "loudnorm": self.loudnorm,
+            "trim": [self.trim_start, self.trim_duration, self.seek_mode],
+            "scale": [self.video_height, self.video_fps],
+            "gif": [self.gif_fps, self.gif_width, self.gif_max_size],
+            "target_size": self.target_size,
+            "video_bitrate": self.video_bitrate,
+            "extra_outputs": [[format, overrides] for _, format, overrides in self.extra_outputs]
+        }
+
+    @property
+    def output_files(self):
+        return [self.output_file] + [output_file for output_file, _, _ in self.extra_outputs]
+
+    @property
+    def formats(self):
+        return [self.format] + [format for _, format, _ in self.extra_outputs]
+
+    def uses_bitrate_mode(self):
+        return self.format in VIDEO_FORMATS and self.format != "gif" and bool(self.target_size or self.video_bitrate)
+
+    def encoder_name(self):
+        if self.format == "webm":
+            return "libvpx-vp9"
+        return self.video_codec or "libx264"
+
+    def audio_bitrate_bps(self):
+        if not self.media_info.has_audio:
+            return 0
+        options = self.output_options()
+        if options["copy_audio"]:
+            return self.media_info.audio_bit_rate or twopass.parse_bitrate("128k")
+        return twopass.parse_bitrate(options["audio_bitrate"] or "128k")
+
+    def parameter_plan(self, format=None, audio_bitrate=None):
+        format = format or self.format
+        if not self.smart or not self.media_info or format == "gif":
+            return None
+        audio_bitrate = audio_bitrate or self.audio_bitrate
+        key = (format, audio_bitrate)
+        if key not in self._plans:
+            self._plans[key] = rules.plan_parameters(
+                self.media_info, format, audio_bitrate, is_video=format in VIDEO_FORMATS,
+                bitrate_mode=format == self.format and self.uses_bitrate_mode(),
+                height=self.video_height, fps=self.video_fps
+            )
+        return self._plans[key]
+
+    def video_filters(self, format=None):
+        format = format or self.format
+        if not self.media_info or format not in VIDEO_FORMATS or format == "gif":
+            return []
+        return rules.scale_filters(self.media_info, self.video_height, self.video_fps)[0]
+
+    def output_options(self, format=None, **overrides):
+        if isinstance(overrides.get("profile"), str):
+            overrides["profile"] = get_settings().get_profile(overrides["profile"])
+        audio_bitrate = overrides.pop("audio_bitrate", None) or self.audio_bitrate
+        plan = self.parameter_plan(format, audio_bitrate)
+        if plan and plan.audio_bitrate:
+            audio_bitrate = plan.audio_bitrate
+        copy_video, copy_audio = self.stream_copy_plan(format, audio_bitrate)
+        options = dict(
+            crf=self.crf, audio_bitrate=audio_bitrate,
+            profile=self.profile, threads=self.threads,
+            video_codec=self.video_codec, audio_codec=self.audio_codec,
+            copy_video=copy_video, copy_audio=copy_audio,
+            gif_fps=self.gif_fps, gif_width=self.gif_width
+        )
+        if plan:
+            options.update(plan.output_options(copy_video, copy_audio))
+        elif not copy_video and self.video_filters(format):
+            options["video_filters"] = self.video_filters(format)
+        if self.loudnorm_filter and not copy_audio and (format or self.format) != "gif":
+            options["audio_filters"] = [self.loudnorm_filter]
+        options.update(overrides)
+        return options
+
+    def build_command(self, input_file=None, output_file=None, **overrides):
+        return build_ffmpeg_command(input_file or self.input_file, output_file or self.output_file, self.format,
+                                    trim_start=overrides.pop("trim_start", self.trim_start),
+                                    trim_duration=overrides.pop("trim_duration", self.trim_duration),
+                                    seek_mode=self.seek_mode,
+                                    **self.output_options(**overrides))
+
+    def build_output_command(self, output_file, format, **overrides):
+        return build_ffmpeg_command(self.input_file, output_file, format, trim_start=self.trim_start,
+                                    trim_duration=self.trim_duration, seek_mode=self.seek_mode,
+                                    **self.output_options(format, **overrides))
+
+    def build_multi_command(self):
+        outputs = [(self.output_file, self.format, self.output_options())]
+        for output_file, format, overrides in self.extra_outputs:
+            outputs.append((output_file, format, self.output_options(format, **overrides)))
+        return build_multi_output_command(self.input_file, outputs, self.trim_start, self.trim_duration, self.seek_mode)
+
+    async def execute(self, ffmpeg_cmd, on_update=None, on_output=None):
+        process = AsyncFFmpegProcess(ffmpeg_cmd)
+        with self._lock:
+            if not self._is_running:
+                return 1
+            self._processes.append(process)
+        try:
+            return_code = await process.run(on_update)
+        finally:
+            with self._lock:
+                self._processes.remove(process)
+                if process.usage:
+                    self.peak_rss = max(self.peak_rss, process.usage.ru_maxrss * 1024)
+                    self.cpu_time += process.usage.ru_utime + process.usage.ru_stime
+                    self.disk_read_blocks += process.usage.ru_inblock
+                    self.disk_written_blocks += process.usage.ru_oublock
+        if return_code != 0 and self._is_running:
+            self.error_output = process.error_output
+        elif return_code == 0 and on_output:
+            on_output(process.output)
+        return return_code
+
+    async def run_async(self, on_progress=None, on_stats=None):
+        loop = asyncio.get_running_loop()
+        history = get_history() if self.record_history or self.incremental else None
+        if self.incremental and history and await loop.run_in_executor(None, history.is_up_to_date, self):
+            logging.info(f"Пропуск, результат актуален: {self.input_file}")
+            self.skipped = True
+            ProgressReporter(0, on_progress, on_stats).finish()
+            return 0
+
+        started_at = time.time()
+        self._started_at = time.monotonic()
+        return_code = await self.convert(on_progress, on_stats)
+        elapsed = time.monotonic() - self._started_at
+        if history and self.record_history:
+            try:
+                await loop.run_in_executor(None, history.record, self, return_code, started_at, elapsed)
+            except Exception as e:
+                logging.warning(f"Не удалось записать историю: {e}")
+        self.metrics = JobMetrics.from_conversion(self, conversion_result(self, return_code), elapsed)
+        logging.debug(f"Метрики {self.input_file}: {self.metrics.to_dict()}")
+        if self.record_metrics:
+            try:
+                await loop.run_in_executor(None, get_metrics_exporter().record, self.metrics)
+            except OSError as e:
+                logging.warning(f"Не удалось записать метрики: {e}")
+        return return_code
+
+    async def convert(self, on_progress=None, on_stats=None):
+        final_files = self.output_files
+        partial_files = [segments.partial_path(path) for path in final_files]
+        extra_outputs = self.extra_outputs
+        self.output_file = partial_files[0]
+        self.extra_outputs = [(partial_file, format, overrides)
+                              for partial_file, (_, format, overrides) in zip(partial_files[1:], extra_outputs)]
+        try:
+            return_code = await self.encode(on_progress, on_stats)
+        finally:
+            self.output_file = final_files[0]
+            self.extra_outputs = extra_outputs
+
+        for partial_file, final_file in zip(partial_files, final_files):
+            try:
+                if return_code == 0:
+                    os.replace(partial_file, final_file)
+                elif os.path.exists(partial_file):
+                    os.remove(partial_file)
+            except OSError as e:
+                logging.error(f"Ошибка сохранения {final_file}: {e}")
+                self.error_output = str(e)
+                return_code = 1
+        if return_code == 0:
+            logging.info(f"Успешная конвертация в {', '.join(self.output_files)}")
+            self.reporter.finish()
+        return return_code
+
+    def use_segments(self, copy_video):
+        if not self.segment_jobs or self.segment_jobs < 2 or copy_video or self.format not in VIDEO_FORMATS or \
+                not segments.can_segment(self.media_info, self.format, self.duration):
+            return False
+        if self.trim_start:
+            logging.info("Фрагмент с заданным началом кодируется без деления на сегменты")
+            return False
+        return True
+
+    def resume_dir(self, jobs):
+        return segments.resume_dir_for(self.output_file, os.path.basename(self.output_file), jobs,
+                                       *file_state(self.input_file), parameters_key(self.parameters()))
+
+    async def encode(self, on_progress=None, on_stats=None):
+        probe_started = time.monotonic()
+        self.media_info = await probe_media_async(self.input_file)
+        self.probe_time = time.monotonic() - probe_started
+        self.duration = clip_duration(self.media_info.duration, self.trim_start, self.trim_duration)
+        self.reporter = ProgressReporter(self.duration, on_progress, on_stats)
+        logging.info(f"Длительность видео: {self.duration} сек")
+
+        if self.loudnorm is not None and self.media_info.has_audio and self.formats != ["gif"]:
+            return_code = await self.measure_loudness()
+            if return_code != 0:
+                if self._is_running:
+                    logging.error(f"Ошибка измерения громкости: {self.error_summary()}")
+                return return_code
+
+        copy_video, copy_audio = self.stream_copy_plan()
+        if copy_video or copy_audio:
+            logging.info(f"Без перекодирования: видео - {'да' if copy_video else 'нет'}, "
+                         f"звук - {'да' if copy_audio else 'нет'}")
+        for format in self.formats:
+            plan = self.parameter_plan(format)
+            if plan and plan.notes:
+                logging.info(f"Параметры по исходнику для {format}: {plan.describe()}")
+
+        if self.extra_outputs and not self.media_info.has_video:
+            logging.info(f"В исходнике нет видео, форматы кодируются отдельно: {', '.join(self.formats)}")
+            return_code = await self.run_separate_outputs()
+        elif self.extra_outputs:
+            logging.info(f"Одно декодирование для форматов: {', '.join(self.formats)}")
+            return_code = await self.execute(self.build_multi_command(), self.reporter.update)
+        elif self.format == "gif" and self.gif_max_size:
+            return_code = await self.run_gif_budget()
+        elif self.uses_bitrate_mode():
+            return_code = await self.run_bitrate_mode()
+        elif self.use_segments(copy_video):
+            return_code = await self.run_segmented()
+        else:
+            return_code = await self.execute(self.build_command(), self.reporter.update)
+
+        if return_code != 0 and self._is_running:
+            logging.error(f"Ошибка конвертации: {self.error_summary()}")
+        return return_code
+
+    async def run_separate_outputs(self):
+        outputs = [(self.output_file, self.format, {})] + list(self.extra_outputs)
+        for number, (output_file, format, overrides) in enumerate(outputs, 1):
+            return_code = await self.execute(
+                self.build_output_command(output_file, format, **overrides),
+                twopass.pass_progress(self.reporter.update, self.duration, number, len(outputs))
+            )
+            if return_code != 0:
+                return return_code
+        return 0
+
+    def cached_loudness(self, key):
+        index = get_probe_index()
+        entry = file_state(self.input_file)
+        return entry, index, index.get_loudness(*entry, key) if index else None
+
+    async def measure_loudness(self):
+        loop = asyncio.get_running_loop()
+        key = loudness.measurement_key(self.loudnorm, self.trim_start, self.trim_duration, self.seek_mode)
+        entry, index, measurement = await loop.run_in_executor(None, self.cached_loudness, key)
+        if measurement:
+            logging.info("Используется сохранённое измерение громкости")
+        else:
+            logging.info("Измерение громкости (EBU R128)")
+            outputs = []
+            return_code = await self.execute(
+                loudness.build_measure_command(self.input_file, self.loudnorm,
+                                               trim_input_args(self.trim_start, self.trim_duration, self.seek_mode)),
+                loudness.measure_progress(self.reporter.update), outputs.append
+            )
+            if return_code != 0:
+                return return_code
+            try:
+                measurement = loudness.parse_measurement(outputs[0])
+            except ValueError as e:
+                logging.warning(f"Громкость не выровнена: {e}")
+                return 0
+            if index:
+                await loop.run_in_executor(None, index.put_loudness, *entry, key, measurement)
+        logging.info(f"Громкость исходника {measurement['input_i']:g} LUFS, цель {self.loudnorm:g} LUFS")
+        self.loudnorm_filter = loudness.loudnorm_filter(measurement, self.loudnorm, self.media_info.sample_rate)
+        return 0
+
+    async def run_segmented(self):
+        jobs = self.segment_jobs or 1
+        work_dir = self.resume_dir(jobs)
+        for path in segments.prune_resume_dirs(work_dir, self.output_file):
+            logging.info(f"Удалены устаревшие сегменты {path}")
+        os.makedirs(work_dir, exist_ok=True)
+        segments.write_owner(work_dir, self.output_file)
+        return_code = await self.encode_segments(work_dir, jobs)
+        if return_code == 0 or not (self.resumable and self.cancelled):
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return return_code
+
+    async def encode_segments(self, work_dir, jobs):
+        segment_duration = segments.segment_duration_for(self.duration, jobs)
+        logging.info(f"Сегментное кодирование: {jobs} потоков, сегменты по {segment_duration:.0f} сек")
+
+        if segments.is_split_done(work_dir):
+            logging.info(f"Продолжение прерванной конвертации из {work_dir}")
+        else:
+            segments.clear_segments(work_dir)
+            return_code = await self.execute(segments.build_split_command(
+                self.input_file, work_dir, segment_duration,
+                trim_input_args(self.trim_start, self.trim_duration, self.seek_mode)
+            ))
+            if return_code != 0:
+                return return_code
+            segments.mark_split_done(work_dir)
+
+        source_segments = segments.list_segments(work_dir, segments.SOURCE_PREFIX)
+        encoded_segments = [segments.encoded_segment_path(work_dir, index) for index in range(len(source_segments))]
+        progress = segments.SegmentProgress(len(source_segments), self.reporter.update)
+
+        pending = []
+        for index, encoded in enumerate(encoded_segments):
+            if os.path.exists(encoded):
+                progress.complete(index, self.duration / len(source_segments))
+            else:
+                pending.append(index)
+        if len(pending) < len(source_segments):
+            logging.info(f"Готовых сегментов: {len(source_segments) - len(pending)} из {len(source_segments)}")
+
+        slots = asyncio.Semaphore(jobs)
+
+        async def encode_pending(index):
+            async with slots:
+                return await self.encode_segment(source_segments[index], encoded_segments[index],
+                                                 self.threads, partial(progress.update, index))
+
+        return_codes = await asyncio.gather(*(encode_pending(index) for index in pending))
+        if any(return_codes):
+            return next(code for code in return_codes if code)
+
+        list_file = segments.write_concat_list(work_dir, encoded_segments)
+        options = self.output_options()
+        return await self.execute(segments.build_concat_command(
+            list_file, self.input_file, self.output_file,
+            video_audio_args(self.format, options["audio_bitrate"], self.audio_codec, options["copy_audio"],
+                             options.get("audio_channels"), options.get("audio_filters")),
+            trim_input_args(self.trim_start, self.trim_duration, self.seek_mode)
+        ))
+
+    async def encode_segment(self, source, encoded, threads, on_update):
+        partial_file = segments.partial_path(encoded)
+        return_code = await self.execute(
+            self.build_command(source, partial_file, threads=threads, copy_video=False,
+                               trim_start=None, trim_duration=None, audio_filters=None),
+            on_update
+        )
+        if return_code == 0:
+            os.replace(partial_file, encoded)
+        elif os.path.exists(partial_file):
+            os.remove(partial_file)
+        return return_code
+
+    async def run_bitrate_mode(self):
+        try:
+            if self.target_size:
+                video_bitrate = twopass.target_video_bitrate(self.target_size, self.duration, self.audio_bitrate_bps())
+            else:
+                video_bitrate = twopass.parse_bitrate(self.video_bitrate)
+        except ValueError as e:
+            self.error_output = str(e)
+            return 1
+        logging.info(f"Битрейт видео: {video_bitrate // 1000} кбит/с")
+
+        codec = self.encoder_name()
+        if codec not in twopass.TWO_PASS_CODECS:
+            logging.info(f"Двухпроходное кодирование недоступно для {codec}, используется один проход")
+            return await self.execute(self.build_command(video_bitrate=video_bitrate), self.reporter.update)
+
+        prefix = twopass.passlog_prefix(self.input_file, codec, self.profile.name if self.profile else None,
+                                        self.trim_start, self.trim_duration, self.seek_mode,
+                                        ",".join(self.output_options().get("video_filters", [])))
+        lock = twopass.passlog_lock(prefix)
+        while not lock.acquire(blocking=False):
+            if not self._is_running:
+                return 1
+            await asyncio.sleep(PASSLOG_LOCK_POLL)
+        try:
+            if twopass.passlog_exists(prefix):
+                logging.info("Используется сохранённый журнал первого прохода")
+            else:
+                return_code = await self.execute(
+                    self.build_command(video_bitrate=video_bitrate, pass_number=1,
+                                       passlog=twopass.partial_prefix(prefix)),
+                    twopass.pass_progress(self.reporter.update, self.duration, 1, 2)
+                )
+                if return_code != 0:
+                    twopass.discard_passlog(prefix)
+                    return return_code
+                twopass.commit_passlog(prefix)
+        finally:
+            lock.release()
+        return await self.execute(
+            self.build_command(video_bitrate=video_bitrate, pass_number=2, passlog=prefix),
+            twopass.pass_progress(self.reporter.update, self.duration, 2, 2)
+        )
+
+    async def run_gif_budget(self):
+        candidates = gif.gif_candidates(self.media_info.width, self.media_info.fps)
+        sample_duration = min(gif.GIF_SAMPLE_DURATION, self.duration)
+        budget = self.gif_max_size * gif.GIF_BUDGET_MARGIN
+        work_dir = tempfile.mkdtemp(prefix=".astra_gif_", dir=os.path.dirname(os.path.abspath(self.output_file)))
+        samples = {}
+        sample_errors = []
+        correction = 1.0
+
+        async def fits(index):
+            if index not in samples:
+                fps, width = candidates[index]
+                sample_file = os.path.join(work_dir, f"sample_{fps}_{width}.gif")
+                return_code = await self.execute(gif.build_gif_command(
+                    self.input_file, sample_file, fps, width,
+                    trim_input_args(self.trim_start, sample_duration, self.seek_mode)
+                ))
+                if return_code != 0:
+                    sample_errors.append(return_code)
+                    return None
+                samples[index] = gif.estimate_size(sample_file, sample_duration, self.duration)
+            return samples[index] * correction <= budget
+
+        try:
+            start = 0
+            for _ in range(gif.GIF_MAX_FULL_ENCODES):
+                chosen = await gif.search_candidates(len(candidates), fits, start)
+                if chosen is None:
+                    return sample_errors[0]
+                fps, width = candidates[chosen]
+                logging.info(f"GIF: {fps} кадр/с, ширина {width}")
+                return_code = await self.execute(self.build_command(gif_fps=fps, gif_width=width), self.reporter.update)
+                if return_code != 0:
+                    return return_code
+                size = os.path.getsize(self.output_file)
+                if size <= self.gif_max_size:
+                    return 0
+                if chosen == len(candidates) - 1 or not samples.get(chosen):
+                    break
+                correction = size / samples[chosen]
+                start = chosen + 1
+                logging.info(f"GIF превышает лимит размера, поправка оценки {correction:.2f}")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        self.error_output = (f"Не удалось уложить GIF в {self.gif_max_size / (1024 * 1024):.1f} МБ: "
+                             f"получилось {size / (1024 * 1024):.1f} МБ")
+        return 1
+
+    def stop(self):
+        with self._lock:
+            self._is_running = False
+            processes = list(self._processes)
+        for process in processes:
+            process.stop()
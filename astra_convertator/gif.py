@@ -0,0 +1,53 @@
+import os
+
+GIF_DEFAULT_FPS = 10
+GIF_DEFAULT_WIDTH = 640
+GIF_FPS_LADDER = [15, 12, 10, 8, 6, 5]
+GIF_WIDTH_LADDER = [800, 640, 480, 400, 320, 240]
+GIF_SAMPLE_DURATION = 5.0
+GIF_BUDGET_MARGIN = 0.9
+GIF_MAX_FULL_ENCODES = 2
+GIF_OUTPUT_ARGS = ["-an", "-loop", "0"]
+
+def gif_filter(fps, width, dither="sierra2_4a", output_label=None):
+    frames, palette_source, palette = (f"{output_label}_{name}" if output_label else name
+                                       for name in ("frames", "palette_source", "palette"))
+    return (
+        f"[0:v]fps={fps},scale={width}:-2:flags=lanczos,split[{frames}][{palette_source}];"
+        f"[{palette_source}]palettegen=stats_mode=diff[{palette}];"
+        f"[{frames}][{palette}]paletteuse=dither={dither}:diff_mode=rectangle"
+        + (f"[{output_label}]" if output_label else "")
+    )
+
+def build_gif_command(input_file, output_file, fps=None, width=None, input_args=None):
+    return [
+        "ffmpeg", "-y", *(input_args or []), "-i", input_file,
+        "-filter_complex", gif_filter(fps or GIF_DEFAULT_FPS, width or GIF_DEFAULT_WIDTH),
+        *GIF_OUTPUT_ARGS,
+        output_file
+    ]
+
+def gif_candidates(source_width=0, source_fps=0):
+    widths = [width for width in GIF_WIDTH_LADDER if not source_width or width <= source_width] or [source_width]
+    rates = [fps for fps in GIF_FPS_LADDER if not source_fps or fps <= source_fps] or [GIF_FPS_LADDER[-1]]
+    candidates = [(fps, width) for fps in rates for width in widths]
+    return sorted(candidates, key=lambda candidate: candidate[0] * candidate[1] ** 2, reverse=True)
+
+async def search_candidates(count, fits, low=0):
+    chosen = count - 1
+    high = count - 1
+    while low <= high:
+        middle = (low + high) // 2
+        result = await fits(middle)
+        if result is None:
+            return None
+        if result:
+            chosen, high = middle, middle - 1
+        else:
+            low = middle + 1
+    return chosen
+
+def estimate_size(sample_file, sample_duration, clip_duration):
+    if sample_duration <= 0 or not os.path.exists(sample_file):
+        return 0
+    return os.path.getsize(sample_file) * clip_duration / sample_duration
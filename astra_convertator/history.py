@@ -0,0 +1,166 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+import logging
+
+from .settings import data_path
+
+HISTORY_NAME = "history.sqlite3"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+RESULT_DONE = "done"
+RESULT_FAILED = "failed"
+RESULT_CANCELLED = "cancelled"
+
+def quick_hash(path):
+    digest = hashlib.sha1()
+    size = os.path.getsize(path)
+    digest.update(str(size).encode("ascii"))
+    with open(path, "rb") as f:
+        digest.update(f.read(HASH_CHUNK_SIZE))
+        if size > HASH_CHUNK_SIZE * 2:
+            f.seek(-HASH_CHUNK_SIZE, os.SEEK_END)
+            digest.update(f.read(HASH_CHUNK_SIZE))
+    return digest.hexdigest()
+
+def parameters_key(parameters):
+    return hashlib.sha1(json.dumps(parameters, sort_keys=True).encode("utf-8")).hexdigest()
+
+def conversion_result(conversion, return_code):
+    if return_code == 0:
+        return RESULT_DONE
+    if conversion.cancelled:
+        return RESULT_CANCELLED
+    return RESULT_FAILED
+
+def file_state(path):
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+class ConversionHistory:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS conversions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                input_path TEXT NOT NULL,
+                input_size INTEGER NOT NULL,
+                input_mtime_ns INTEGER NOT NULL,
+                input_hash TEXT,
+                params_key TEXT NOT NULL,
+                params TEXT NOT NULL,
+                outputs TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                elapsed REAL NOT NULL,
+                media_duration REAL,
+                speed REAL,
+                result TEXT NOT NULL,
+                error TEXT
+            )
+        """)
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS conversions_lookup ON conversions (input_path, params_key, result)"
+        )
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS outputs (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL
+            )
+        """)
+        if self._connection.execute("SELECT COUNT(*) FROM outputs").fetchone()[0] == 0:
+            for (outputs,) in self._connection.execute("SELECT outputs FROM conversions").fetchall():
+                self._connection.executemany("INSERT OR REPLACE INTO outputs (path, size, mtime_ns) VALUES (?, ?, ?)",
+                                             json.loads(outputs))
+        self._connection.commit()
+
+    def record(self, conversion, return_code, started_at, elapsed):
+        try:
+            input_path, input_size, input_mtime_ns = file_state(conversion.input_file)
+            input_hash = quick_hash(conversion.input_file)
+        except OSError as e:
+            logging.warning(f"История: не удалось прочитать {conversion.input_file}: {e}")
+            return
+        result = conversion_result(conversion, return_code)
+        outputs = [file_state(path) for path in conversion.output_files if os.path.exists(path)]
+        parameters = conversion.parameters()
+        media_duration = conversion.duration or 0
+        with self._lock:
+            self._connection.execute(
+                """INSERT INTO conversions (input_path, input_size, input_mtime_ns, input_hash, params_key, params,
+                                            outputs, started_at, elapsed, media_duration, speed, result, error)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (input_path, input_size, input_mtime_ns, input_hash, parameters_key(parameters),
+                 json.dumps(parameters, sort_keys=True), json.dumps(outputs), started_at, elapsed,
+                 media_duration, media_duration / elapsed if elapsed > 0 else 0, result,
+                 conversion.error_output or None)
+            )
+            self._connection.executemany("INSERT OR REPLACE INTO outputs (path, size, mtime_ns) VALUES (?, ?, ?)",
+                                         outputs)
+            self._connection.commit()
+
+    def is_up_to_date(self, conversion):
+        try:
+            input_path, input_size, input_mtime_ns = file_state(conversion.input_file)
+        except OSError:
+            return False
+        with self._lock:
+            row = self._connection.execute(
+                """SELECT input_size, input_mtime_ns, input_hash, outputs FROM conversions
+                   WHERE input_path = ? AND params_key = ? AND result = ?
+                   ORDER BY id DESC LIMIT 1""",
+                (input_path, parameters_key(conversion.parameters()), RESULT_DONE)
+            ).fetchone()
+        if row is None:
+            return False
+        size, mtime_ns, input_hash, outputs = row
+        if size != input_size:
+            return False
+        if mtime_ns != input_mtime_ns and quick_hash(conversion.input_file) != input_hash:
+            return False
+
+        recorded = {path: (size, mtime_ns) for path, size, mtime_ns in json.loads(outputs)}
+        for output_file in conversion.output_files:
+            path = os.path.abspath(output_file)
+            if path not in recorded or not os.path.exists(path):
+                return False
+            if tuple(file_state(path)[1:]) != tuple(recorded[path]):
+                return False
+        return True
+
+    def is_output(self, path):
+        try:
+            path, size, mtime_ns = file_state(path)
+        except OSError:
+            return False
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM outputs WHERE path = ? AND size = ? AND mtime_ns = ?", (path, size, mtime_ns)
+            ).fetchone()
+        return row is not None
+
+    def recent(self, limit=100):
+        with self._lock:
+            return self._connection.execute(
+                """SELECT started_at, input_path, outputs, elapsed, speed, result FROM conversions
+                   ORDER BY id DESC LIMIT ?""",
+                (limit,)
+            ).fetchall()
+
+_history = None
+_history_lock = threading.Lock()
+
+def get_history():
+    global _history
+    with _history_lock:
+        if _history is None:
+            try:
+                _history = ConversionHistory(data_path(HISTORY_NAME))
+            except (OSError, sqlite3.Error) as e:
+                logging.warning(f"История конвертаций недоступна: {e}")
+                _history = False
+    return _history or None
@@ -0,0 +1,66 @@
+import sys
+import queue
+import atexit
+import logging
+import logging.handlers
+
+from .settings import data_path, get_settings
+
+LOG_NAME = "conversion.log"
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(threadName)s - %(message)s"
+CONSOLE_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+QUEUE_SIZE = 10000
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        if self.dropped:
+            record.msg = f"{record.getMessage()} (пропущено записей лога: {self.dropped})"
+            record.args = None
+            self.dropped = 0
+        return super().prepare(record)
+
+_listener = None
+
+def setup_logging(level=logging.INFO, log_file=None, console=False):
+    global _listener
+    if _listener is not None:
+        return
+    settings = get_settings()
+    handlers = []
+    if log_file is None:
+        log_file = data_path(LOG_NAME)
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=settings.log_max_size, backupCount=settings.log_backups, encoding="utf-8"
+        )
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(console_handler)
+
+    log_queue = queue.Queue(QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+    root = logging.getLogger()
+    root.handlers = [DroppingQueueHandler(log_queue)]
+    root.setLevel(level)
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
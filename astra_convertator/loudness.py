@@ -0,0 +1,56 @@
+import os
+import json
+import math
+
+from .progress import ProgressInfo
+
+LOUDNORM_TARGET = -16.0
+LOUDNORM_TARGET_RANGE = (-70.0, -5.0)
+LOUDNORM_TRUE_PEAK = -1.5
+LOUDNORM_RANGE = 11.0
+LOUDNORM_SAMPLE_RATE = 48000
+MEASUREMENT_FIELDS = ["input_i", "input_tp", "input_lra", "input_thresh", "target_offset"]
+
+def target_args(target):
+    return f"I={target:g}:TP={LOUDNORM_TRUE_PEAK:g}:LRA={LOUDNORM_RANGE:g}"
+
+def build_measure_command(input_file, target, input_args=()):
+    return [
+        "ffmpeg", "-y", *input_args, "-discard:v", "all", "-i", input_file,
+        "-map", "0:a:0", "-vn", "-sn", "-dn",
+        "-af", f"loudnorm={target_args(target)}:print_format=json",
+        "-f", "null", os.devnull
+    ]
+
+def parse_measurement(output):
+    end = output.rfind("}")
+    start = output.rfind("{", 0, end)
+    if start < 0 or end < 0:
+        raise ValueError("ffmpeg не вывел результат измерения громкости")
+    try:
+        data = json.loads(output[start:end + 1])
+        measurement = {field: float(data[field]) for field in MEASUREMENT_FIELDS}
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Не удалось разобрать результат измерения громкости")
+    if not all(math.isfinite(value) for value in measurement.values()):
+        raise ValueError("звук слишком тихий для измерения")
+    return measurement
+
+def measurement_key(target, trim_start=None, trim_duration=None, seek_mode=None):
+    return "|".join(str(part) for part in (
+        target, LOUDNORM_TRUE_PEAK, LOUDNORM_RANGE, trim_start, trim_duration, seek_mode
+    ))
+
+def loudnorm_filter(measurement, target, sample_rate=None):
+    return (
+        f"loudnorm={target_args(target)}"
+        f":measured_I={measurement['input_i']:g}:measured_TP={measurement['input_tp']:g}"
+        f":measured_LRA={measurement['input_lra']:g}:measured_thresh={measurement['input_thresh']:g}"
+        f":offset={measurement['target_offset']:g}:linear=true"
+        f",aresample={sample_rate or LOUDNORM_SAMPLE_RATE}"
+    )
+
+def measure_progress(on_update):
+    def update(info):
+        on_update(ProgressInfo(fps=info.fps, speed=info.speed, bitrate=info.bitrate, total_size=info.total_size))
+    return update
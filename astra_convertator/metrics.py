@@ -0,0 +1,186 @@
+import os
+import re
+import json
+import time
+import threading
+
+from .history import RESULT_DONE
+from .settings import data_path, get_settings
+
+METRICS_LOG_NAME = "metrics.jsonl"
+METRICS_TEXTFILE_NAME = "astra_convertator.prom"
+MAX_LOG_SIZE = 10 * 1024 * 1024
+BLOCK_SIZE = 512
+SAMPLE_PATTERN = re.compile(r'^(?P<name>\w+)\{result="(?P<result>\w+)"\} (?P<value>[0-9.eE+-]+)$')
+
+COUNTERS = (
+    ("jobs_total", "Число завершенных задач"),
+    ("elapsed_seconds_total", "Суммарное время задач"),
+    ("probe_seconds_total", "Суммарное время ffprobe"),
+    ("media_seconds_total", "Суммарная длительность обработанных медиа"),
+    ("cpu_seconds_total", "Процессорное время ffmpeg"),
+    ("input_bytes_total", "Размер входных файлов"),
+    ("output_bytes_total", "Размер результатов"),
+    ("disk_read_bytes_total", "Прочитано с диска процессами ffmpeg"),
+    ("disk_written_bytes_total", "Записано на диск процессами ffmpeg")
+)
+GAUGES = (
+    ("last_encode_fps", "Средняя скорость кодирования последней задачи, кадр/с"),
+    ("last_speed", "Скорость последней задачи относительно реального времени"),
+    ("last_first_frame_seconds", "Время до первого кадра последней задачи"),
+    ("last_peak_rss_bytes", "Пиковая память ffmpeg последней задачи")
+)
+
+class JobMetrics:
+    def __init__(self, input_file, formats, result, elapsed=0.0, probe_time=0.0, first_frame_time=None,
+                 media_duration=0.0, encode_fps=0.0, speed=0.0, cpu_time=0.0, peak_rss=0,
+                 input_bytes=0, output_bytes=0, disk_read_bytes=0, disk_written_bytes=0):
+        self.input_file = input_file
+        self.formats = formats
+        self.result = result
+        self.elapsed = elapsed
+        self.probe_time = probe_time
+        self.first_frame_time = first_frame_time
+        self.media_duration = media_duration
+        self.encode_fps = encode_fps
+        self.speed = speed
+        self.cpu_time = cpu_time
+        self.peak_rss = peak_rss
+        self.input_bytes = input_bytes
+        self.output_bytes = output_bytes
+        self.disk_read_bytes = disk_read_bytes
+        self.disk_written_bytes = disk_written_bytes
+
+    @classmethod
+    def from_conversion(cls, conversion, result, elapsed):
+        stats = conversion.stats
+        return cls(
+            input_file=os.path.abspath(conversion.input_file),
+            formats=conversion.formats,
+            result=result,
+            elapsed=elapsed,
+            probe_time=conversion.probe_time,
+            first_frame_time=conversion.first_frame_time,
+            media_duration=conversion.duration,
+            encode_fps=stats.fps if stats else 0.0,
+            speed=stats.speed if stats else 0.0,
+            cpu_time=conversion.cpu_time,
+            peak_rss=conversion.peak_rss,
+            input_bytes=file_size(conversion.input_file),
+            output_bytes=sum(file_size(path) for path in conversion.output_files),
+            disk_read_bytes=conversion.disk_read_blocks * BLOCK_SIZE,
+            disk_written_bytes=conversion.disk_written_blocks * BLOCK_SIZE
+        )
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    def summary(self):
+        lines = [
+            f"Время: {self.elapsed:.1f} с (ffprobe {self.probe_time:.2f} с)",
+            f"Скорость: {self.encode_fps:.1f} fps, {self.speed:.2f}x",
+            f"Процессор: {self.cpu_time:.1f} с, память: {self.peak_rss / (1024 * 1024):.0f} МБ",
+            f"Прочитано: {self.input_bytes / (1024 * 1024):.1f} МБ, "
+            f"записано: {self.output_bytes / (1024 * 1024):.1f} МБ"
+        ]
+        if self.first_frame_time is not None:
+            lines.insert(1, f"Первый кадр: {self.first_frame_time:.2f} с")
+        return "\n".join(lines)
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+class MetricsExporter:
+    def __init__(self, log_path, textfile_path=None, prefix="astra_convertator"):
+        self.log_path = log_path
+        self.textfile_path = textfile_path
+        self.prefix = prefix
+        self.totals = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+        if textfile_path:
+            self._load_textfile()
+
+    def record(self, metrics):
+        entry = dict(metrics.to_dict(), time=time.time())
+        with self._lock:
+            self._append_log(entry)
+            self._update(metrics)
+            if self.textfile_path:
+                self._write_textfile()
+
+    def _append_log(self, entry):
+        if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > MAX_LOG_SIZE:
+            os.replace(self.log_path, self.log_path + ".1")
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def _update(self, metrics):
+        values = {
+            "jobs_total": 1,
+            "elapsed_seconds_total": metrics.elapsed,
+            "probe_seconds_total": metrics.probe_time,
+            "media_seconds_total": metrics.media_duration,
+            "cpu_seconds_total": metrics.cpu_time,
+            "input_bytes_total": metrics.input_bytes,
+            "output_bytes_total": metrics.output_bytes,
+            "disk_read_bytes_total": metrics.disk_read_bytes,
+            "disk_written_bytes_total": metrics.disk_written_bytes
+        }
+        for name, value in values.items():
+            key = (name, metrics.result)
+            self.totals[key] = self.totals.get(key, 0) + value
+        if metrics.result == RESULT_DONE:
+            self.gauges.update({
+                "last_encode_fps": metrics.encode_fps,
+                "last_speed": metrics.speed,
+                "last_first_frame_seconds": metrics.first_frame_time or 0,
+                "last_peak_rss_bytes": metrics.peak_rss
+            })
+
+    def _load_textfile(self):
+        counters = {f"{self.prefix}_{name}": name for name, _ in COUNTERS}
+        try:
+            with open(self.textfile_path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        for line in lines:
+            match = SAMPLE_PATTERN.match(line)
+            if match and match.group("name") in counters:
+                key = (counters[match.group("name")], match.group("result"))
+                self.totals[key] = float(match.group("value"))
+
+    def _write_textfile(self):
+        lines = []
+        for name, help_text in COUNTERS:
+            samples = [(result, value) for (key, result), value in sorted(self.totals.items()) if key == name]
+            if not samples:
+                continue
+            lines.append(f"# HELP {self.prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {self.prefix}_{name} counter")
+            lines.extend(f'{self.prefix}_{name}{{result="{result}"}} {value}' for result, value in samples)
+        for name, help_text in GAUGES:
+            if name not in self.gauges:
+                continue
+            lines.append(f"# HELP {self.prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {self.prefix}_{name} gauge")
+            lines.append(f"{self.prefix}_{name} {self.gauges[name]}")
+        temp_path = f"{self.textfile_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, self.textfile_path)
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+def get_metrics_exporter():
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            textfile_path = get_settings().metrics_textfile or data_path(METRICS_TEXTFILE_NAME)
+            _exporter = MetricsExporter(data_path(METRICS_LOG_NAME), textfile_path)
+    return _exporter
@@ -0,0 +1,99 @@
+import os
+import shutil
+import hashlib
+import threading
+import subprocess
+import logging
+
+from .history import quick_hash
+from .probe import probe_media
+from .settings import cache_path
+
+PREVIEW_CACHE_DIR = "previews"
+PREVIEW_CACHE_MAX_ENTRIES = 500
+PREVIEW_VERSION = 1
+THUMBNAIL_COUNT = 4
+THUMBNAIL_WIDTH = 160
+WAVEFORM_SIZE = "640x80"
+WAVEFORM_COLOR = "#20B2AA"
+PREVIEW_TIMEOUT = 30
+
+def build_thumbnail_command(input_file, output_file, position, width=THUMBNAIL_WIDTH):
+    return [
+        "ffmpeg", "-v", "error", "-y",
+        "-skip_frame", "nokey", "-ss", f"{position:.3f}", "-i", input_file,
+        "-map", "0:v:0", "-frames:v", "1", "-vf", f"scale={width}:-2", "-q:v", "4",
+        output_file
+    ]
+
+def build_waveform_command(input_file, output_file, size=WAVEFORM_SIZE):
+    return [
+        "ffmpeg", "-v", "error", "-y", "-discard:v", "all", "-i", input_file,
+        "-filter_complex", f"[0:a:0]aformat=channel_layouts=mono,showwavespic=s={size}:colors={WAVEFORM_COLOR}",
+        "-frames:v", "1", output_file
+    ]
+
+def thumbnail_positions(duration, count=THUMBNAIL_COUNT):
+    if duration <= 0:
+        return [0.0]
+    return [duration * (index + 1) / (count + 1) for index in range(count)]
+
+def preview_key(input_file):
+    parameters = f"{PREVIEW_VERSION}:{THUMBNAIL_COUNT}:{THUMBNAIL_WIDTH}:{WAVEFORM_SIZE}"
+    return hashlib.sha1(f"{quick_hash(input_file)}:{parameters}".encode("utf-8")).hexdigest()
+
+def run_preview_command(cmd, output_file):
+    temp_file = f"{os.path.splitext(output_file)[0]}.{os.getpid()}_{threading.get_ident()}.tmp{os.path.splitext(output_file)[1]}"
+    try:
+        result = subprocess.run(cmd[:-1] + [temp_file], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                text=True, errors="replace", timeout=PREVIEW_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logging.warning(f"Не удалось создать превью: {e}")
+        return False
+    if result.returncode != 0 or not os.path.exists(temp_file):
+        logging.warning(f"Не удалось создать превью {output_file}: {result.stderr.strip()}")
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        return False
+    os.replace(temp_file, output_file)
+    return True
+
+def prune_cache(cache_dir, keep):
+    try:
+        entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)]
+    except OSError:
+        return
+    entries = sorted((path for path in entries if os.path.isdir(path)), key=os.path.getmtime, reverse=True)
+    for path in entries[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+def cached_images(entry_dir):
+    try:
+        return sorted(os.path.join(entry_dir, name) for name in os.listdir(entry_dir)
+                      if not name.startswith(".") and ".tmp" not in name)
+    except OSError:
+        return []
+
+def generate_preview(input_file):
+    cache_dir = cache_path(PREVIEW_CACHE_DIR)
+    entry_dir = os.path.join(cache_dir, preview_key(input_file))
+    images = cached_images(entry_dir)
+    if images:
+        os.utime(entry_dir)
+        return images
+
+    media_info = probe_media(input_file)
+    os.makedirs(entry_dir, exist_ok=True)
+    if media_info.has_video:
+        for index, position in enumerate(thumbnail_positions(media_info.duration)):
+            output_file = os.path.join(entry_dir, f"thumb_{index:02d}.jpg")
+            run_preview_command(build_thumbnail_command(input_file, output_file, position), output_file)
+    elif media_info.has_audio:
+        output_file = os.path.join(entry_dir, "waveform.png")
+        run_preview_command(build_waveform_command(input_file, output_file), output_file)
+
+    images = cached_images(entry_dir)
+    if not images:
+        shutil.rmtree(entry_dir, ignore_errors=True)
+    prune_cache(cache_dir, PREVIEW_CACHE_MAX_ENTRIES)
+    return images
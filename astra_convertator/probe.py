@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+import subprocess
+import logging
+
+from .aio import start_child
+from .settings import cache_path
+
+PROBE_INDEX_NAME = "probe_index.sqlite3"
+PROBE_INDEX_MAX_ENTRIES = 20000
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _parse_rate(value):
+    numerator, _, denominator = (value or "0/1").partition("/")
+    denominator = _to_float(denominator or 1)
+    return round(_to_float(numerator) / denominator, 3) if denominator else 0.0
+
+class MediaInfo:
+    FIELDS = ["duration", "size", "bit_rate", "video_codec", "width", "height", "fps",
+              "video_bit_rate", "audio_codec", "channels", "sample_rate", "audio_bit_rate"]
+
+    def __init__(self, duration=0.0, size=0, bit_rate=0, video_codec=None, width=0, height=0,
+                 fps=0.0, video_bit_rate=0, audio_codec=None, channels=0, sample_rate=0,
+                 audio_bit_rate=0):
+        self.duration = duration
+        self.size = size
+        self.bit_rate = bit_rate
+        self.video_codec = video_codec
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.video_bit_rate = video_bit_rate
+        self.audio_codec = audio_codec
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.audio_bit_rate = audio_bit_rate
+
+    @property
+    def has_video(self):
+        return self.video_codec is not None
+
+    @property
+    def has_audio(self):
+        return self.audio_codec is not None
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{field: data[field] for field in cls.FIELDS if field in data})
+
+    @classmethod
+    def from_ffprobe(cls, data):
+        media_format = data.get("format", {})
+        info = cls(
+            duration=_to_float(media_format.get("duration")),
+            size=_to_int(media_format.get("size")),
+            bit_rate=_to_int(media_format.get("bit_rate"))
+        )
+        for stream in data.get("streams", []):
+            codec_type = stream.get("codec_type")
+            if codec_type == "video" and info.video_codec is None:
+                if stream.get("disposition", {}).get("attached_pic"):
+                    continue
+                info.video_codec = stream.get("codec_name")
+                info.width = _to_int(stream.get("width"))
+                info.height = _to_int(stream.get("height"))
+                info.fps = _parse_rate(stream.get("avg_frame_rate")) or _parse_rate(stream.get("r_frame_rate"))
+                info.video_bit_rate = _to_int(stream.get("bit_rate"))
+            elif codec_type == "audio" and info.audio_codec is None:
+                info.audio_codec = stream.get("codec_name")
+                info.channels = _to_int(stream.get("channels"))
+                info.sample_rate = _to_int(stream.get("sample_rate"))
+                info.audio_bit_rate = _to_int(stream.get("bit_rate"))
+        return info
+
+class ProbeIndex:
+    def __init__(self, path, max_entries=PROBE_INDEX_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS probes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                info TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._connection.execute("CREATE INDEX IF NOT EXISTS probes_last_used ON probes (last_used)")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS loudness (
+                path TEXT NOT NULL,
+                key TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                measurement TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (path, key)
+            )
+        """)
+        self._connection.commit()
+
+    def get(self, path, size, mtime_ns):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT info FROM probes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, size, mtime_ns)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE probes SET last_used = ? WHERE path = ?", (time.time(), path))
+            self._connection.commit()
+        return MediaInfo.from_dict(json.loads(row[0]))
+
+    def put(self, path, size, mtime_ns, info):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO probes (path, size, mtime_ns, info, last_used) VALUES (?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, json.dumps(info.to_dict()), time.time())
+            )
+            self._connection.execute(
+                "DELETE FROM probes WHERE path IN (SELECT path FROM probes ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._connection.commit()
+
+    def get_loudness(self, path, size, mtime_ns, key):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT measurement FROM loudness WHERE path = ? AND key = ? AND size = ? AND mtime_ns = ?",
+                (path, key, size, mtime_ns)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE loudness SET last_used = ? WHERE path = ? AND key = ?",
+                                     (time.time(), path, key))
+            self._connection.commit()
+        return json.loads(row[0])
+
+    def put_loudness(self, path, size, mtime_ns, key, measurement):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO loudness (path, key, size, mtime_ns, measurement, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (path, key, size, mtime_ns, json.dumps(measurement), time.time())
+            )
+            self._connection.execute(
+                "DELETE FROM loudness WHERE rowid IN (SELECT rowid FROM loudness ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+_probe_index = None
+_probe_index_lock = threading.Lock()
+
+def get_probe_index():
+    global _probe_index
+    with _probe_index_lock:
+        if _probe_index is None:
+            try:
+                _probe_index = ProbeIndex(cache_path(PROBE_INDEX_NAME))
+            except (OSError, sqlite3.Error) as e:
+                logging.warning(f"Кэш анализа файлов недоступен: {e}")
+                _probe_index = False
+    return _probe_index or None
+
+def ffprobe_command(input_file):
+    return ["ffprobe", "-v", "error", "-show_streams", "-show_format", "-of", "json", input_file]
+
+def parse_ffprobe_output(returncode, stdout, stderr):
+    if returncode != 0:
+        raise RuntimeError(stderr.strip())
+    return MediaInfo.from_ffprobe(json.loads(stdout or "{}"))
+
+def run_ffprobe(input_file):
+    result = subprocess.run(ffprobe_command(input_file), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    return parse_ffprobe_output(result.returncode, result.stdout, result.stderr)
+
+async def run_ffprobe_async(input_file):
+    process = await start_child(ffprobe_command(input_file))
+    stdout, stderr = await asyncio.gather(process.stdout.read(), process.stderr.read())
+    return parse_ffprobe_output(await process.wait(), stdout.decode("utf-8", "replace"),
+                                stderr.decode("utf-8", "replace"))
+
+def _cached_probe(input_file, use_cache):
+    path = os.path.abspath(input_file)
+    stat = os.stat(path)
+    entry = (path, stat.st_size, stat.st_mtime_ns)
+    index = get_probe_index() if use_cache else None
+    return entry, index, index.get(*entry) if index else None
+
+def probe_media(input_file, use_cache=True):
+    try:
+        entry, index, info = _cached_probe(input_file, use_cache)
+        if info is None:
+            info = run_ffprobe(entry[0])
+            if index:
+                index.put(*entry, info)
+        return info
+    except Exception as e:
+        logging.error(f"Ошибка анализа файла {input_file}: {e}")
+        return MediaInfo()
+
+async def probe_media_async(input_file, use_cache=True):
+    loop = asyncio.get_running_loop()
+    try:
+        entry, index, info = await loop.run_in_executor(None, _cached_probe, input_file, use_cache)
+        if info is None:
+            info = await run_ffprobe_async(entry[0])
+            if index:
+                await loop.run_in_executor(None, index.put, *entry, info)
+        return info
+    except Exception as e:
+        logging.error(f"Ошибка анализа файла {input_file}: {e}")
+        return MediaInfo()
@@ -0,0 +1,146 @@
+import time
+import threading
+from collections import deque
+
+MAX_LINE_LENGTH = 4096
+MAX_FIELDS = 64
+STDERR_TAIL_LINES = 200
+REPORT_INTERVAL = 0.25
+
+def parse_speed(value):
+    try:
+        return float(value.rstrip("x"))
+    except ValueError:
+        return 0.0
+
+def parse_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+class LineSplitter:
+    def __init__(self, max_line_length=MAX_LINE_LENGTH):
+        self.max_line_length = max_line_length
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer += data
+        lines = []
+        while True:
+            newline = self._buffer.find(b"\n")
+            carriage = self._buffer.find(b"\r")
+            if newline < 0 or 0 <= carriage < newline:
+                newline = carriage
+            if newline < 0:
+                break
+            line = bytes(self._buffer[:newline])
+            del self._buffer[:newline + 1]
+            if line.strip():
+                lines.append(line.decode("utf-8", "replace").strip())
+        if len(self._buffer) > self.max_line_length:
+            del self._buffer[:-self.max_line_length]
+        return lines
+
+class ProgressInfo:
+    def __init__(self, out_time=0.0, fps=0.0, speed=0.0, bitrate="", total_size=0, finished=False):
+        self.out_time = out_time
+        self.fps = fps
+        self.speed = speed
+        self.bitrate = bitrate
+        self.total_size = total_size
+        self.finished = finished
+
+    @classmethod
+    def from_fields(cls, fields):
+        out_time_us = fields.get("out_time_us") or fields.get("out_time_ms") or ""
+        try:
+            out_time = max(0, int(out_time_us)) / 1000000
+        except ValueError:
+            out_time = 0.0
+        try:
+            total_size = int(fields.get("total_size", 0))
+        except ValueError:
+            total_size = 0
+        return cls(
+            out_time=out_time,
+            fps=parse_float(fields.get("fps", "0")),
+            speed=parse_speed(fields.get("speed", "0x")),
+            bitrate=fields.get("bitrate", "N/A"),
+            total_size=total_size,
+            finished=fields.get("progress") == "end"
+        )
+
+    def percent(self, duration):
+        if self.finished:
+            return 100
+        if duration <= 0:
+            return 0
+        return min(int(self.out_time / duration * 100), 99)
+
+    def summary(self):
+        return f"{self.fps:.1f} fps, {self.speed:.2f}x, {self.bitrate}"
+
+class ProgressParser:
+    def __init__(self):
+        self._lines = LineSplitter()
+        self._fields = {}
+
+    def feed(self, data):
+        updates = []
+        for line in self._lines.feed(data):
+            key, _, value = line.partition("=")
+            if len(self._fields) >= MAX_FIELDS:
+                self._fields.clear()
+            self._fields[key.strip()] = value.strip()
+            if key.strip() == "progress":
+                updates.append(ProgressInfo.from_fields(self._fields))
+                self._fields = {}
+        return updates
+
+class StderrTail:
+    def __init__(self, max_lines=STDERR_TAIL_LINES):
+        self._lines = LineSplitter()
+        self.lines = deque(maxlen=max_lines)
+
+    def feed(self, data):
+        lines = self._lines.feed(data)
+        self.lines.extend(lines)
+        return lines
+
+    def text(self):
+        return "\n".join(self.lines)
+
+class ProgressReporter:
+    def __init__(self, duration, on_progress=None, on_stats=None, interval=REPORT_INTERVAL):
+        self.duration = duration
+        self.on_progress = on_progress
+        self.on_stats = on_stats
+        self.interval = interval
+        self.stats = None
+        self.first_frame_at = None
+        self.last_percent = -1
+        self._last_report = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, info):
+        with self._lock:
+            self.stats = info
+            now = time.monotonic()
+            if self.first_frame_at is None and info.out_time > 0:
+                self.first_frame_at = now
+            if now - self._last_report < self.interval:
+                return
+            self._last_report = now
+            self._report(info.percent(self.duration))
+
+    def finish(self):
+        with self._lock:
+            self._report(100)
+
+    def _report(self, percent):
+        if self.on_progress and percent != self.last_percent:
+            self.last_percent = percent
+            self.on_progress(percent)
+        if self.on_stats and self.stats:
+            self.on_stats(self.stats)
@@ -0,0 +1,124 @@
+from .twopass import parse_bitrate
+
+LOSSLESS_AUDIO_FORMATS = {"flac", "wav"}
+STANDARD_AUDIO_BITRATES = [32000, 48000, 64000, 96000, 128000, 160000, 192000, 256000, 320000]
+DEFAULT_AUDIO_BITRATES = {1: 64000, 2: 128000}
+MULTICHANNEL_AUDIO_BITRATE = 192000
+MONO_AUDIO_BITRATE = 96000
+SPEECH_AUDIO_BITRATE = 64000
+SPEECH_SAMPLE_RATE = 24000
+SPEECH_SOURCE_BITRATE = 64000
+
+MAX_FPS = 60
+FORMAT_LIMITS = {
+    "webm": (1080, 60),
+    "avi": (720, 30)
+}
+CODEC_EFFICIENCY = {
+    "hevc": 1.5,
+    "vp9": 1.5,
+    "av1": 2.0
+}
+MIN_VIDEO_BITRATE = 200000
+
+def standard_audio_bitrate(bps):
+    return next((rate for rate in STANDARD_AUDIO_BITRATES if rate >= bps), STANDARD_AUDIO_BITRATES[-1])
+
+def format_bitrate(bps):
+    return f"{bps // 1000}k"
+
+def is_speech(media_info):
+    low_rate = 0 < media_info.sample_rate <= SPEECH_SAMPLE_RATE
+    low_bitrate = 0 < media_info.audio_bit_rate <= SPEECH_SOURCE_BITRATE
+    if media_info.channels == 1:
+        return low_rate or low_bitrate
+    return low_rate and low_bitrate
+
+class ParameterPlan:
+    def __init__(self):
+        self.audio_bitrate = None
+        self.audio_channels = None
+        self.max_video_bitrate = None
+        self.video_filters = []
+        self.notes = []
+
+    def describe(self):
+        return "; ".join(self.notes)
+
+    def output_options(self, copy_video=False, copy_audio=False):
+        options = {}
+        if not copy_audio:
+            if self.audio_bitrate:
+                options["audio_bitrate"] = self.audio_bitrate
+            if self.audio_channels:
+                options["audio_channels"] = self.audio_channels
+        if not copy_video:
+            if self.max_video_bitrate:
+                options["max_video_bitrate"] = self.max_video_bitrate
+            if self.video_filters:
+                options["video_filters"] = list(self.video_filters)
+        return options
+
+def plan_audio(plan, media_info, format, requested):
+    if not media_info.has_audio or format in LOSSLESS_AUDIO_FORMATS:
+        return
+    channels = media_info.channels
+    if requested:
+        bitrate = parse_bitrate(requested)
+    else:
+        bitrate = DEFAULT_AUDIO_BITRATES.get(channels, MULTICHANNEL_AUDIO_BITRATE)
+    if is_speech(media_info):
+        if channels != 1:
+            plan.audio_channels = 1
+            plan.notes.append("речь: звук сведен в моно")
+        if bitrate > SPEECH_AUDIO_BITRATE:
+            bitrate = SPEECH_AUDIO_BITRATE
+            plan.notes.append(f"речь: звук {format_bitrate(bitrate)}")
+    elif channels == 1 and bitrate > MONO_AUDIO_BITRATE:
+        bitrate = MONO_AUDIO_BITRATE
+        plan.notes.append(f"моно: звук {format_bitrate(bitrate)}")
+    if media_info.audio_bit_rate:
+        source = standard_audio_bitrate(media_info.audio_bit_rate)
+        if bitrate > source:
+            bitrate = source
+            plan.notes.append(f"звук не выше исходного ({format_bitrate(bitrate)})")
+    plan.audio_bitrate = format_bitrate(bitrate)
+
+def lowest_limit(*limits):
+    limits = [limit for limit in limits if limit]
+    return min(limits) if limits else None
+
+def video_limits(format, height=None, fps=None):
+    max_height, max_fps = FORMAT_LIMITS.get(format, (None, MAX_FPS))
+    return lowest_limit(max_height, height), lowest_limit(max_fps, fps)
+
+def scale_filters(media_info, max_height=None, max_fps=None):
+    filters = []
+    notes = []
+    if max_height and media_info.height > max_height:
+        filters.append(f"scale=-2:{max_height}")
+        notes.append(f"уменьшение до {max_height}p")
+    if max_fps and media_info.fps > max_fps:
+        filters.append(f"fps={max_fps}")
+        notes.append(f"частота кадров {max_fps}")
+    return filters, notes
+
+def plan_video(plan, media_info, format, bitrate_mode=False, height=None, fps=None):
+    if not media_info.has_video:
+        return
+    filters, notes = scale_filters(media_info, *video_limits(format, height, fps))
+    plan.video_filters.extend(filters)
+    plan.notes.extend(notes)
+    source_bitrate = media_info.video_bit_rate or media_info.bit_rate
+    if not bitrate_mode and source_bitrate:
+        cap = int(source_bitrate * CODEC_EFFICIENCY.get(media_info.video_codec, 1.0))
+        plan.max_video_bitrate = max(MIN_VIDEO_BITRATE, cap)
+        plan.notes.append(f"видео не выше {plan.max_video_bitrate // 1000} кбит/с")
+
+def plan_parameters(media_info, format, audio_bitrate=None, is_video=True, bitrate_mode=False,
+                    height=None, fps=None):
+    plan = ParameterPlan()
+    plan_audio(plan, media_info, format, audio_bitrate)
+    if is_video:
+        plan_video(plan, media_info, format, bitrate_mode, height, fps)
+    return plan
@@ -0,0 +1,123 @@
+import os
+import shutil
+import asyncio
+import threading
+import logging
+
+from .settings import get_settings
+
+RECHECK_INTERVAL = 5.0
+IONICE_CLASS_NUMBERS = {"realtime": 1, "best-effort": 2, "idle": 3}
+
+_priority_prefix = None
+
+def priority_prefix():
+    global _priority_prefix
+    if _priority_prefix is None:
+        settings = get_settings()
+        prefix = []
+        if settings.nice and shutil.which("nice"):
+            prefix.extend(["nice", "-n", str(settings.nice)])
+        if settings.ionice_class and shutil.which("ionice"):
+            prefix.extend(["ionice", "-c", str(IONICE_CLASS_NUMBERS[settings.ionice_class])])
+            if settings.ionice_class == "best-effort":
+                prefix.extend(["-n", str(settings.ionice_level)])
+        _priority_prefix = prefix
+    return _priority_prefix
+
+def load_average():
+    try:
+        return os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return 0.0
+
+def free_space(path):
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return shutil.disk_usage(path).free
+
+class ResourceGate:
+    def __init__(self, max_threads=None, max_load=None, min_free_space=None):
+        settings = get_settings()
+        cpu_count = os.cpu_count() or 1
+        self.max_threads = max_threads or settings.max_threads or cpu_count
+        self.max_load = max_load if max_load is not None else (settings.max_load or cpu_count * 2)
+        self.min_free_space = min_free_space if min_free_space is not None else settings.min_free_space
+        self.used_threads = 0
+        self._lock = threading.Lock()
+        self._waiters = []
+
+    def job_cost(self, threads, segment_jobs=None, is_video=True, workers=1):
+        if not is_video:
+            return 1
+        if threads:
+            return threads * max(1, segment_jobs or 1)
+        if segment_jobs and segment_jobs > 1:
+            return self.max_threads
+        return max(1, self.max_threads // max(1, workers))
+
+    def plan(self, options, workers, is_video=True):
+        threads = options.get("threads")
+        profile = options.get("profile")
+        if profile and not threads:
+            threads = profile.threads
+        segment_jobs = options.get("segment_jobs")
+        if is_video and not threads and segment_jobs and segment_jobs > 1:
+            threads = max(1, self.max_threads // segment_jobs)
+        return threads, self.job_cost(threads, options.get("segment_jobs"), is_video, workers)
+
+    def pause_reason(self, path):
+        if self.max_load:
+            load = load_average()
+            if load > self.max_load:
+                return f"высокая нагрузка ({load:.1f} > {self.max_load:g})"
+        if self.min_free_space and path:
+            free = free_space(path)
+            if free < self.min_free_space:
+                return f"мало места на диске ({free // (1024 * 1024)} МБ)"
+        return None
+
+    def try_acquire(self, cost, path=None):
+        with self._lock:
+            if self.used_threads and self.used_threads + cost > self.max_threads:
+                return f"заняты потоки кодирования ({self.used_threads} из {self.max_threads})"
+            reason = self.pause_reason(path)
+            if reason:
+                return reason
+            self.used_threads += cost
+            return None
+
+    async def acquire(self, cost, path=None, is_cancelled=None):
+        loop = asyncio.get_running_loop()
+        last_reason = None
+        while not (is_cancelled and is_cancelled()):
+            waiter = (loop, asyncio.Event())
+            with self._lock:
+                self._waiters.append(waiter)
+            try:
+                reason = self.try_acquire(cost, path)
+                if reason is None:
+                    return True
+                if reason != last_reason:
+                    logging.info(f"Ожидание запуска: {reason}")
+                    last_reason = reason
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), RECHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+            finally:
+                with self._lock:
+                    self._waiters.remove(waiter)
+        return False
+
+    def release(self, cost):
+        with self._lock:
+            self.used_threads = max(0, self.used_threads - cost)
+        self.wake()
+
+    def wake(self):
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
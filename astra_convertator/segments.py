@@ -0,0 +1,130 @@
+import os
+import glob
+import time
+import shutil
+import hashlib
+
+from .progress import ProgressInfo
+
+MIN_SEGMENT_DURATION = 30
+MAX_SEGMENT_DURATION = 300
+SEGMENTS_PER_JOB = 2
+SOURCE_PREFIX = "source_"
+ENCODED_PREFIX = "encoded_"
+SEGMENT_EXTENSION = ".mkv"
+PARTIAL_SUFFIX = ".partial"
+SPLIT_DONE_MARKER = "split.done"
+RESUME_DIR_PREFIX = ".astra_resume_"
+RESUME_MAX_AGE = 7 * 24 * 3600
+OWNER_FILE = "output.txt"
+
+def can_segment(media_info, format, duration):
+    return format != "gif" and media_info.has_video and duration >= MIN_SEGMENT_DURATION * 2
+
+def segment_duration_for(duration, jobs):
+    return min(MAX_SEGMENT_DURATION, max(MIN_SEGMENT_DURATION, duration / (jobs * SEGMENTS_PER_JOB)))
+
+def partial_path(path):
+    directory, name = os.path.split(path)
+    base, ext = os.path.splitext(name)
+    return os.path.join(directory, f".{base.lstrip('.')}{PARTIAL_SUFFIX}{ext}")
+
+def resume_dir_for(output_file, *key_parts):
+    key = hashlib.sha1("|".join(str(part) for part in key_parts).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(os.path.dirname(os.path.abspath(output_file)), f"{RESUME_DIR_PREFIX}{key}")
+
+def write_owner(work_dir, output_file):
+    with open(os.path.join(work_dir, OWNER_FILE), "w", encoding="utf-8") as f:
+        f.write(os.path.abspath(output_file))
+
+def read_owner(work_dir):
+    try:
+        with open(os.path.join(work_dir, OWNER_FILE), encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def prune_resume_dirs(work_dir, output_file, max_age=RESUME_MAX_AGE):
+    directory = os.path.dirname(work_dir)
+    output_file = os.path.abspath(output_file)
+    deadline = time.time() - max_age
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    removed = []
+    for name in names:
+        path = os.path.join(directory, name)
+        if not name.startswith(RESUME_DIR_PREFIX) or path == work_dir or not os.path.isdir(path):
+            continue
+        try:
+            stale = os.path.getmtime(path) < deadline
+        except OSError:
+            continue
+        if stale or read_owner(path) == output_file:
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path)
+    return removed
+
+def is_split_done(work_dir):
+    return os.path.exists(os.path.join(work_dir, SPLIT_DONE_MARKER))
+
+def mark_split_done(work_dir):
+    with open(os.path.join(work_dir, SPLIT_DONE_MARKER), "w", encoding="utf-8"):
+        pass
+
+def clear_segments(work_dir):
+    for path in glob.glob(os.path.join(glob.escape(work_dir), f"*{SEGMENT_EXTENSION}")):
+        os.remove(path)
+
+def build_split_command(input_file, work_dir, segment_duration, input_args=None):
+    return [
+        "ffmpeg", "-y", *(input_args or []), "-i", input_file,
+        "-map", "0:v:0", "-an", "-sn", "-dn", "-c", "copy",
+        "-f", "segment", "-segment_time", f"{segment_duration:.3f}", "-reset_timestamps", "1",
+        os.path.join(work_dir, f"{SOURCE_PREFIX}%05d{SEGMENT_EXTENSION}")
+    ]
+
+def list_segments(work_dir, prefix):
+    return sorted(path for path in glob.glob(os.path.join(glob.escape(work_dir), f"{prefix}*{SEGMENT_EXTENSION}"))
+                  if PARTIAL_SUFFIX not in os.path.basename(path))
+
+def encoded_segment_path(work_dir, index):
+    return os.path.join(work_dir, f"{ENCODED_PREFIX}{index:05d}{SEGMENT_EXTENSION}")
+
+def write_concat_list(work_dir, files):
+    list_file = os.path.join(work_dir, "concat.txt")
+    with open(list_file, "w", encoding="utf-8") as f:
+        for path in files:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    return list_file
+
+def build_concat_command(list_file, input_file, output_file, audio_args, input_args=None):
+    return [
+        "ffmpeg", "-y",
+        "-f", "concat", "-safe", "0", "-i", list_file,
+        *(input_args or []), "-i", input_file,
+        "-map", "0:v:0", "-map", "1:a:0?",
+        "-c:v", "copy", *audio_args,
+        output_file
+    ]
+
+class SegmentProgress:
+    def __init__(self, count, on_update):
+        self.infos = [ProgressInfo() for _ in range(count)]
+        self.on_update = on_update
+
+    def complete(self, index, out_time):
+        self.infos[index] = ProgressInfo(out_time=out_time, finished=True)
+
+    def update(self, index, info):
+        self.infos[index] = info
+        running = [item for item in self.infos if not item.finished and item.out_time > 0]
+        self.on_update(ProgressInfo(
+            out_time=sum(item.out_time for item in self.infos),
+            fps=sum(item.fps for item in running),
+            speed=sum(item.speed for item in running),
+            bitrate=info.bitrate,
+            total_size=sum(item.total_size for item in self.infos)
+        ))
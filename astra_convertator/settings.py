@@ -0,0 +1,190 @@
+import os
+import re
+import logging
+import configparser
+
+from .loudness import LOUDNORM_TARGET, LOUDNORM_TARGET_RANGE
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config", "settings.ini")
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "astra_convertator")
+DATA_DIR = os.path.join(os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share"), "astra_convertator")
+
+X264_PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast",
+                "medium", "slow", "slower", "veryslow", "placebo"]
+X264_TUNES = ["film", "animation", "grain", "stillimage", "fastdecode", "zerolatency"]
+VIDEO_CODECS = ["libx264", "libx265"]
+AUDIO_CODECS = ["aac", "libmp3lame", "libopus", "libvorbis"]
+
+IONICE_CLASSES = ["idle", "best-effort", "realtime"]
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+
+THEMES = {
+    "light": "Светлая",
+    "dark": "Тёмная",
+    "blue": "Синяя",
+    "system": "Системная"
+}
+
+BITRATE_PATTERN = re.compile(r"^\d+k$")
+
+class EncoderProfile:
+    def __init__(self, name, title, preset, tune=None, threads=0, lookahead=None,
+                 vp9_deadline="good", vp9_cpu_used=4):
+        self.name = name
+        self.title = title
+        self.preset = preset
+        self.tune = tune
+        self.threads = threads
+        self.lookahead = lookahead
+        self.vp9_deadline = vp9_deadline
+        self.vp9_cpu_used = vp9_cpu_used
+
+    def video_args(self, codec, threads=None):
+        threads = self.threads if threads is None else threads
+        args = []
+        if codec in ("libx264", "libx265"):
+            args.extend(["-preset", self.preset])
+            if self.tune:
+                args.extend(["-tune", self.tune])
+            if self.lookahead is not None:
+                if codec == "libx264":
+                    args.extend(["-rc-lookahead", str(self.lookahead)])
+                else:
+                    args.extend(["-x265-params", f"rc-lookahead={self.lookahead}"])
+        elif codec == "libvpx-vp9":
+            args.extend([
+                "-deadline", self.vp9_deadline,
+                "-cpu-used", str(self.vp9_cpu_used),
+                "-row-mt", "1"
+            ])
+        if threads and codec != "gif":
+            args.extend(["-threads", str(threads)])
+        return args
+
+PROFILES = {
+    "fastest": EncoderProfile("fastest", "Максимальная скорость", "ultrafast", lookahead=10,
+                              vp9_deadline="realtime", vp9_cpu_used=8),
+    "fast": EncoderProfile("fast", "Быстрый", "veryfast", lookahead=20, vp9_cpu_used=5),
+    "balanced": EncoderProfile("balanced", "Сбалансированный", "medium", vp9_cpu_used=2),
+    "quality": EncoderProfile("quality", "Максимальное сжатие", "slow", lookahead=60, vp9_cpu_used=1)
+}
+
+class Settings:
+    def __init__(self):
+        self.theme = "light"
+        self.video_codec = "libx264"
+        self.audio_codec = "aac"
+        self.preset = "medium"
+        self.tune = None
+        self.threads = 0
+        self.crf = 23
+        self.audio_bitrate = "128k"
+        self.profile = "default"
+        self.metrics_textfile = None
+        self.nice = 10
+        self.ionice_class = "best-effort"
+        self.ionice_level = 7
+        self.max_threads = 0
+        self.max_load = 0.0
+        self.min_free_space = 1024 * 1024 * 1024
+        self.log_level = "INFO"
+        self.log_max_size = 5 * 1024 * 1024
+        self.log_backups = 3
+        self.cluster_dir = None
+        self.cluster_stage = False
+        self.smart_parameters = True
+        self.loudnorm_target = LOUDNORM_TARGET
+
+    @property
+    def theme_title(self):
+        return THEMES[self.theme]
+
+    def default_profile(self):
+        return EncoderProfile("default", f"Из настроек ({self.preset})", self.preset,
+                              tune=self.tune, threads=self.threads)
+
+    def profiles(self):
+        return dict(default=self.default_profile(), **PROFILES)
+
+    def get_profile(self, name):
+        return self.profiles().get(name) or self.default_profile()
+
+def _validated(section, key, default, check):
+    value = section.get(key, fallback=None)
+    if value is None or value.strip() == "":
+        return default
+    value = value.strip()
+    try:
+        if check(value):
+            return value
+    except ValueError:
+        pass
+    logging.warning(f"Некорректное значение {key} = {value} в {CONFIG_PATH}, используется {default}")
+    return default
+
+def load_settings(path=CONFIG_PATH):
+    settings = Settings()
+    parser = configparser.ConfigParser()
+    try:
+        if not parser.read(path, encoding="utf-8"):
+            logging.warning(f"Файл настроек не найден: {path}")
+            return settings
+    except configparser.Error as e:
+        logging.error(f"Ошибка чтения настроек: {e}")
+        return settings
+    if not parser.has_section("Settings"):
+        return settings
+
+    section = parser["Settings"]
+    settings.theme = _validated(section, "theme", settings.theme, lambda v: v in THEMES)
+    settings.video_codec = _validated(section, "video_codec", settings.video_codec, lambda v: v in VIDEO_CODECS)
+    settings.audio_codec = _validated(section, "audio_codec", settings.audio_codec, lambda v: v in AUDIO_CODECS)
+    settings.preset = _validated(section, "preset", settings.preset, lambda v: v in X264_PRESETS)
+    settings.tune = _validated(section, "tune", settings.tune, lambda v: v in X264_TUNES)
+    settings.threads = int(_validated(section, "threads", str(settings.threads), lambda v: 0 <= int(v) <= 256))
+    settings.crf = int(_validated(section, "crf", str(settings.crf), lambda v: 0 <= int(v) <= 51))
+    settings.audio_bitrate = _validated(section, "audio_bitrate", settings.audio_bitrate,
+                                        lambda v: BITRATE_PATTERN.match(v) is not None)
+    settings.profile = _validated(section, "profile", settings.profile,
+                                  lambda v: v == "default" or v in PROFILES)
+    settings.metrics_textfile = _validated(section, "metrics_textfile", settings.metrics_textfile,
+                                           lambda v: os.path.isdir(os.path.dirname(os.path.abspath(v))))
+    settings.nice = int(_validated(section, "nice", str(settings.nice), lambda v: 0 <= int(v) <= 19))
+    settings.ionice_class = _validated(section, "ionice_class", settings.ionice_class,
+                                       lambda v: v in IONICE_CLASSES or v == "none")
+    if settings.ionice_class == "none":
+        settings.ionice_class = None
+    settings.ionice_level = int(_validated(section, "ionice_level", str(settings.ionice_level),
+                                           lambda v: 0 <= int(v) <= 7))
+    settings.max_threads = int(_validated(section, "max_threads", str(settings.max_threads),
+                                          lambda v: 0 <= int(v) <= 1024))
+    settings.max_load = float(_validated(section, "max_load", str(settings.max_load), lambda v: float(v) >= 0))
+    settings.min_free_space = int(_validated(section, "min_free_space_mb", str(settings.min_free_space // (1024 * 1024)),
+                                             lambda v: int(v) >= 0)) * 1024 * 1024
+    settings.log_level = _validated(section, "log_level", settings.log_level, lambda v: v in LOG_LEVELS)
+    settings.log_max_size = int(_validated(section, "log_max_size_mb", str(settings.log_max_size // (1024 * 1024)),
+                                           lambda v: 1 <= int(v) <= 1024)) * 1024 * 1024
+    settings.log_backups = int(_validated(section, "log_backups", str(settings.log_backups),
+                                          lambda v: 0 <= int(v) <= 100))
+    settings.cluster_dir = _validated(section, "cluster_dir", settings.cluster_dir, os.path.isdir)
+    settings.cluster_stage = _validated(section, "cluster_stage", "no", lambda v: v in ("yes", "no")) == "yes"
+    settings.smart_parameters = _validated(section, "smart_parameters", "yes", lambda v: v in ("yes", "no")) == "yes"
+    settings.loudnorm_target = float(_validated(section, "loudnorm_target", f"{settings.loudnorm_target:g}",
+                                                lambda v: LOUDNORM_TARGET_RANGE[0] <= float(v) <= LOUDNORM_TARGET_RANGE[1]))
+    return settings
+
+_settings = None
+
+def get_settings():
+    global _settings
+    if _settings is None:
+        _settings = load_settings()
+    return _settings
+
+def cache_path(name):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, name)
+
+def data_path(name):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, name)
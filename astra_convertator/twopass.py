@@ -0,0 +1,128 @@
+import os
+import re
+import glob
+import time
+import socket
+import hashlib
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .progress import ProgressInfo
+from .settings import cache_path
+
+CONTAINER_OVERHEAD = 0.98
+MIN_VIDEO_BITRATE = 50000
+TWO_PASS_CODECS = ["libx264", "libvpx-vp9"]
+PASSLOG_DIR_NAME = "passlogs"
+PASSLOG_MAX_AGE = 7 * 24 * 3600
+PARTIAL_SUFFIX = ".partial"
+LOCK_SUFFIX = ".lock"
+
+BITRATE_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)([kKmM]?)$")
+
+_passlog_locks = {}
+_passlog_locks_lock = threading.Lock()
+
+def parse_bitrate(value):
+    match = BITRATE_PATTERN.match(str(value).strip())
+    if not match:
+        raise ValueError(f"Некорректный битрейт: {value}")
+    number, unit = match.groups()
+    return int(float(number) * {"": 1, "k": 1000, "m": 1000000}[unit.lower()])
+
+def target_video_bitrate(target_size, duration, audio_bitrate=0):
+    if duration <= 0:
+        raise ValueError("Неизвестна длительность файла, расчёт битрейта невозможен")
+    video_bitrate = int(target_size * 8 * CONTAINER_OVERHEAD / duration - audio_bitrate)
+    if video_bitrate < MIN_VIDEO_BITRATE:
+        raise ValueError("Целевой размер слишком мал для этой длительности")
+    return video_bitrate
+
+def passlog_prefix(input_file, video_codec, profile_name=None, trim_start=None, trim_duration=None,
+                   seek_mode=None, video_filters=None):
+    stat = os.stat(input_file)
+    key = "|".join(str(part) for part in (
+        os.path.abspath(input_file), stat.st_size, stat.st_mtime_ns,
+        video_codec, profile_name, trim_start, trim_duration, seek_mode, video_filters
+    ))
+    directory = cache_path(PASSLOG_DIR_NAME)
+    os.makedirs(directory, exist_ok=True)
+    prune_passlogs(directory)
+    return os.path.join(directory, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+def prune_passlogs(directory, max_age=PASSLOG_MAX_AGE):
+    deadline = time.time() - max_age
+    for path in glob.glob(os.path.join(glob.escape(directory), "*")):
+        try:
+            if os.path.getmtime(path) < deadline:
+                os.remove(path)
+        except OSError:
+            pass
+
+def passlog_files(prefix):
+    return glob.glob(f"{glob.escape(prefix)}-*.log*")
+
+def partial_prefix(prefix):
+    return f"{prefix}.{socket.gethostname()}_{os.getpid()}{PARTIAL_SUFFIX}"
+
+def commit_passlog(prefix):
+    partial = partial_prefix(prefix)
+    for path in sorted(passlog_files(partial), key=lambda path: path.endswith(".log")):
+        os.replace(path, prefix + path[len(partial):])
+
+def discard_passlog(prefix):
+    for path in passlog_files(partial_prefix(prefix)):
+        os.remove(path)
+
+def passlog_exists(prefix):
+    return os.path.exists(f"{prefix}-0.log")
+
+class PassLogLock:
+    def __init__(self, prefix, thread_lock):
+        self.path = prefix + LOCK_SUFFIX
+        self._thread_lock = thread_lock
+        self._file = None
+
+    def acquire(self, blocking=True):
+        if not self._thread_lock.acquire(blocking):
+            return False
+        if fcntl is None:
+            return True
+        try:
+            lock_file = open(self.path, "a")
+        except OSError:
+            self._thread_lock.release()
+            raise
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except OSError:
+            lock_file.close()
+            self._thread_lock.release()
+            if blocking:
+                raise
+            return False
+        self._file = lock_file
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+def passlog_lock(prefix):
+    with _passlog_locks_lock:
+        return PassLogLock(prefix, _passlog_locks.setdefault(prefix, threading.Lock()))
+
+def pass_progress(on_update, duration, pass_number, passes):
+    def update(info):
+        on_update(ProgressInfo(
+            out_time=((pass_number - 1) * duration + info.out_time) / passes,
+            fps=info.fps, speed=info.speed, bitrate=info.bitrate, total_size=info.total_size
+        ))
+    return update
@@ -0,0 +1,350 @@
+import os
+import sys
+import time
+import errno
+import struct
+import select
+import signal
+import asyncio
+import logging
+import configparser
+import ctypes
+import ctypes.util
+from collections import deque, OrderedDict
+from functools import partial
+
+from .aio import add_signal_handlers
+from .engine import MEDIA_EXTENSIONS
+from .history import get_history
+from .cli import parse_args, build_conversions, run_conversion, run_in_slot, report_result
+from .scheduler import ResourceGate
+from .settings import get_settings
+
+POLL_INTERVAL = 10.0
+LOOP_TIMEOUT = 1.0
+BUSY_TIMEOUT = 0.1
+INFLIGHT_PER_JOB = 2
+PRODUCED_MAX_ENTRIES = 10000
+READ_SIZE = 65536
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+def is_candidate(path):
+    name = os.path.basename(path)
+    return not name.startswith(".") and name.lower().endswith(MEDIA_EXTENSIONS)
+
+def scan_directory(directory):
+    files = []
+    dirs = []
+    for root, subdirs, names in os.walk(directory):
+        subdirs[:] = sorted(name for name in subdirs if not name.startswith("."))
+        dirs.append(root)
+        files.extend(os.path.join(root, name) for name in sorted(names))
+    return dirs, [path for path in files if is_candidate(path)]
+
+class InotifyWatcher:
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.watches = {}
+        self.roots = []
+
+    def add(self, directory):
+        self.roots.append(directory)
+        return self._add_tree(directory)
+
+    def _add_tree(self, directory):
+        dirs, files = scan_directory(directory)
+        for path in dirs:
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                logging.warning(f"Не удалось следить за {path}: {os.strerror(error)}")
+                if error == errno.ENOSPC:
+                    logging.warning("Достигнут лимит fs.inotify.max_user_watches")
+                continue
+            self.watches[wd] = path
+        return files
+
+    def read(self, timeout):
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        paths = []
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    logging.warning("Переполнение очереди inotify, повторное сканирование папок")
+                    for root in self.roots:
+                        paths.extend(scan_directory(root)[1])
+                    continue
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+                directory = self.watches.get(wd)
+                if directory is None or not name:
+                    continue
+                path = os.path.join(directory, name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith("."):
+                        paths.extend(self._add_tree(path))
+                elif is_candidate(path):
+                    paths.append(path)
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.roots = []
+        self.snapshot = {}
+        self._next_scan = 0.0
+
+    def add(self, directory):
+        self.roots.append(directory)
+        files = scan_directory(directory)[1]
+        self.snapshot.update((path, self._state(path)) for path in files)
+        self._next_scan = time.monotonic() + self.interval
+        return files
+
+    def _state(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def read(self, timeout):
+        delay = self._next_scan - time.monotonic()
+        if delay > 0:
+            time.sleep(min(delay, timeout))
+            return []
+        self._next_scan = time.monotonic() + self.interval
+        snapshot = {}
+        for root in self.roots:
+            for path in scan_directory(root)[1]:
+                snapshot[path] = self._state(path)
+        changed = [path for path, state in snapshot.items() if self.snapshot.get(path) != state]
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+def create_watcher():
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError) as e:
+            logging.warning(f"inotify недоступен ({e}), используется периодический опрос")
+    return PollingWatcher()
+
+class SettleTracker:
+    def __init__(self, settle):
+        self.settle = settle
+        self.pending = {}
+
+    def touch(self, path):
+        self.pending[path] = (None, time.monotonic())
+
+    def ready(self, limit=None):
+        now = time.monotonic()
+        ready = []
+        for path, (state, since) in list(self.pending.items()):
+            if limit is not None and len(ready) >= limit:
+                break
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.pending[path]
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != state:
+                self.pending[path] = (current, now)
+            elif now - since >= self.settle:
+                del self.pending[path]
+                ready.append(path)
+        return ready
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+class ProducedOutputs:
+    def __init__(self, max_entries=PRODUCED_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.writing = set()
+        self.finished = OrderedDict()
+
+    def start(self, paths):
+        self.writing.update(paths)
+
+    def finish(self, paths):
+        for path in paths:
+            self.writing.discard(path)
+            signature = file_signature(path)
+            if signature is not None:
+                self.finished[path] = signature
+                self.finished.move_to_end(path)
+        while len(self.finished) > self.max_entries:
+            self.finished.popitem(last=False)
+
+    def __contains__(self, path):
+        if path in self.writing:
+            return True
+        signature = self.finished.get(path)
+        return signature is not None and signature == file_signature(path)
+
+def collect_settled(watcher, tracker, produced, queued, timeout, limit):
+    for path in watcher.read(timeout):
+        path = os.path.abspath(path)
+        if path not in produced and path not in queued:
+            tracker.touch(path)
+    return [path for path in tracker.ready(limit) if path not in produced]
+
+class WatchRule:
+    def __init__(self, directory, args):
+        self.directory = os.path.abspath(directory)
+        self.args = args
+        self.output_dir = os.path.abspath(args.output_dir) if args.output_dir else None
+
+    def matches(self, path):
+        return os.path.commonpath([self.directory, path]) == self.directory
+
+    def is_output(self, path):
+        return self.output_dir is not None and self.output_dir != self.directory and \
+            os.path.commonpath([self.output_dir, path]) == self.output_dir
+
+def config_argv(section):
+    argv = []
+    for key, value in section.items():
+        option = "--" + key.replace("_", "-")
+        if value.strip().lower() in ("yes", "true", "on"):
+            argv.append(option)
+        elif value.strip().lower() not in ("no", "false", "off", ""):
+            argv.extend([option, value.strip()])
+    return argv
+
+def load_rules(args):
+    if args.inputs and not args.format:
+        raise ValueError("не указан формат (-f) для папок из командной строки")
+    rules = [WatchRule(directory, args) for directory in args.inputs]
+    if args.watch_config:
+        parser = configparser.ConfigParser()
+        if not parser.read(args.watch_config, encoding="utf-8"):
+            raise OSError(errno.ENOENT, f"Файл правил не найден: {args.watch_config}")
+        for directory in parser.sections():
+            rules.append(WatchRule(directory, parse_args(config_argv(parser[directory]) + [directory])))
+    for rule in rules:
+        rule.args.incremental = True
+        if rule.output_dir:
+            os.makedirs(rule.output_dir, exist_ok=True)
+    return sorted(rules, key=lambda rule: len(rule.directory), reverse=True)
+
+def find_rule(rules, path):
+    return next((rule for rule in rules if rule.matches(path)), None)
+
+def run_watch(args):
+    try:
+        rules = load_rules(args)
+    except (OSError, ValueError, configparser.Error) as e:
+        print(e, file=sys.stderr)
+        return 2
+    missing = [rule.directory for rule in rules if not os.path.isdir(rule.directory)]
+    if not rules or missing:
+        print(f"Папка для наблюдения не найдена: {', '.join(missing)}", file=sys.stderr)
+        return 2
+    try:
+        return asyncio.run(watch(args, rules))
+    except KeyboardInterrupt:
+        return 130
+
+async def watch(args, rules):
+    loop = asyncio.get_running_loop()
+    settings = get_settings()
+    history = get_history()
+    gate = ResourceGate()
+    watcher = create_watcher()
+    tracker = SettleTracker(args.settle)
+    ready = deque()
+    queued = set()
+    produced = ProducedOutputs()
+    inflight = {}
+    stopping = []
+    add_signal_handlers([signal.SIGINT, signal.SIGTERM], stopping.append)
+
+    for rule in rules:
+        for path in await loop.run_in_executor(None, watcher.add, rule.directory):
+            tracker.touch(path)
+        logging.info(f"Наблюдение за {rule.directory}: {', '.join(rule.args.format)}")
+    print(f"Наблюдение за папками: {len(rules)}. Для остановки нажмите Ctrl+C.")
+
+    slots = asyncio.Semaphore(max(1, args.jobs))
+    limit = max(1, args.jobs) * INFLIGHT_PER_JOB
+    try:
+        while not stopping:
+            timeout = BUSY_TIMEOUT if inflight else LOOP_TIMEOUT
+            settled = await loop.run_in_executor(None, collect_settled, watcher, tracker, produced, queued, timeout,
+                                                 limit - len(ready))
+            for path in settled:
+                rule = find_rule(rules, path)
+                if not rule or rule.is_output(path) or path in queued:
+                    continue
+                if history and await loop.run_in_executor(None, history.is_output, path):
+                    logging.debug(f"Пропуск результата конвертации: {path}")
+                    continue
+                queued.add(path)
+                ready.append((path, rule))
+
+            for task in [task for task in inflight if task.done()]:
+                conversion, path = inflight.pop(task)
+                report_result(conversion, task.result(), args.verbose)
+                await loop.run_in_executor(None, produced.finish,
+                                           [os.path.abspath(output) for output in conversion.output_files])
+                if not any(other_path == path for _, other_path in inflight.values()):
+                    queued.discard(path)
+
+            while ready and len(inflight) < limit:
+                path, rule = ready.popleft()
+                conversions = build_conversions([path], rule.args, settings, gate)
+                for conversion in conversions:
+                    produced.start(os.path.abspath(output) for output in conversion.output_files)
+                    task = asyncio.ensure_future(run_in_slot(slots, conversion, partial(run_conversion, gate=gate,
+                                                                                         workers=args.jobs)))
+                    inflight[task] = (conversion, path)
+                if not conversions:
+                    queued.discard(path)
+    finally:
+        for conversion, _ in inflight.values():
+            conversion.stop()
+        gate.wake()
+        if inflight:
+            await asyncio.wait(list(inflight))
+        watcher.close()
+    return 130 if signal.SIGINT in stopping else 0
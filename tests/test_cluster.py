@@ -0,0 +1,89 @@
+import os
+import threading
+
+from astra_convertator import cluster
+from astra_convertator.cluster import SharedQueue, job_spec
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def claimed_job(queue):
+    job_id = queue.submit(job_spec("in.mkv", "out.mp4", "mp4"))
+    assert queue.claim()[0] == job_id
+    return job_id
+
+def bump_mtime(path, step):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + step))
+
+def test_requeue_stale_returns_silent_job_to_pending(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cluster.time, "monotonic", clock)
+    queue = SharedQueue(str(tmp_path))
+    job_id = claimed_job(queue)
+
+    assert queue.requeue_stale(timeout=60) == []
+    clock.now += 59
+    assert queue.requeue_stale(timeout=60) == []
+    clock.now += 1
+    assert queue.requeue_stale(timeout=60) == [job_id]
+    assert os.path.exists(queue.path("pending", job_id))
+    assert not os.path.exists(queue.path("claimed", job_id))
+    assert queue._seen == {}
+
+def test_requeue_stale_keeps_job_with_fresh_heartbeat(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cluster.time, "monotonic", clock)
+    queue = SharedQueue(str(tmp_path))
+    job_id = claimed_job(queue)
+    queue.heartbeat(job_id, {"worker": "node", "progress": 10})
+
+    assert queue.requeue_stale(timeout=60) == []
+    for step in range(1, 4):
+        clock.now += 45
+        bump_mtime(queue.path("status", job_id), step * 1000)
+        assert queue.requeue_stale(timeout=60) == []
+    assert os.path.exists(queue.path("claimed", job_id))
+
+def test_requeue_stale_forgets_finished_jobs(tmp_path):
+    queue = SharedQueue(str(tmp_path))
+    job_id = claimed_job(queue)
+    queue.requeue_stale()
+    assert job_id in queue._seen
+    queue.finish(job_id, {"return_code": 0})
+    assert queue.requeue_stale() == []
+    assert queue._seen == {}
+
+def test_requeue_stale_is_safe_from_many_threads(tmp_path):
+    queue = SharedQueue(str(tmp_path))
+    errors = []
+
+    def sweep(index):
+        for number in range(50):
+            try:
+                queue.submit(job_spec("in.mkv", "out.mp4", "mp4"), f"job_{index}_{number}")
+                queue.claim()
+                queue.requeue_stale(timeout=0)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=sweep, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+def test_sweeper_starts_once_and_stops(tmp_path):
+    queue = SharedQueue(str(tmp_path))
+    queue.start_sweeper(interval=0.01)
+    sweeper = queue._sweeper
+    queue.start_sweeper(interval=0.01)
+    assert queue._sweeper is sweeper
+    queue.stop_sweeper()
+    assert queue._sweeper is None
+    assert not sweeper.is_alive()
@@ -0,0 +1,109 @@
+import re
+import asyncio
+
+from astra_convertator import gif
+from astra_convertator.engine import Conversion
+from astra_convertator.probe import MediaInfo
+from astra_convertator.progress import ProgressReporter
+
+def test_candidates_are_limited_by_source():
+    candidates = gif.gif_candidates(source_width=500, source_fps=10)
+    assert all(width <= 500 and fps <= 10 for fps, width in candidates)
+    assert candidates[0] == (10, 480)
+    assert candidates[-1] == (5, 240)
+
+def test_candidates_fall_back_for_tiny_sources():
+    assert gif.gif_candidates(source_width=200, source_fps=3) == [(gif.GIF_FPS_LADDER[-1], 200)]
+
+def test_candidates_are_ordered_by_pixel_rate():
+    candidates = gif.gif_candidates()
+    rates = [fps * width ** 2 for fps, width in candidates]
+    assert rates == sorted(rates, reverse=True)
+    assert len(candidates) == len(gif.GIF_FPS_LADDER) * len(gif.GIF_WIDTH_LADDER)
+
+def search(count, fitting, low=0):
+    probed = []
+
+    async def fits(index):
+        probed.append(index)
+        return index >= fitting
+
+    return asyncio.run(gif.search_candidates(count, fits, low)), probed
+
+def test_search_finds_first_fitting_candidate():
+    chosen, probed = search(36, 20)
+    assert chosen == 20
+    assert len(probed) <= 6
+
+def test_search_starts_after_rejected_candidate():
+    chosen, probed = search(36, 20, low=25)
+    assert chosen == 25
+    assert min(probed) >= 25
+
+def test_search_falls_back_to_smallest_candidate():
+    assert search(10, 99)[0] == 9
+
+def test_search_stops_when_sample_fails():
+    async def fits(index):
+        return None
+    assert asyncio.run(gif.search_candidates(10, fits)) is None
+
+class GifBudgetConversion(Conversion):
+    def __init__(self, output_file, max_size, full_factor=1.0, fail_samples=False):
+        super().__init__("in.mkv", output_file, "gif", gif_max_size=max_size, record_history=False,
+                         record_metrics=False)
+        self.media_info = MediaInfo(duration=100.0, video_codec="h264", width=1920, fps=30.0)
+        self.duration = 100.0
+        self.reporter = ProgressReporter(self.duration)
+        self.full_factor = full_factor
+        self.fail_samples = fail_samples
+        self.full_encodes = []
+
+    async def execute(self, ffmpeg_cmd, on_update=None, on_output=None):
+        output_file = ffmpeg_cmd[-1]
+        graph = ffmpeg_cmd[ffmpeg_cmd.index("-filter_complex") + 1]
+        fps = int(re.search(r"fps=(\d+)", graph).group(1))
+        width = int(re.search(r"scale=(\d+)", graph).group(1))
+        sample = "-t" in ffmpeg_cmd
+        if sample and self.fail_samples:
+            return 1
+        duration = float(ffmpeg_cmd[ffmpeg_cmd.index("-t") + 1]) if sample else self.duration
+        if not sample:
+            self.full_encodes.append((fps, width))
+        size = fps * width * width * duration / 1000 * (1.0 if sample else self.full_factor)
+        with open(output_file, "wb") as f:
+            f.write(b"\0" * int(size))
+        return 0
+
+def test_budget_fits_with_one_full_encode(tmp_path):
+    conversion = GifBudgetConversion(str(tmp_path / "out.gif"), max_size=2 * 1024 * 1024)
+    assert asyncio.run(conversion.run_gif_budget()) == 0
+    assert len(conversion.full_encodes) == 1
+    assert (tmp_path / "out.gif").stat().st_size <= conversion.gif_max_size
+    assert [path.name for path in tmp_path.iterdir()] == ["out.gif"]
+
+def test_budget_corrects_wrong_estimate_once(tmp_path):
+    conversion = GifBudgetConversion(str(tmp_path / "out.gif"), max_size=2 * 1024 * 1024, full_factor=3.0)
+    assert asyncio.run(conversion.run_gif_budget()) == 0
+    assert len(conversion.full_encodes) == 2
+    first, second = conversion.full_encodes
+    assert second[0] * second[1] ** 2 < first[0] * first[1] ** 2
+    assert (tmp_path / "out.gif").stat().st_size <= conversion.gif_max_size
+
+def test_budget_fails_when_smallest_candidate_is_too_big(tmp_path):
+    conversion = GifBudgetConversion(str(tmp_path / "out.gif"), max_size=1024)
+    assert asyncio.run(conversion.run_gif_budget()) == 1
+    assert conversion.full_encodes == [gif.gif_candidates(1920, 30)[-1]]
+    assert "GIF" in conversion.error_output
+
+def test_budget_limits_full_encodes(tmp_path):
+    conversion = GifBudgetConversion(str(tmp_path / "out.gif"), max_size=2 * 1024 * 1024, full_factor=1000.0)
+    assert asyncio.run(conversion.run_gif_budget()) == 1
+    assert len(conversion.full_encodes) == gif.GIF_MAX_FULL_ENCODES
+    assert "GIF" in conversion.error_output
+    assert [path.name for path in tmp_path.iterdir()] == ["out.gif"]
+
+def test_budget_stops_on_sample_error(tmp_path):
+    conversion = GifBudgetConversion(str(tmp_path / "out.gif"), max_size=1024 * 1024, fail_samples=True)
+    assert asyncio.run(conversion.run_gif_budget()) == 1
+    assert conversion.full_encodes == []
@@ -0,0 +1,48 @@
+import pytest
+
+from astra_convertator import loudness
+
+FFMPEG_OUTPUT = """[Parsed_loudnorm_0 @ 0x1]
+{
+	"input_i" : "-23.54",
+	"input_tp" : "-7.12",
+	"input_lra" : "6.10",
+	"input_thresh" : "-34.05",
+	"output_i" : "-16.02",
+	"target_offset" : "0.02"
+}
+"""
+
+def test_measurement_key_depends_on_target_and_trim():
+    key = loudness.measurement_key(-16.0)
+    assert key == loudness.measurement_key(-16.0)
+    assert key != loudness.measurement_key(-23.0)
+    assert key != loudness.measurement_key(-16.0, trim_start=10)
+    assert key != loudness.measurement_key(-16.0, trim_duration=30)
+    assert loudness.measurement_key(-16.0, 10, 30, "fast") != loudness.measurement_key(-16.0, 10, 30, "accurate")
+
+def test_parse_measurement_reads_last_block():
+    measurement = loudness.parse_measurement("{\"input_i\": \"0\"}\n" + FFMPEG_OUTPUT)
+    assert measurement == {
+        "input_i": -23.54, "input_tp": -7.12, "input_lra": 6.10, "input_thresh": -34.05, "target_offset": 0.02
+    }
+
+def test_parse_measurement_without_json():
+    with pytest.raises(ValueError):
+        loudness.parse_measurement("Error opening input")
+
+def test_parse_measurement_with_missing_field():
+    with pytest.raises(ValueError):
+        loudness.parse_measurement(FFMPEG_OUTPUT.replace('"target_offset"', '"other"'))
+
+def test_parse_measurement_of_silence():
+    with pytest.raises(ValueError, match="тихий"):
+        loudness.parse_measurement(FFMPEG_OUTPUT.replace('"-23.54"', '"-inf"'))
+
+def test_loudnorm_filter_uses_measurement():
+    measurement = loudness.parse_measurement(FFMPEG_OUTPUT)
+    audio_filter = loudness.loudnorm_filter(measurement, -16.0, 44100)
+    assert audio_filter.startswith("loudnorm=I=-16:TP=-1.5:LRA=11:measured_I=-23.54:")
+    assert ":offset=0.02:linear=true" in audio_filter
+    assert audio_filter.endswith(",aresample=44100")
+    assert loudness.loudnorm_filter(measurement, -16.0).endswith(f",aresample={loudness.LOUDNORM_SAMPLE_RATE}")
@@ -0,0 +1,81 @@
+from astra_convertator import rules
+from astra_convertator.probe import MediaInfo
+
+def audio(channels=2, sample_rate=48000, audio_bit_rate=0):
+    return MediaInfo(audio_codec="aac", channels=channels, sample_rate=sample_rate, audio_bit_rate=audio_bit_rate)
+
+def planned_audio(media_info, format="mp3", requested=None):
+    plan = rules.ParameterPlan()
+    rules.plan_audio(plan, media_info, format, requested)
+    return plan
+
+def test_default_audio_bitrate_by_channels():
+    assert planned_audio(audio(channels=2)).audio_bitrate == "128k"
+    assert planned_audio(audio(channels=6)).audio_bitrate == "192k"
+
+def test_audio_not_above_source():
+    plan = planned_audio(audio(audio_bit_rate=100000), requested="320k")
+    assert plan.audio_bitrate == "128k"
+    assert plan.audio_channels is None
+
+def test_lossless_and_silent_sources_are_left_alone():
+    assert planned_audio(audio(), format="flac").audio_bitrate is None
+    assert planned_audio(MediaInfo(video_codec="h264")).audio_bitrate is None
+
+def test_stereo_low_rate_alone_is_not_speech():
+    plan = planned_audio(audio(sample_rate=22050, audio_bit_rate=128000))
+    assert plan.audio_bitrate == "128k"
+    assert plan.audio_channels is None
+
+def test_stereo_low_bitrate_alone_is_not_speech():
+    plan = planned_audio(audio(sample_rate=44100, audio_bit_rate=64000))
+    assert plan.audio_channels is None
+
+def test_stereo_speech_is_downmixed():
+    plan = planned_audio(audio(sample_rate=16000, audio_bit_rate=64000))
+    assert plan.audio_channels == 1
+    assert plan.audio_bitrate == "64k"
+
+def test_mono_speech_is_capped():
+    plan = planned_audio(audio(channels=1, sample_rate=16000), requested="192k")
+    assert plan.audio_channels is None
+    assert plan.audio_bitrate == "64k"
+
+def test_mono_music_is_capped():
+    plan = planned_audio(audio(channels=1, sample_rate=44100), requested="192k")
+    assert plan.audio_bitrate == "96k"
+
+def video(**fields):
+    fields.setdefault("video_codec", "h264")
+    return MediaInfo(**fields)
+
+def planned_video(media_info, format="mp4", **options):
+    plan = rules.ParameterPlan()
+    rules.plan_video(plan, media_info, format, **options)
+    return plan
+
+def test_video_scaled_to_format_limits():
+    plan = planned_video(video(height=2160, fps=120.0), format="avi")
+    assert plan.video_filters == ["scale=-2:720", "fps=30"]
+
+def test_video_requested_limits_win_when_lower():
+    plan = planned_video(video(height=1080, fps=60.0), format="webm", height=480, fps=25)
+    assert plan.video_filters == ["scale=-2:480", "fps=25"]
+
+def test_video_not_upscaled():
+    plan = planned_video(video(height=480, fps=25.0), height=720, fps=30)
+    assert plan.video_filters == []
+
+def test_video_bitrate_capped_by_source_and_codec():
+    assert planned_video(video(video_bit_rate=2000000)).max_video_bitrate == 2000000
+    assert planned_video(video(video_codec="hevc", video_bit_rate=2000000)).max_video_bitrate == 3000000
+    assert planned_video(video(bit_rate=100000)).max_video_bitrate == rules.MIN_VIDEO_BITRATE
+    assert planned_video(video(video_bit_rate=2000000), bitrate_mode=True).max_video_bitrate is None
+
+def test_plan_parameters_skips_video_for_audio_formats():
+    media_info = video(height=2160, video_bit_rate=2000000, audio_codec="aac", channels=2)
+    plan = rules.plan_parameters(media_info, "mp3", is_video=False)
+    assert plan.video_filters == []
+    assert plan.output_options() == {"audio_bitrate": "128k"}
+    assert rules.plan_parameters(media_info, "mp4", height=720).output_options(copy_video=True) == \
+        {"audio_bitrate": "128k"}
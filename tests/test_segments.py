@@ -0,0 +1,89 @@
+import os
+import time
+
+from astra_convertator import segments
+from astra_convertator.engine import Conversion
+from astra_convertator.probe import MediaInfo
+from astra_convertator.progress import ProgressInfo
+
+def test_segment_duration_is_clamped():
+    assert segments.segment_duration_for(10, 4) == segments.MIN_SEGMENT_DURATION
+    assert segments.segment_duration_for(100000, 2) == segments.MAX_SEGMENT_DURATION
+    assert segments.segment_duration_for(1200, 4) == 150
+
+def test_can_segment_needs_video_and_length():
+    video = MediaInfo(video_codec="h264")
+    assert segments.can_segment(video, "mp4", segments.MIN_SEGMENT_DURATION * 2)
+    assert not segments.can_segment(video, "mp4", segments.MIN_SEGMENT_DURATION * 2 - 1)
+    assert not segments.can_segment(video, "gif", 600)
+    assert not segments.can_segment(MediaInfo(audio_codec="aac"), "mp4", 600)
+
+def test_partial_path_is_hidden_next_to_output(tmp_path):
+    assert segments.partial_path(str(tmp_path / "clip.mp4")) == str(tmp_path / ".clip.partial.mp4")
+
+def test_list_segments_skips_partial_files(tmp_path):
+    for name in ("source_00001.mkv", "source_00000.mkv", "source_00002.partial.mkv", "encoded_00000.mkv"):
+        (tmp_path / name).touch()
+    assert [os.path.basename(path) for path in segments.list_segments(str(tmp_path), segments.SOURCE_PREFIX)] == \
+        ["source_00000.mkv", "source_00001.mkv"]
+
+def test_segment_progress_sums_segments():
+    updates = []
+    progress = segments.SegmentProgress(3, updates.append)
+    progress.complete(0, 10.0)
+    progress.update(1, ProgressInfo(out_time=4.0, fps=30.0, speed=2.0))
+    progress.update(2, ProgressInfo(out_time=6.0, fps=20.0, speed=1.0))
+    assert updates[-1].out_time == 20.0
+    assert updates[-1].fps == 50.0
+    assert updates[-1].speed == 3.0
+
+def make_resume_dir(parent, name, owner=None, age=0):
+    path = parent / f"{segments.RESUME_DIR_PREFIX}{name}"
+    path.mkdir()
+    if owner:
+        segments.write_owner(str(path), owner)
+    if age:
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+    return str(path)
+
+def test_prune_resume_dirs_removes_stale_and_same_output(tmp_path):
+    output_file = str(tmp_path / "movie.mp4")
+    current = make_resume_dir(tmp_path, "current", owner=output_file)
+    same_output = make_resume_dir(tmp_path, "same", owner=output_file)
+    stale = make_resume_dir(tmp_path, "stale", owner=str(tmp_path / "other.mp4"), age=segments.RESUME_MAX_AGE + 60)
+    other = make_resume_dir(tmp_path, "other", owner=str(tmp_path / "other.mp4"))
+    unrelated = tmp_path / "keep"
+    unrelated.mkdir()
+
+    removed = segments.prune_resume_dirs(current, output_file)
+
+    assert sorted(removed) == sorted([same_output, stale])
+    assert os.path.isdir(current)
+    assert os.path.isdir(other)
+    assert unrelated.is_dir()
+
+def test_prune_resume_dirs_keeps_fresh_dirs_without_owner(tmp_path):
+    current = make_resume_dir(tmp_path, "current")
+    legacy = make_resume_dir(tmp_path, "legacy")
+    assert segments.prune_resume_dirs(current, str(tmp_path / "movie.mp4")) == []
+    assert os.path.isdir(legacy)
+
+def test_prune_resume_dirs_ignores_missing_directory(tmp_path):
+    assert segments.prune_resume_dirs(str(tmp_path / "missing" / "work"), str(tmp_path / "movie.mp4")) == []
+
+def test_owner_round_trip(tmp_path):
+    segments.write_owner(str(tmp_path), "movie.mp4")
+    assert segments.read_owner(str(tmp_path)) == os.path.abspath("movie.mp4")
+    assert segments.read_owner(str(tmp_path / "missing")) is None
+
+def test_use_segments_is_opt_in(tmp_path):
+    conversion = Conversion("in.mkv", str(tmp_path / "out.mp4"), "mp4")
+    conversion.media_info = MediaInfo(duration=3600, video_codec="h264")
+    conversion.duration = 3600
+    assert not conversion.use_segments(copy_video=False)
+    conversion.segment_jobs = 4
+    assert conversion.use_segments(copy_video=False)
+    assert not conversion.use_segments(copy_video=True)
+    conversion.trim_start = 10
+    assert not conversion.use_segments(copy_video=False)